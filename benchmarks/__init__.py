@@ -0,0 +1,3 @@
+#!/usr/bin/env python3
+
+"""Tarobot's performance benchmarks. Each module is runnable with `python -m benchmarks.<module>`."""
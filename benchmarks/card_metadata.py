@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""Microbenchmark for the TarotCard metadata lookups: str, repr, archana, suit, and card_value.
+
+Each lookup is timed over all 78 cards, both through the TarotCard enumeration (which precomputes every card's
+metadata as the enumeration is created) and through a reference copy of the original implementation, which ran a
+regex over the card's name or rebuilt the suit and value enums on every call. The results are printed in
+nanoseconds per call, along with the speedup.
+
+usage: python -m benchmarks.card_metadata [--repeat N] [--number N]
+"""
+
+from argparse import ArgumentParser
+import re
+import statistics
+import timeit
+from typing import Callable, Dict
+
+from tarobot.tarot import Archana, CardValue, Suit, TarotCard
+
+
+def _reference_archana(card):
+    return Archana.MAJOR if card.value < 22 else Archana.MINOR
+
+
+def _reference_suit(card):
+    if _reference_archana(card) == Archana.MAJOR:
+        return None
+    return Suit((card.value - 22) // 14 + 1)
+
+
+def _reference_card_value(card):
+    if _reference_archana(card) == Archana.MAJOR:
+        return None
+    return CardValue((card.value - 22) % 14 + 1)
+
+
+def _reference_str(card):
+    return " ".join(list(map(lambda t: "of" if t == "Of" else t, re.findall('[A-Z][^A-Z]*', card.name))))
+
+
+def _reference_repr(card):
+    return "".join(list(map(lambda t: "of" if t == "Of" else t, re.findall('[A-Z][^A-Z]*', card.name))))
+
+
+LOOKUPS: Dict[str, Dict[str, Callable]] = {
+    'str': {'reference': _reference_str, 'current': str},
+    'repr': {'reference': _reference_repr, 'current': repr},
+    'archana': {'reference': _reference_archana, 'current': lambda card: card.archana()},
+    'suit': {'reference': _reference_suit, 'current': lambda card: card.suit()},
+    'card_value': {'reference': _reference_card_value, 'current': lambda card: card.card_value()}
+}
+
+
+def time_lookup(lookup: Callable, repeat: int, number: int) -> float:
+    """Returns the median time of one lookup in nanoseconds, averaged across every card in the deck."""
+    cards = list(TarotCard)
+
+    def lookup_every_card():
+        for card in cards:
+            lookup(card)
+    samples = timeit.repeat(lookup_every_card, repeat=repeat, number=number)
+    return statistics.median(samples) / (number * len(cards)) * 1e9
+
+
+def main() -> None:
+    """Runs the microbenchmark, checking that both implementations agree before timing them."""
+    parser = ArgumentParser(prog='benchmarks.card_metadata', description='microbenchmark for TarotCard metadata')
+    parser.add_argument('--repeat', type=int, default=7, help='number of timed samples per lookup')
+    parser.add_argument('--number', type=int, default=200, help='passes over the whole deck per sample')
+    args = parser.parse_args()
+    print(f"{'lookup':<12} {'reference ns':>14} {'current ns':>12} {'speedup':>9}")
+    for (name, implementations) in LOOKUPS.items():
+        for card in TarotCard:
+            assert implementations['reference'](card) == implementations['current'](card), f"{name} of {card!r}"
+        reference = time_lookup(implementations['reference'], args.repeat, args.number)
+        current = time_lookup(implementations['current'], args.repeat, args.number)
+        print(f"{name:<12} {reference:>14.1f} {current:>12.1f} {reference / current:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""Benchmark for resolving card names in bulk, as when importing historical readings or batch inputs.
+
+A workload of card names is drawn the way people write them: card aliases in mixed case and spacing, "<rank> of
+<suit>" combinations of the rank and suit aliases, a few misspellings, and a few names that are no card at all. The
+workload is resolved one name at a time through get_optional_card_by_alias, and all at once through resolve_many,
+which normalizes and resolves each distinct name only once. The results are printed in microseconds per name, along
+with the speedup.
+
+usage: python -m benchmarks.card_resolution [--names N] [--repeat N] [--seed N]
+"""
+
+from argparse import ArgumentParser
+import random
+import statistics
+import time
+from typing import List
+
+from tarobot.tarot import get_resolver
+
+
+MISSPELLINGS = ["Kinng of Swrods", "The Hermitt", "hierophnt", "Qeen of Coins", "Page of Wnads", "Strenght"]
+UNKNOWN_NAMES = ["Foo of Bar", "The Plumber", "Jack of all trades", "Tower of Babel"]
+
+
+def build_workload(name_count: int, seed: int) -> List[str]:
+    """Draws the given number of card names, mostly valid, with some misspelled and some unknown."""
+    rng = random.Random(seed)
+    resolver = get_resolver()
+    card_names = [str(card) for card in resolver.card_aliases.values()]
+    for aliases in resolver.aliases.cards.values():
+        card_names.extend(aliases)
+    rank_names = [str(rank) for rank in resolver.rank_aliases.values()] + \
+        [alias for aliases in resolver.aliases.ranks.values() for alias in aliases]
+    suit_names = [str(suit) for suit in resolver.suit_aliases.values()] + \
+        [alias for aliases in resolver.aliases.suits.values() for alias in aliases]
+    workload = []
+    for _ in range(name_count):
+        kind = rng.random()
+        if kind < 0.6:
+            name = rng.choice(card_names)
+        elif kind < 0.95:
+            name = f"{rng.choice(rank_names)} of {rng.choice(suit_names)}"
+        elif kind < 0.98:
+            name = rng.choice(MISSPELLINGS)
+        else:
+            name = rng.choice(UNKNOWN_NAMES)
+        workload.append(rng.choice([name, name.lower(), name.upper(), name.replace(" ", "")]))
+    return workload
+
+
+def time_per_call(workload: List[str]) -> float:
+    """Resolves the workload one name at a time, returning the elapsed seconds."""
+    resolver = get_resolver()
+    start = time.perf_counter()
+    for name in workload:
+        resolver.get_optional_card_by_alias(name)
+    return time.perf_counter() - start
+
+
+def time_resolve_many(workload: List[str]) -> float:
+    """Resolves the workload all at once, returning the elapsed seconds."""
+    resolver = get_resolver()
+    start = time.perf_counter()
+    resolver.resolve_many(workload)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Runs the benchmark, checking that both paths agree before timing them."""
+    parser = ArgumentParser(prog='benchmarks.card_resolution', description='benchmark for bulk card name resolution')
+    parser.add_argument('--names', type=int, default=100_000, help='number of card names to resolve')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed samples per path')
+    parser.add_argument('--seed', type=int, default=23, help='seeds the workload')
+    args = parser.parse_args()
+    resolver = get_resolver()
+    workload = build_workload(args.names, args.seed)
+    resolved = resolver.resolve_many(workload)
+    assert resolved.cards == [resolver.get_optional_card_by_alias(name) for name in workload]
+    print(f"{len(workload)} names, {len(set(workload))} distinct, {len(resolved.failures)} unresolvable")
+    per_call = statistics.median(time_per_call(workload) for _ in range(args.repeat))
+    bulk = statistics.median(time_resolve_many(workload) for _ in range(args.repeat))
+    print(f"{'path':<22} {'us per name':>12}")
+    print(f"{'get_optional_card':<22} {per_call / len(workload) * 1e6:>12.3f}")
+    print(f"{'resolve_many':<22} {bulk / len(workload) * 1e6:>12.3f}")
+    print(f"speedup: {per_call / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
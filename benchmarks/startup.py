@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+"""Cold-start benchmark for `python -m tarobot`.
+
+Every sample runs in a fresh interpreter so that nothing is already imported or cached in memory. The benchmark
+reports the import time of each tarobot module (from `python -X importtime`) along with the time spent in each startup
+phase: loading the app config, constructing the CommandParser, App.__init__, parsing a command line, and rendering
+the first prompt. The final phase runs a complete reading against a stubbed openai client, so no network access or
+api key is needed. Medians are compared against a stored baseline so that startup regressions show up as numbers.
+
+usage: python -m benchmarks.startup [--samples N] [--save-baseline] [--fail-on-regression]
+"""
+
+from argparse import ArgumentParser
+import json
+import os
+from os.path import dirname, join, realpath
+import re
+import statistics
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from typing import Dict, List
+
+
+REPO_ROOT = dirname(dirname(realpath(__file__)))
+BASELINE_PATH = join(REPO_ROOT, "benchmarks", "baselines", "startup.json")
+
+# runs in a fresh interpreter, timing each startup phase in order and printing the results (in ms) as json
+PHASE_SCRIPT = """
+import json, time
+from unittest.mock import MagicMock
+timings = {}
+start = time.perf_counter()
+import tarobot
+from tarobot.app import App, CommandParser, get_config
+timings['import'] = time.perf_counter() - start
+start = time.perf_counter()
+config = get_config()
+timings['config'] = time.perf_counter() - start
+start = time.perf_counter()
+parser = CommandParser(config)
+timings['command_parser'] = time.perf_counter() - start
+client = MagicMock()
+completion = client.chat.completions.create.return_value
+completion.id, completion.model, completion.created = 'cmpl-benchmark', 'benchmark', 0
+completion.usage.prompt_tokens, completion.usage.completion_tokens, completion.usage.total_tokens = 1, 1, 2
+choice = MagicMock()
+choice.message.content = 'benchmark'
+completion.choices = [choice]
+start = time.perf_counter()
+app = App(config, client)
+timings['app_init'] = time.perf_counter() - start
+start = time.perf_counter()
+app.command = app.parser.parse_command_line_args(['one-card', '--card', 'The Fool'])
+timings['parse_args'] = time.perf_counter() - start
+start = time.perf_counter()
+app.create_tarot_spread()
+timings['first_prompt'] = time.perf_counter() - start
+start = time.perf_counter()
+app.ask_openai_to_generate_card_reading(app.spread.prompt)
+timings['first_reading'] = time.perf_counter() - start
+print(json.dumps({phase: seconds * 1000 for (phase, seconds) in timings.items()}))
+"""
+
+_importtime_regex = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$')
+
+
+def run_phases(env: Dict[str, str]) -> Dict[str, float]:
+    """Times each startup phase (in ms) in a fresh interpreter."""
+    result = subprocess.run([sys.executable, '-c', PHASE_SCRIPT], capture_output=True, check=True, text=True,
+                            cwd=REPO_ROOT, env=env)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_module_imports(env: Dict[str, str]) -> Dict[str, float]:
+    """Measures the cumulative import time (in ms) of each tarobot module in a fresh interpreter."""
+    script = "import tarobot, tarobot.app.app, tarobot.db, tarobot.tarot"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], capture_output=True, check=True,
+                            text=True, cwd=REPO_ROOT, env=env)
+    module_times = {}
+    for line in result.stderr.splitlines():
+        match = _importtime_regex.match(line)
+        if match is not None and match.group(4).startswith('tarobot'):
+            module_times[match.group(4)] = int(match.group(2)) / 1000
+    return module_times
+
+
+def collect(samples: int, env: Dict[str, str]) -> Dict[str, Dict[str, float]]:
+    """Runs the given number of samples, returning the median time of every phase and module."""
+    phase_samples: Dict[str, List[float]] = {}
+    module_samples: Dict[str, List[float]] = {}
+    for _ in range(samples):
+        for (phase, millis) in run_phases(env).items():
+            phase_samples.setdefault(phase, []).append(millis)
+        for (module, millis) in run_module_imports(env).items():
+            module_samples.setdefault(module, []).append(millis)
+    return {
+        'phases': {phase: statistics.median(times) for (phase, times) in phase_samples.items()},
+        'modules': {module: statistics.median(times) for (module, times) in module_samples.items()}
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float, min_delta_ms: float) -> List[str]:
+    """Prints each measurement next to its baseline, returning the names of any that regressed."""
+    regressions = []
+    for section in ['phases', 'modules']:
+        print(f"\n{section:<40} {'baseline ms':>12} {'current ms':>12} {'delta':>8}")
+        for (name, current) in sorted(results[section].items(), key=lambda item: -item[1]):
+            previous = baseline.get(section, {}).get(name)
+            if previous is None:
+                print(f"{name:<40} {'-':>12} {current:>12.2f} {'new':>8}")
+                continue
+            delta = (current - previous) / previous if previous > 0 else 0.0
+            regressed = delta > tolerance and current - previous > min_delta_ms
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:<40} {previous:>12.2f} {current:>12.2f} {delta:>+8.0%}{flag}")
+            if regressed:
+                regressions.append(f"{section}.{name}")
+    return regressions
+
+
+def main() -> None:
+    """Runs the cold-start benchmark and compares the results with the stored baseline."""
+    parser = ArgumentParser(prog='benchmarks.startup', description='cold-start benchmark for python -m tarobot')
+    parser.add_argument('--samples', type=int, default=5, help='number of fresh interpreters to sample')
+    parser.add_argument('--cold-config', action='store_true',
+                        help='disable the config snapshot so that every sample parses the hocon config')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown, default 25%%')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='ignore slowdowns smaller than this')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline json file to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit non-zero if anything regressed')
+    args = parser.parse_args()
+    with TemporaryDirectory() as snapshot_dir:
+        # never touch the real openai api or the user's own snapshot cache
+        env = dict(os.environ, OPENAI_API_KEY='benchmark',
+                   TAROBOT_SNAPSHOT_DIR='' if args.cold_config else snapshot_dir)
+        if not args.cold_config:
+            # prebuild the snapshot, just like a deploy would
+            subprocess.run([sys.executable, '-m', 'tarobot', 'build-snapshot'], capture_output=True, check=True,
+                           cwd=REPO_ROOT, env=env)
+        results = collect(args.samples, env)
+    try:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        baseline = {}
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    print(f"\ntotal startup to first reading: {sum(results['phases'].values()):.2f} ms")
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(results, baseline_file, indent=4, sort_keys=True)
+            baseline_file.write("\n")
+        print(f"saved baseline to {args.baseline}")
+    if regressions:
+        print(f"regressions: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
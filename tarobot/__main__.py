@@ -9,9 +9,11 @@ from tarobot import App
 
 # log levels for different third-party libraries
 log_appender_configs = {
+    'asyncio': INFO,
     'httpcore': INFO,
     'httpx': WARNING,
     'openai': INFO,
+    'pyhocon': INFO,
     'urllib3': INFO
 }
 
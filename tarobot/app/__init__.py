@@ -5,8 +5,21 @@
 This module processes command line arguments and executes the desired command.
 """
 
-__all__ = ['CONFIG', 'Config', 'ConfigLoader', 'CommandParser', 'CommandDto', 'App']
+# pylint: disable=E0603
+__all__ = ['CONFIG', 'Config', 'ConfigLoader', 'get_config', 'CommandParser', 'CommandDto', 'App', 'AsyncApp']
+# pylint: enable=E0603
 
-from . config import CONFIG, Config, ConfigLoader
+from . config import Config, ConfigLoader, get_config
 from . command_parser import CommandParser, CommandDto
 from . app import App
+
+
+def __getattr__(name: str):
+    """Resolves the lazily loaded CONFIG singleton, and the asyncio based AsyncApp, on first access."""
+    if name == 'CONFIG':
+        return get_config()
+    if name == 'AsyncApp':
+        # asyncio is only imported by the commands that run on an event loop
+        from . async_app import AsyncApp  # pylint: disable=C0415
+        return AsyncApp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,16 +3,27 @@
 """This module contains tarobot's core application logic."""
 
 from argparse import ArgumentError
+from contextlib import contextmanager
+from dataclasses import dataclass
+import json
 import logging
+import os
 import sys
-from typing import Dict, Optional, Tuple
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List, Optional, TextIO, Tuple, TYPE_CHECKING
 
-from openai import OpenAI
+from .. tarot import CardReading, Spread, SpreadType, draw_spread, get_mention_extractor, get_reading_config, \
+    get_rng_provider
+from . command_parser import CommandDto, CommandParser, CommandType
+from . config import Config, get_config
 
-from .. db import session_factory, CardReadingEntity
-from .. tarot import TarotDeck, CardReading, Spread, spread_builder
-from . command_parser import CommandDto, CommandParser
-from . config import CONFIG, Config
+if TYPE_CHECKING:
+    from openai import OpenAI
+    from sqlalchemy.orm import Session
+    from .. tarot.config_reloader import ConfigReloader
+    from . rate_limiter import RateLimiter
+    from . response_cache import ResponseCache
 
 
 logger = logging.getLogger(__name__)
@@ -21,22 +32,40 @@ logger = logging.getLogger(__name__)
 STOP_SEQUENCE = "END-OF-TRANSMISSION"
 
 
-class App:
+@dataclass
+class RequestLatency:
+    """The measured latency of a chat completion request sent to openai, in milliseconds."""
+    response_ms: int
+    time_to_first_token_ms: Optional[int] = None
+
+
+class App:  # pylint: disable=R0902
     """This class processes input from command line arguments and executes the request."""
 
-    def __init__(self, config_opt: Optional[Config] = None, openai_client: OpenAI = None):
+    def __init__(self, config_opt: Optional[Config] = None, openai_client: Optional['OpenAI'] = None):
         # load app config
-        if config_opt is not None:
-            self.__config = config_opt
-        else:
-            self.__config = CONFIG
-        if openai_client is not None:
-            self.openai_client = openai_client
-        else:
-            self.openai_client = OpenAI(api_key=self.__config.openai.api_key)
+        self.__config = config_opt if config_opt is not None else get_config()
+        # the openai client is only constructed once a reading is requested, see the openai_client property
+        self._openai_client = openai_client
+        (self.response_cache, self.rate_limiter) = open_request_services(self.__config)
         self.parser = CommandParser(self.__config)
         self.command: Optional[CommandDto] = None
         self.spread: Optional[Spread] = None
+        self.card_readings: List[CardReading] = []
+
+    @property
+    def openai_client(self) -> 'OpenAI':
+        """The openai client used for chat completion requests, created on first use."""
+        if self._openai_client is None:
+            from openai import OpenAI  # pylint: disable=C0415
+            # the rate limiter does its own retrying, paced across all requests
+            max_retries = 0 if self.rate_limiter is not None else 2
+            self._openai_client = OpenAI(api_key=self.__config.openai.api_key, max_retries=max_retries)
+        return self._openai_client
+
+    @openai_client.setter
+    def openai_client(self, openai_client: 'OpenAI') -> None:
+        self._openai_client = openai_client
 
     def main(self) -> None:
         """The main method: draws 3 tarot cards at random and has openai generate a tarot card reading."""
@@ -49,76 +78,577 @@ class App:
             # log an error and exits the app
             logger.fatal("Fatal error processing command line args", exc_info=True)
             sys.exit(1)
+        if self.command.command_type is not None:
+            self.run_command()
+            return
+        if self.run_via_daemon():
+            return
         self.create_tarot_spread()
-        card_reading = self.interpret_tarot_spread()
+        self.interpret_tarot_spread()
         if self.command.show_diagnostics:
-            logger.debug("\n[ diagnostics ]\n%s\n", card_reading)
+            for card_reading in self.card_readings:
+                logger.debug("\n[ diagnostics ]\n%s\n", card_reading)
+                log_card_mentions(card_reading)
+            log_response_cache_stats(self.response_cache)
         if self.command.persist_reading:
-            persist_card_reading(card_reading)
+            persist_card_readings(self.card_readings)
+
+    def run_command(self) -> None:
+        """Executes the requested utility command instead of a tarot card reading."""
+        if self.command.command_type == CommandType.BUILD_SNAPSHOT:
+            build_config_snapshot()
+        elif self.command.command_type == CommandType.BATCH:
+            self.run_batch()
+        elif self.command.command_type == CommandType.BATCH_API:
+            self.run_batch_api()
+        elif self.command.command_type == CommandType.SERVE:
+            self.run_serve()
+        elif self.command.command_type == CommandType.DAEMON:
+            self.run_daemon()
+        elif self.command.command_type == CommandType.SIMULATE:
+            self.run_simulate()
+
+    def run_batch(self) -> None:
+        """Executes the batch command: streams jsonl reading requests in and the resulting card readings out."""
+        # pylint: disable=C0415
+        import asyncio
+        from . async_app import AsyncApp
+        from . batch import iter_lines, run_batch
+        # pylint: enable=C0415
+        options = self.command.command_options
+        async_app = AsyncApp(self.__config, max_concurrency=options['max_concurrency'])
+        with open_jsonl_output(options['output']) as output_file:
+            summary = asyncio.run(run_batch(async_app, self.parser, iter_lines(options['input']), output_file,
+                                            self.command.persist_reading))
+        log_response_cache_stats(async_app.response_cache)
+        if summary.failed > 0:
+            sys.exit(1)
+
+    def run_batch_api(self) -> None:
+        """Executes the batch-api command: pre-generates readings in bulk through the offline openai batch api."""
+        # pylint: disable=C0415
+        from os.path import join
+        from . batch import iter_lines
+        from . batch_api import FileBatchTransport, OpenAIBatchTransport, read_batch_id, run_batch_api
+        # pylint: enable=C0415
+        options = self.command.command_options
+        if options['transport'] == 'file':
+            transport = FileBatchTransport(join(options['work_dir'], 'file-transport'),
+                                           lambda body: self.openai_client.chat.completions.create(**body).model_dump())
+        else:
+            transport = OpenAIBatchTransport(self.openai_client)
+        batch_id = None
+        if options['resume']:
+            batch_id = read_batch_id(options['work_dir'])
+            if batch_id is None:
+                logger.fatal("No batch has been submitted from %s", options['work_dir'])
+                sys.exit(1)
+        try:
+            with open_jsonl_output(options['output']) as output_file:
+                summary = run_batch_api(transport, self.parser, iter_lines(options['input']), options['work_dir'],
+                                        output_file, self.command.persist_reading, options['poll_interval'], batch_id)
+        except RuntimeError as error:
+            # the batch as a whole failed on openai's side
+            logger.fatal("%s", error)
+            sys.exit(1)
+        if summary.failed > 0:
+            sys.exit(1)
+
+    def run_serve(self) -> None:
+        """Executes the serve command: runs the http reading service, reusing this app's parser and config."""
+        # pylint: disable=C0415
+        import asyncio
+        from . async_app import AsyncApp
+        from . server import serve, warm_up
+        # pylint: enable=C0415
+        options = self.command.command_options
+        if options['workers'] > 1:
+            self.run_prefork_serve()
+            return
+        async_app = AsyncApp(self.__config, max_concurrency=options['max_concurrency'])
+        warm_up(async_app)
+        with watching_config(options['watch_config']):
+            asyncio.run(serve(async_app, self.parser, options['host'], options['port'],
+                              persist_reading=self.command.persist_reading))
+        log_response_cache_stats(async_app.response_cache)
+        logger.info("Coalesced %d identical in-flight requests", async_app.coalesced_count)
+
+    def run_prefork_serve(self) -> None:
+        """Executes the serve command with several worker processes, forked from this one once it is preloaded."""
+        # pylint: disable=C0415
+        import asyncio
+        from . async_app import AsyncApp
+        from . prefork import bind_listening_socket, PreforkSupervisor
+        from . server import preload, serve, warm_up
+        # pylint: enable=C0415
+        options = self.command.command_options
+        preload()
+        sock = bind_listening_socket(options['host'], options['port'])
+
+        def run_worker(on_served) -> None:
+            # connections, sqlite handles, and asyncio primitives can not be shared across a fork, so every worker
+            # gets its own app
+            # the workers share the one openai budget, so each paces itself to its share of the rate limits
+            async_app = AsyncApp(self.__config, max_concurrency=options['max_concurrency'],
+                                 rate_limit_workers=options['workers'])
+            warm_up(async_app)
+            # threads do not survive a fork either, so every worker watches the config for itself
+            with watching_config(options['watch_config']):
+                asyncio.run(serve(async_app, self.parser, sock=sock, on_served=on_served,
+                                  persist_reading=self.command.persist_reading))
+
+        logger.info("Forking %d workers to serve tarot card readings on %s", options['workers'], sock.getsockname())
+        with sock:
+            PreforkSupervisor(options['workers'], run_worker).run()
+
+    def run_daemon(self) -> None:
+        """Executes the daemon command: serves the cli's readings over a unix socket, reusing this app's config."""
+        # pylint: disable=C0415
+        import asyncio
+        from . async_app import AsyncApp
+        from . daemon import default_daemon_socket_path, run_daemon
+        from . server import warm_up
+        # pylint: enable=C0415
+        options = self.command.command_options
+        async_app = AsyncApp(self.__config, max_concurrency=options['max_concurrency'])
+        warm_up(async_app)
+        with watching_config(options['watch_config']):
+            asyncio.run(run_daemon(async_app, options['socket'] or default_daemon_socket_path()))
+        log_response_cache_stats(async_app.response_cache)
+
+    def run_simulate(self) -> None:
+        """Executes the simulate command: draws many random spreads and reports whether the draw is unbiased."""
+        from .. tarot.spread_stats import simulate  # pylint: disable=C0415
+        options = self.command.command_options
+        spread_type = SpreadType(options['spread_type'])
+        # the parser has already resolved the card count against the spread's template
+        card_count = options['card_count']
+        logger.info("Simulating %d %s spreads of %d cards", options['draws'], spread_type, card_count)
+        spread_stats = simulate(options['draws'], card_count, options['seed'], options['workers'])
+        if not spread_stats.write_report(sys.stdout, options['alpha']):
+            logger.error("The drawn cards are not uniformly distributed")
+            sys.exit(1)
+
+    def run_via_daemon(self) -> bool:
+        """Sends the reading to the resident daemon, if one is configured, and displays the results it sends back.
+
+        Returns False, so the reading runs in-process instead, when no daemon is configured or none is running."""
+        from . daemon import DAEMON_SOCKET_ENV_VAR, send_command  # pylint: disable=C0415
+        socket_path = self.command.daemon_socket or os.environ.get(DAEMON_SOCKET_ENV_VAR)
+        if not socket_path:
+            return False
+        try:
+            events = send_command(socket_path, self.command)
+        except (FileNotFoundError, ConnectionRefusedError):
+            logger.debug("No tarobot daemon is listening on %s, running the reading in-process", socket_path)
+            return False
+        for event in events:
+            if event['event'] == 'spread':
+                self.log_spread(event['spread_type'], event['cards'], event['prompt'])
+            elif event['event'] == 'token':
+                sys.stdout.write(event['token'])
+                sys.stdout.flush()
+            elif event['event'] == 'readings':
+                if self.command.stream_response:
+                    sys.stdout.write("\n")
+                self.log_responses([reading['response'] for reading in event['readings']])
+                if self.command.show_diagnostics:
+                    for reading in event['readings']:
+                        logger.debug("\n[ diagnostics ]\n%s\n", json.dumps(reading, indent=2))
+                return True
+            elif event['event'] == 'error':
+                logger.fatal("The tarobot daemon failed to generate the card reading: %s", event['error'])
+                sys.exit(1)
+        logger.fatal("The tarobot daemon closed the connection before sending the card reading")
+        sys.exit(1)
 
     def create_tarot_spread(self) -> None:
         """Creates a tarot spread from either the given cards or a locally created tarot card deck."""
-        if self.command.given_cards is not None:
-            tarot_cards = self.command.given_cards
-        else:
-            deck = TarotDeck()
-            tarot_cards = deck.draw(self.command.card_count)
-        self.spread = spread_builder.build(self.command.spread_type, tarot_cards, self.command.spread_parameters)
+        self.spread = create_tarot_spread(self.command)
 
     def interpret_tarot_spread(self) -> CardReading:
-        """Generates a tarot card reading for the given spread and logs the response."""
-        card_list_str = ", ".join(str(card) for card in self.spread.tarot_cards)
+        """Generates a tarot card reading for the given spread and logs the response.
+
+        When the spread's chat completion config asks for n > 1 choices, every choice becomes its own card reading.
+        All of them are kept in card_readings, and the first one is returned."""
+        self.log_spread(str(self.spread.spread_type), [str(card) for card in self.spread.tarot_cards],
+                        self.spread.prompt)
+        self.card_readings = self.ask_openai_to_generate_card_readings(self.spread.prompt)
+        self.log_responses([card_reading.response for card_reading in self.card_readings])
+        return self.card_readings[0]
+
+    def log_spread(self, spread_type: str, cards: List[str], prompt: str) -> None:
+        """Logs the cards drawn for the reading (and its prompt, if asked to), ahead of the response."""
         logger.info("Generating a %s tarot card reading for the following cards:\n\t%s\n",
-                    str(self.spread.spread_type), card_list_str)
+                    spread_type, ", ".join(cards))
         if self.command.show_prompt:
-            logger.info("Prompt:\n%s\n", self.spread.prompt)
-        card_reading = self.ask_openai_to_generate_card_reading(self.spread.prompt)
-        card_reading.metadata.max_tokens = self.spread.chat_completion_config.max_tokens
-        logger.info("Response:\n%s", card_reading.response)
-        return card_reading
+            logger.info("Prompt:\n%s\n", prompt)
+        if self.command.stream_response:
+            logger.info("Response:")
+
+    def log_responses(self, responses: List[str]) -> None:
+        """Logs the response of every choice, leaving out the first one if it was already streamed."""
+        if len(responses) == 1:
+            if not self.command.stream_response:
+                logger.info("Response:\n%s", responses[0])
+            return
+        # only the first choice is streamed
+        first_logged = 1 if self.command.stream_response else 0
+        for (index, response) in enumerate(responses[first_logged:], start=first_logged + 1):
+            logger.info("Response %d of %d:\n%s", index, len(responses), response)
 
     def ask_openai_to_generate_card_reading(self, prompt: str) -> CardReading:
-        """Displays the prompt to and associated response from openai."""
+        """Displays the prompt to and associated response from openai, returning the reading of the first choice."""
+        return self.ask_openai_to_generate_card_readings(prompt)[0]
+
+    def ask_openai_to_generate_card_readings(self, prompt: str) -> List[CardReading]:
+        """Displays the prompt to and associated responses from openai, one card reading per completion choice.
+
+        When the command asks for a streamed response, tokens are written to stdout as they arrive."""
         completion_kwargs = self._construct_openai_chat_completion_request()
-        completion, response = _execute_chat_completion_request(self.openai_client, completion_kwargs)
-        command = self.command
-        card_reading = CardReading(completion, self.spread.tarot_cards, prompt, response, command.spread_parameters)
-        card_reading.metadata.max_tokens = self.spread.chat_completion_config.max_tokens
-        if 'temperature' in completion_kwargs:
-            card_reading.metadata.temperature = completion_kwargs['temperature']
-        if 'top_p' in completion_kwargs:
-            card_reading.metadata.top_p = completion_kwargs['top_p']
-        return card_reading
+        if self.command.stream_response:
+            completion, response, latency = _execute_streaming_chat_completion_request(
+                self.openai_client, completion_kwargs, sys.stdout, self.response_cache, self.rate_limiter)
+        else:
+            completion, response, latency = _execute_chat_completion_request(
+                self.openai_client, completion_kwargs, self.response_cache, self.rate_limiter)
+        if len(completion.choices) == 1:
+            return [build_card_reading(completion, response, self.spread, prompt, self.command.spread_parameters,
+                                       completion_kwargs, latency)]
+        return build_card_readings(completion, self.spread, prompt, self.command.spread_parameters,
+                                   completion_kwargs, latency)
 
     def _construct_openai_chat_completion_request(self) -> Dict[str, any]:
         """Builds the keyword arguments for an openai chat completion request for the spread."""
-        completion_config = self.spread.chat_completion_config
-        completion_kwargs = {
-            'model': completion_config.model,
-            'max_tokens': completion_config.max_tokens,
-            'messages': [
-                {'role': 'assistant', 'content': "you are a helpful assistant."},
-                {'role': 'user', 'content': f"{self.spread.prompt}\n{STOP_SEQUENCE}"}
-            ]
-            # 'prompt': self.spread.prompt
-        }
-        if completion_config.n is not None:
-            completion_kwargs['n'] = completion_config.n
-        if completion_config.temperature is not None:
-            completion_kwargs['temperature'] = completion_config.temperature
-        if completion_config.top_p is not None:
-            completion_kwargs['top_p'] = completion_config.top_p
-        return completion_kwargs
-
-
-def _execute_chat_completion_request(openai_client: OpenAI, chat_completion_kwargs) -> Tuple[any, str]:
-    """Executes an openai completion request, returning a tuple of the Completion object and the response string."""
+        return construct_chat_completion_request(self.spread)
+
+
+def create_tarot_spread(command: CommandDto) -> Spread:
+    """Creates a tarot spread from either the command's given cards or cards drawn at random.
+
+    Drawn cards come from a random stream of their own, seeded with the command's seed if it has one; the seed is
+    kept with the spread, so the same spread can be drawn again. The spread is built with the reading config the
+    command was validated against, if any, otherwise with the shared one."""
+    spread_builder = (command.reading_config or get_reading_config()).spread_builder
+    if command.given_cards is not None:
+        return spread_builder.build(command.spread_type, command.given_cards, command.spread_parameters)
+    (seed, rng) = get_rng_provider().stream(command.seed)
+    tarot_cards = draw_spread(command.card_count, rng)
+    return spread_builder.build(command.spread_type, tarot_cards, command.spread_parameters, seed)
+
+
+def construct_chat_completion_request(spread: Spread) -> Dict[str, any]:
+    """Builds the keyword arguments for an openai chat completion request for the given spread."""
+    completion_config = spread.chat_completion_config
+    completion_kwargs = {
+        'model': completion_config.model,
+        'max_tokens': completion_config.max_tokens,
+        'messages': [
+            {'role': 'assistant', 'content': "you are a helpful assistant."},
+            {'role': 'user', 'content': f"{spread.prompt}\n{STOP_SEQUENCE}"}
+        ]
+        # 'prompt': spread.prompt
+    }
+    if completion_config.n is not None:
+        completion_kwargs['n'] = completion_config.n
+    if completion_config.temperature is not None:
+        completion_kwargs['temperature'] = completion_config.temperature
+    if completion_config.top_p is not None:
+        completion_kwargs['top_p'] = completion_config.top_p
+    return completion_kwargs
+
+
+def build_card_reading(completion, response: str, spread: Spread, prompt: str,  # pylint: disable=R0913
+                       parameters: Optional[Dict[str, str]], completion_kwargs: Dict[str, any],
+                       latency: Optional[RequestLatency] = None) -> CardReading:
+    """Assembles the card reading DTO for the given openai completion and the spread it was requested for.
+
+    The latency is only given for requests actually sent to openai, not for responses served from the cache."""
+    card_reading = CardReading(completion, spread.tarot_cards, prompt, response, parameters)
+    card_reading.metadata.max_tokens = spread.chat_completion_config.max_tokens
+    card_reading.metadata.seed = spread.seed
+    if 'temperature' in completion_kwargs:
+        card_reading.metadata.temperature = completion_kwargs['temperature']
+    if 'top_p' in completion_kwargs:
+        card_reading.metadata.top_p = completion_kwargs['top_p']
+    if latency is not None:
+        card_reading.metadata.record_latency(latency.response_ms, latency.time_to_first_token_ms)
+    return card_reading
+
+
+def build_card_readings(completion, spread: Spread, prompt: str,  # pylint: disable=R0913
+                        parameters: Optional[Dict[str, str]], completion_kwargs: Dict[str, any],
+                        latency: Optional[RequestLatency] = None) -> List[CardReading]:
+    """Fans a completion with n choices out into n card readings, which share the one prompt and round trip.
+
+    The completion's usage is split across the readings: the prompt tokens evenly, and the completion tokens in
+    proportion to the length of each choice's response, so that the readings' token counts add up to the total."""
+    responses = [choice.message.content.strip() for choice in completion.choices]
+    usage = completion.usage
+    prompt_tokens = _split_tokens(usage.prompt_tokens, [1] * len(responses))
+    completion_tokens = _split_tokens(usage.completion_tokens, [len(response) or 1 for response in responses])
+    card_readings = []
+    for (index, response) in enumerate(responses):
+        card_reading = build_card_reading(completion, response, spread, prompt, parameters, completion_kwargs)
+        metadata = card_reading.metadata
+        metadata.choice_index = index
+        metadata.prompt_tokens = prompt_tokens[index]
+        metadata.completion_tokens = completion_tokens[index]
+        if metadata.prompt_tokens is not None and metadata.completion_tokens is not None:
+            metadata.total_tokens = metadata.prompt_tokens + metadata.completion_tokens
+        if latency is not None:
+            metadata.record_latency(latency.response_ms, latency.time_to_first_token_ms)
+        card_readings.append(card_reading)
+    return card_readings
+
+
+def _split_tokens(tokens: Optional[int], weights: List[int]) -> List[Optional[int]]:
+    """Splits the token count into whole shares by weight, handing the rounding remainder to the largest fractions."""
+    if tokens is None:
+        return [None] * len(weights)
+    total_weight = sum(weights)
+    exact_shares = [tokens * weight / total_weight for weight in weights]
+    shares = [int(share) for share in exact_shares]
+    by_remainder = sorted(range(len(weights)), key=lambda index: shares[index] - exact_shares[index])
+    for index in by_remainder[:tokens - sum(shares)]:
+        shares[index] += 1
+    return shares
+
+
+def _execute_chat_completion_request(openai_client: 'OpenAI', chat_completion_kwargs,
+                                     response_cache: Optional['ResponseCache'] = None,
+                                     rate_limiter: Optional['RateLimiter'] = None) \
+        -> Tuple[any, str, Optional[RequestLatency]]:
+    """Executes an openai completion request, returning a tuple of the Completion object, the response string, and
+    the request's latency.
+
+    When a response cache is given, identical requests are answered from the cache (with no latency) instead of by
+    openai. When a rate limiter is given, the request is paced by it and retried if it gets rate limited."""
+    if response_cache is not None:
+        cached = response_cache.get(chat_completion_kwargs)
+        if cached is not None:
+            return cached + (None,)
+    # tell the api this conversation is over
+    chat_completion_kwargs['stop'] = STOP_SEQUENCE
+    start = time.perf_counter()
+    chat_completion = _create_chat_completion(openai_client, chat_completion_kwargs, rate_limiter)
+    latency = RequestLatency(elapsed_ms(start))
+    response = join_choices(chat_completion)
+    if response_cache is not None:
+        response_cache.put(chat_completion_kwargs, chat_completion, response)
+    return chat_completion, response, latency
+
+
+def _execute_streaming_chat_completion_request(openai_client: 'OpenAI', chat_completion_kwargs, output: TextIO,
+                                               response_cache: Optional['ResponseCache'] = None,
+                                               rate_limiter: Optional['RateLimiter'] = None) \
+        -> Tuple[any, str, Optional[RequestLatency]]:
+    """Executes a streamed openai completion request, writing the first choice's tokens to the output as they arrive.
+
+    Returns a tuple of a completion-like object assembled from the streamed chunks (usage included), the response
+    string, and the request's latency including the time to the first token (None when the response came from the
+    cache)."""
+    if response_cache is not None:
+        cached = response_cache.get(chat_completion_kwargs)
+        if cached is not None:
+            (completion, response) = cached
+            # only the first choice is streamed, just as when the response comes from openai
+            output.write((completion.choices[0].message.content or '') + "\n")
+            output.flush()
+            return completion, response, None
     # tell the api this conversation is over
     chat_completion_kwargs['stop'] = STOP_SEQUENCE
-    chat_completion = openai_client.chat.completions.create(**chat_completion_kwargs)
-    response = "\n".join([choice.message.content.strip()
-                          for choice in chat_completion.choices])
-    return chat_completion, response
+    start = time.perf_counter()
+    # the pinned openai client predates the stream_options parameter, so it is passed through the request body
+    stream = _create_chat_completion(openai_client, dict(chat_completion_kwargs, stream=True,
+                                                         extra_body={'stream_options': {'include_usage': True}}),
+                                     rate_limiter)
+    try:
+        (chat_completion, time_to_first_token_ms) = _read_stream(stream, output, start)
+    finally:
+        stream.close()
+    latency = RequestLatency(elapsed_ms(start), time_to_first_token_ms)
+    output.write("\n")
+    output.flush()
+    response = join_choices(chat_completion)
+    if response_cache is not None:
+        response_cache.put(chat_completion_kwargs, chat_completion, response)
+    return chat_completion, response, latency
+
+
+def _create_chat_completion(openai_client: 'OpenAI', chat_completion_kwargs: Dict[str, any],
+                            rate_limiter: Optional['RateLimiter']):
+    """Sends the chat completion request, through the rate limiter if there is one."""
+    if rate_limiter is not None:
+        return rate_limiter.create_chat_completion(openai_client, chat_completion_kwargs)
+    return openai_client.chat.completions.create(**chat_completion_kwargs)
+
+
+def _read_stream(stream, output: TextIO, start: float) -> Tuple[SimpleNamespace, Optional[int]]:
+    """Reads the chunks of a completion stream, writing the first choice's tokens to the output as they arrive.
+
+    Returns the completion assembled from the chunks along with the time to the first token in milliseconds."""
+    def write_token(token: str) -> None:
+        output.write(token)
+        output.flush()
+    streamed_completion = StreamedCompletion(start, write_token)
+    for chunk in stream:
+        streamed_completion.add_chunk(chunk)
+    return streamed_completion.assemble(), streamed_completion.time_to_first_token_ms
+
+
+class StreamedCompletion:
+    """Collects the chunks of a streamed chat completion, passing the first choice's tokens on as they arrive."""
+
+    def __init__(self, start: float, on_token: Callable[[str], None]):
+        self.start = start
+        self.on_token = on_token
+        self.time_to_first_token_ms: Optional[int] = None
+        self._last_chunk = None
+        self._usage = None
+        self._choice_tokens: Dict[int, List[str]] = {}
+
+    def add_chunk(self, chunk) -> None:
+        """Adds the tokens of the next chunk of the stream."""
+        self._last_chunk = chunk
+        # only the final chunk carries usage, and it has no choices
+        self._usage = getattr(chunk, 'usage', None) or self._usage
+        for choice in chunk.choices:
+            token = choice.delta.content
+            if not token:
+                continue
+            if self.time_to_first_token_ms is None:
+                self.time_to_first_token_ms = elapsed_ms(self.start)
+            self._choice_tokens.setdefault(choice.index, []).append(token)
+            if choice.index == 0:
+                self.on_token(token)
+
+    def assemble(self) -> SimpleNamespace:
+        """Assembles a completion-like object, carrying the fields the card reading metadata needs, from the stream."""
+        usage = self._usage
+        if isinstance(usage, dict):
+            usage = SimpleNamespace(**usage)
+        elif usage is None:
+            # the api did not report usage for this stream
+            usage = SimpleNamespace(prompt_tokens=None, completion_tokens=None, total_tokens=None)
+        return SimpleNamespace(
+            id=getattr(self._last_chunk, 'id', None),
+            model=getattr(self._last_chunk, 'model', None),
+            created=getattr(self._last_chunk, 'created', None),
+            usage=SimpleNamespace(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens,
+                                  total_tokens=usage.total_tokens),
+            choices=[SimpleNamespace(message=SimpleNamespace(content="".join(self._choice_tokens[index])))
+                     for index in sorted(self._choice_tokens)])
+
+
+def elapsed_ms(start: float) -> int:
+    """The whole milliseconds elapsed since the given time.perf_counter() value."""
+    return round((time.perf_counter() - start) * 1000)
+
+
+def join_choices(chat_completion) -> str:
+    """Joins the message content of all the chat completion's choices into a single response string."""
+    return "\n".join([choice.message.content.strip()
+                      for choice in chat_completion.choices])
+
+
+def log_card_mentions(card_reading: CardReading) -> None:
+    """Logs the cards of the spread the response never mentions, and the cards it mentions outside of the spread."""
+    mention_check = get_mention_extractor().check(card_reading.spread, card_reading.response)
+    if mention_check.missing:
+        logger.warning("Reading never mentions: %s", ", ".join(str(card) for card in mention_check.missing))
+    if mention_check.unexpected:
+        logger.warning("Reading mentions cards outside of the spread: %s",
+                       ", ".join(str(card) for card in mention_check.unexpected))
+
+
+def open_request_services(config: Config, rate_limit_workers: int = 1) \
+        -> Tuple[Optional['ResponseCache'], Optional['RateLimiter']]:
+    """Opens the response cache and rate limiter that the config puts in front of chat completion requests.
+
+    Either is None when the config does not enable it, in which case its module (and sqlite3 or asyncio along with it)
+    is never imported. See open_rate_limiter for rate_limit_workers."""
+    response_cache = None
+    if config.cache is not None and config.cache.enabled:
+        from . response_cache import open_response_cache  # pylint: disable=C0415
+        response_cache = open_response_cache(config.cache)
+    rate_limiter = None
+    if config.rate_limit is not None and config.rate_limit.enabled:
+        from . rate_limiter import open_rate_limiter  # pylint: disable=C0415
+        rate_limiter = open_rate_limiter(config.rate_limit, rate_limit_workers)
+    return response_cache, rate_limiter
+
+
+def log_response_cache_stats(response_cache: Optional['ResponseCache']) -> None:
+    """Logs the response cache's hit and miss counts, if the cache is enabled."""
+    if response_cache is not None:
+        logger.debug("Response cache: %d hits, %d misses", response_cache.hits, response_cache.misses)
+
+
+@contextmanager
+def watching_config(enabled: bool) -> Iterator[Optional['ConfigReloader']]:
+    """Hot reloads the spread and alias config in the background while the block runs, if enabled."""
+    if not enabled:
+        yield None
+        return
+    from .. tarot.config_reloader import ConfigReloader  # pylint: disable=C0415
+    reloader = ConfigReloader().start()
+    try:
+        yield reloader
+    finally:
+        reloader.stop()
+
+
+@contextmanager
+def open_jsonl_output(path: str) -> Iterator[TextIO]:
+    """Opens the given file for jsonl output, or stdout for "-", in which case logging is moved over to stderr."""
+    if path == '-':
+        # keep stdout clean for the jsonl results
+        _redirect_stdout_logging_to_stderr()
+        yield sys.stdout
+        return
+    with open(path, 'w', encoding='utf-8') as output_file:
+        yield output_file
+
+
+def _redirect_stdout_logging_to_stderr() -> None:
+    """Moves any log handlers that write to stdout over to stderr."""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler) and handler.stream is sys.stdout:
+            handler.setStream(sys.stderr)
+
+
+def build_config_snapshot() -> None:
+    """Parses the spread and alias config files and writes their compiled snapshots, e.g. at deploy time."""
+    # pylint: disable=C0415
+    from .. tarot.card_resolver import aliases_path, load_alias_maps
+    from .. tarot.config_snapshot import default_snapshot
+    from .. tarot.tarot_spread import load_spread_templates, spreads_path
+    # pylint: enable=C0415
+    snapshot = default_snapshot()
+    for snapshot_path in [snapshot.build('spreads', spreads_path, load_spread_templates),
+                          snapshot.build('aliases', aliases_path, load_alias_maps)]:
+        logger.info("Wrote config snapshot %s", snapshot_path)
+
+
+def session_factory() -> 'Session':
+    """Opens a database session, deferring the sqlalchemy import until a reading is actually persisted."""
+    from .. db import session_factory as db_session_factory  # pylint: disable=C0415
+    return db_session_factory()
+
+
+def persist_card_readings(card_reading_dtos: List[CardReading]) -> None:
+    """Records the details of all the tarot card readings in a single transaction, see persist_card_reading."""
+    if len(card_reading_dtos) == 1:
+        persist_card_reading(card_reading_dtos[0])
+        return
+    try:
+        from .. db import CardReadingEntity  # pylint: disable=C0415
+        session = session_factory()
+        with session.begin():
+            session.add_all([CardReadingEntity(card_reading_dto) for card_reading_dto in card_reading_dtos])
+    except Exception:  # pylint: disable=W0718
+        logger.error("Failed to record card readings in the database", exc_info=True)
 
 
 def persist_card_reading(card_reading_dto: CardReading) -> None:
@@ -128,6 +658,7 @@ def persist_card_reading(card_reading_dto: CardReading) -> None:
     If the app fails to connect to the database, then an error is printed to stderr.
     """
     try:
+        from .. db import CardReadingEntity  # pylint: disable=C0415
         session = session_factory()
         with session.begin():
             session.add(CardReadingEntity(card_reading_dto))
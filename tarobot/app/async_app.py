@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+"""This module contains the asyncio variant of tarobot's reading pipeline, for many concurrent readings per process.
+
+Identical chat completion requests that are in flight at the same time are coalesced: the first one goes to openai,
+and the rest await its completion, each building its own card reading from the shared result. This absorbs bursts
+of the same given-card spread, e.g. everyone asking for today's card of the day at once.
+"""
+
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from .. tarot import CardReading, Spread
+from . app import build_card_reading, build_card_readings, construct_chat_completion_request, create_tarot_spread, \
+    elapsed_ms, join_choices, open_request_services, persist_card_readings, RequestLatency, STOP_SEQUENCE, \
+    StreamedCompletion
+from . command_parser import CommandDto
+from . config import Config, get_config
+from . response_cache import cache_key
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from . rate_limiter import RateLimiter
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncApp:  # pylint: disable=R0902
+    """Creates, interprets, and persists tarot card readings on an asyncio event loop.
+
+    A single AsyncApp can drive hundreds of concurrent readings; the number of chat completion requests in flight
+    at once is bounded by max_concurrency (defaults to the openai.max-concurrency config setting). When the app is one
+    of several worker processes, rate_limit_workers of them share the configured rate limits evenly."""
+
+    def __init__(self, config_opt: Optional[Config] = None, openai_client: Optional['AsyncOpenAI'] = None,
+                 max_concurrency: Optional[int] = None, rate_limit_workers: int = 1):
+        self.__config = config_opt if config_opt is not None else get_config()
+        self._openai_client = openai_client
+        (self.response_cache, self.rate_limiter) = open_request_services(self.__config, rate_limit_workers)
+        if max_concurrency is None:
+            max_concurrency = self.__config.openai.max_concurrency
+        if max_concurrency < 1:
+            raise ValueError(f"max concurrency must be at least 1, not {max_concurrency}")
+        self.max_concurrency = max_concurrency
+        self._request_slots = asyncio.Semaphore(max_concurrency)
+        # chat completion requests in flight, by cache key
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.coalesced_count = 0
+
+    @property
+    def openai_client(self) -> 'AsyncOpenAI':
+        """The async openai client (and its pooled http connections) shared by all readings, created on first use."""
+        if self._openai_client is None:
+            from openai import AsyncOpenAI  # pylint: disable=C0415
+            # the rate limiter does its own retrying, paced across all requests
+            max_retries = 0 if self.rate_limiter is not None else 2
+            self._openai_client = AsyncOpenAI(api_key=self.__config.openai.api_key, max_retries=max_retries)
+        return self._openai_client
+
+    async def generate_card_reading(self, command: CommandDto) -> CardReading:
+        """Runs the whole pipeline for one command: creates the spread, interprets it, and persists it if requested.
+
+        Returns the reading of the first choice, see generate_card_reading_choices for spreads with n > 1 choices."""
+        return (await self.generate_card_reading_choices(command))[0]
+
+    async def generate_card_reading_choices(self, command: CommandDto,
+                                            on_token: Optional[Callable[[str], None]] = None) -> List[CardReading]:
+        """Runs the whole pipeline for one command, returning (and persisting, if requested) a reading per choice.
+
+        When on_token is given, the response is streamed, and the first choice's tokens are passed to it as they
+        arrive."""
+        spread = create_tarot_spread(command)
+        card_readings = await self.interpret_tarot_spread_choices(spread, command, on_token)
+        if command.persist_reading:
+            # the db session is synchronous; keep it off the event loop
+            await asyncio.to_thread(persist_card_readings, card_readings)
+        return card_readings
+
+    async def generate_card_readings(self, commands: Iterable[CommandDto]) -> AsyncIterator[CardReading]:
+        """Runs the pipeline for every command concurrently, yielding each card reading as soon as it completes.
+
+        Spreads with n > 1 choices yield a reading per choice. Commands are only pulled from the iterable as request
+        slots free up, keeping memory and open requests flat no matter how many commands there are."""
+        max_pending = 2 * self.max_concurrency
+        pending: Set[asyncio.Task] = set()
+        commands = iter(commands)
+        try:
+            while True:
+                while len(pending) < max_pending:
+                    command = next(commands, None)
+                    if command is None:
+                        break
+                    pending.add(asyncio.ensure_future(self.generate_card_reading_choices(command)))
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    for card_reading in task.result():
+                        yield card_reading
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def interpret_tarot_spread(self, spread: Spread, command: CommandDto) -> CardReading:
+        """Asks openai to generate a tarot card reading for the given spread, waiting for a free request slot.
+
+        Returns the reading of the first choice, see interpret_tarot_spread_choices for spreads with n > 1 choices."""
+        return (await self.interpret_tarot_spread_choices(spread, command))[0]
+
+    async def interpret_tarot_spread_choices(self, spread: Spread, command: CommandDto,
+                                             on_token: Optional[Callable[[str], None]] = None) -> List[CardReading]:
+        """Asks openai to generate tarot card readings for the given spread, one per choice of the one completion.
+
+        When on_token is given, the response is streamed (and so never coalesced with other requests), and the first
+        choice's tokens are passed to it as they arrive."""
+        completion_kwargs = construct_chat_completion_request(spread)
+        # the cache is sqlite on disk, so it is read and written off the event loop, like persistence
+        cached = await asyncio.to_thread(self.response_cache.get, completion_kwargs) \
+            if self.response_cache is not None else None
+        latency = None
+        if cached is not None:
+            completion, response = cached
+            if on_token is not None:
+                # only the first choice is streamed, just as when the response comes from openai
+                on_token(completion.choices[0].message.content or '')
+        elif on_token is not None:
+            async with self._request_slots:
+                completion, response, latency = await _execute_async_streaming_chat_completion_request(
+                    self.openai_client, completion_kwargs, on_token, self.rate_limiter)
+            if self.response_cache is not None:
+                await asyncio.to_thread(self.response_cache.put, completion_kwargs, completion, response)
+        else:
+            completion, response, latency = await self._request_chat_completion(completion_kwargs)
+        if len(completion.choices) == 1:
+            return [build_card_reading(completion, response, spread, spread.prompt, command.spread_parameters,
+                                       completion_kwargs, latency)]
+        return build_card_readings(completion, spread, spread.prompt, command.spread_parameters, completion_kwargs,
+                                   latency)
+
+    async def _request_chat_completion(self, completion_kwargs) -> Tuple[any, str, RequestLatency]:
+        """Sends the chat completion request, or joins an identical request that is already in flight."""
+        key = cache_key(completion_kwargs)
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.coalesced_count += 1
+            logger.debug("Coalescing chat completion request %s with the one in flight", key)
+        else:
+            in_flight = asyncio.ensure_future(self._execute_chat_completion_request(completion_kwargs))
+            self._in_flight[key] = in_flight
+            in_flight.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # one caller giving up must not cancel the request for the others awaiting it
+        return await asyncio.shield(in_flight)
+
+    async def _execute_chat_completion_request(self, completion_kwargs) -> Tuple[any, str, RequestLatency]:
+        """Sends the chat completion request once a request slot is free, caching its response."""
+        async with self._request_slots:
+            completion, response, latency = await _execute_async_chat_completion_request(
+                self.openai_client, completion_kwargs, self.rate_limiter)
+        if self.response_cache is not None:
+            await asyncio.to_thread(self.response_cache.put, completion_kwargs, completion, response)
+        return completion, response, latency
+
+
+async def _execute_async_chat_completion_request(openai_client: 'AsyncOpenAI',
+                                                 chat_completion_kwargs,
+                                                 rate_limiter: Optional['RateLimiter'] = None) \
+        -> Tuple[any, str, RequestLatency]:
+    """Executes an async openai completion request, returning a tuple of the Completion object, response string, and
+    the request's latency (excluding any time spent waiting for a request slot).
+
+    When a rate limiter is given, the request is paced by it and retried if it gets rate limited."""
+    # tell the api this conversation is over
+    chat_completion_kwargs['stop'] = STOP_SEQUENCE
+    start = time.perf_counter()
+    if rate_limiter is not None:
+        chat_completion = await rate_limiter.create_chat_completion_async(openai_client, chat_completion_kwargs)
+    else:
+        chat_completion = await openai_client.chat.completions.create(**chat_completion_kwargs)
+    return chat_completion, join_choices(chat_completion), RequestLatency(elapsed_ms(start))
+
+
+async def _execute_async_streaming_chat_completion_request(openai_client: 'AsyncOpenAI', chat_completion_kwargs,
+                                                           on_token: Callable[[str], None],
+                                                           rate_limiter: Optional['RateLimiter'] = None) \
+        -> Tuple[any, str, RequestLatency]:
+    """Executes a streamed async openai completion request, passing the first choice's tokens to on_token as they
+    arrive. Returns a tuple of the completion assembled from the stream, the response string, and the request's
+    latency, including the time to the first token."""
+    # tell the api this conversation is over
+    chat_completion_kwargs['stop'] = STOP_SEQUENCE
+    # the pinned openai client predates the stream_options parameter, so it is passed through the request body
+    stream_kwargs = dict(chat_completion_kwargs, stream=True, extra_body={'stream_options': {'include_usage': True}})
+    start = time.perf_counter()
+    if rate_limiter is not None:
+        stream = await rate_limiter.create_chat_completion_async(openai_client, stream_kwargs)
+    else:
+        stream = await openai_client.chat.completions.create(**stream_kwargs)
+    streamed_completion = StreamedCompletion(start, on_token)
+    try:
+        async for chunk in stream:
+            streamed_completion.add_chunk(chunk)
+    finally:
+        await stream.close()
+    chat_completion = streamed_completion.assemble()
+    latency = RequestLatency(elapsed_ms(start), streamed_completion.time_to_first_token_ms)
+    return chat_completion, join_choices(chat_completion), latency
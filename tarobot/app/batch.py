@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""This module runs tarot card readings in bulk: JSONL reading requests in, JSONL card readings out.
+
+Each input line is a json object such as:
+    {"id": "r-1", "spread_type": "card-list", "parameters": {"teller": "Dr Seuss"}, "cards": ["The Fool"]}
+Only spread_type is required. Each output line carries the input's line number (and id, when given) along with
+either the resulting "reading" or an "error" message. Readings are written in completion order, not input order.
+Spreads configured with n > 1 choices produce one output line per choice, each tagged with its "choice" index.
+"""
+
+import asyncio
+from dataclasses import dataclass
+import json
+import logging
+import sys
+from typing import Dict, Iterable, Iterator, List, Set, TextIO, Tuple
+
+from .. tarot import CardReading
+from . async_app import AsyncApp
+from . command_parser import CommandParser
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchSummary:
+    """Counts of the reading requests processed by a batch run."""
+    succeeded: int = 0
+    failed: int = 0
+
+
+async def run_batch(app: AsyncApp, parser: CommandParser, input_lines: Iterable[str], output_file: TextIO,
+                    persist_reading: bool = False) -> BatchSummary:
+    """Streams reading requests from the input lines, writing each result to the output file as it completes.
+
+    Input lines are only read as request slots free up, keeping memory flat no matter how long the input is."""
+    summary = BatchSummary()
+    max_pending = 2 * app.max_concurrency
+    pending: Set[asyncio.Task] = set()
+    lines = enumerate(input_lines, start=1)
+    while True:
+        # read the next input line off the event loop, since stdin may block on its producer
+        next_line = await asyncio.to_thread(next, lines, None)
+        if next_line is None:
+            break
+        (line_number, line) = next_line
+        if not line.strip():
+            continue
+        pending.add(asyncio.ensure_future(_process_line(app, parser, line_number, line, persist_reading)))
+        if len(pending) >= max_pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            _write_results(done, output_file, summary)
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        _write_results(done, output_file, summary)
+    logger.info("Batch complete: %d readings succeeded, %d failed", summary.succeeded, summary.failed)
+    return summary
+
+
+async def _process_line(app: AsyncApp, parser: CommandParser, line_number: int, line: str,
+                        persist_reading: bool) -> Tuple[bool, List[Dict[str, any]]]:
+    """Validates and executes the reading request on one input line, returning whether it succeeded and its results."""
+    result: Dict[str, any] = {'line': line_number}
+    try:
+        request = json.loads(line)
+        if isinstance(request, dict) and 'id' in request:
+            result['id'] = request['id']
+        command = parser.parse_reading_request(request)
+        command.persist_reading = command.persist_reading or persist_reading
+        card_readings: List[CardReading] = await app.generate_card_reading_choices(command)
+        if len(card_readings) == 1:
+            return True, [dict(result, reading=card_readings[0].to_dict(encode_json=True))]
+        return True, [dict(result, choice=index, reading=card_reading.to_dict(encode_json=True))
+                      for (index, card_reading) in enumerate(card_readings)]
+    except Exception as error:  # pylint: disable=W0718
+        # one bad request or failed completion must not take down the rest of the batch
+        logger.debug("Reading request on line %d failed: %s", line_number, error)
+        result['error'] = f"{type(error).__name__}: {error}"
+        return False, [result]
+
+
+def _write_results(done: Set[asyncio.Task], output_file: TextIO, summary: BatchSummary) -> None:
+    """Writes the results of the completed tasks as json lines, tallying successes and failures."""
+    for task in done:
+        (succeeded, results) = task.result()
+        if succeeded:
+            summary.succeeded += 1
+        else:
+            summary.failed += 1
+        for result in results:
+            output_file.write(json.dumps(result) + "\n")
+    output_file.flush()
+
+
+def iter_lines(path: str) -> Iterator[str]:
+    """Iterates over the lines of the given file, or of stdin for "-"."""
+    if path == '-':
+        yield from sys.stdin
+        return
+    with open(path, encoding='utf-8') as input_file:
+        yield from input_file
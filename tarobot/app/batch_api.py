@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+
+"""This module pre-generates tarot card readings in bulk through openai's offline Batch API.
+
+The pipeline renders every reading request (the same jsonl requests the batch command reads) into a Batch API request
+file, alongside a manifest recording the spread behind each request. It then submits the request file, polls until
+the batch is done, and ingests the result file back into card readings, which are written out as jsonl and bulk
+inserted into the database when requested. Submitting and polling go through a pluggable BatchTransport, so the whole
+pipeline can run against the local, file-based FileBatchTransport as well as against openai itself.
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import asdict
+import json
+import logging
+import os
+from os.path import exists, join
+import shutil
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterable, List, Optional, TextIO
+from uuid import uuid4
+
+from .. tarot import CardReading, ChatCompletionParameters, Spread, SpreadType, TarotCard
+from . app import build_card_reading, build_card_readings, construct_chat_completion_request, create_tarot_spread, \
+    join_choices, persist_card_readings, STOP_SEQUENCE
+from . batch import BatchSummary
+from . command_parser import CommandParser
+
+
+logger = logging.getLogger(__name__)
+
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+"""The api endpoint every request in a batch is sent to."""
+
+TERMINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+"""Batch statuses after which the batch will make no further progress."""
+
+REQUESTS_FILE = "requests.jsonl"
+MANIFEST_FILE = "manifest.jsonl"
+RESULTS_FILE = "results.jsonl"
+BATCH_ID_FILE = "batch-id"
+
+
+class BatchTransport(ABC):
+    """Submits a Batch API request file, reports on the batch's progress, and retrieves its result file."""
+
+    @abstractmethod
+    def submit(self, requests_path: str) -> str:
+        """Submits the request file as a new batch, returning its batch id."""
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        """Returns the batch's status, e.g. in_progress or completed."""
+
+    @abstractmethod
+    def download_results(self, batch_id: str, results_path: str) -> None:
+        """Writes the results of a finished batch, successes and errors alike, to the given path."""
+
+
+class OpenAIBatchTransport(BatchTransport):
+    """Runs batches on openai's Batch API.
+
+    The pinned openai client predates its batches resource, so batches are managed through the client's generic
+    http methods, which still handle authentication and retries."""
+
+    def __init__(self, openai_client, completion_window: str = "24h"):
+        self.openai_client = openai_client
+        self.completion_window = completion_window
+
+    def submit(self, requests_path: str) -> str:
+        with open(requests_path, 'rb') as requests_file:
+            input_file = self.openai_client.files.create(file=requests_file, purpose='batch')
+        batch = self.openai_client.post('/batches', cast_to=object, body={
+            'input_file_id': input_file.id,
+            'endpoint': BATCH_ENDPOINT,
+            'completion_window': self.completion_window
+        })
+        return batch['id']
+
+    def status(self, batch_id: str) -> str:
+        return self._retrieve(batch_id)['status']
+
+    def download_results(self, batch_id: str, results_path: str) -> None:
+        batch = self._retrieve(batch_id)
+        with open(results_path, 'wb') as results_file:
+            for file_id in [batch.get('output_file_id'), batch.get('error_file_id')]:
+                if file_id is not None:
+                    content = self.openai_client.files.content(file_id).content
+                    results_file.write(content)
+                    # the error file is appended to the output file, so its first line must start a line of its own
+                    if content and not content.endswith(b'\n'):
+                        results_file.write(b'\n')
+
+    def _retrieve(self, batch_id: str) -> Dict[str, any]:
+        """Fetches the batch object from the api."""
+        return self.openai_client.get(f'/batches/{batch_id}', cast_to=object)
+
+
+class FileBatchTransport(BatchTransport):
+    """A local stand-in for the Batch API, keeping each batch in a directory under the root directory.
+
+    Every request of a submitted batch is answered by the responder, which takes a chat completion request body and
+    returns a chat completion response body, e.g. by executing the request synchronously or by returning a canned
+    response. The batch is completed by the time submit returns."""
+
+    def __init__(self, root_dir: str, responder: Callable[[Dict[str, any]], Dict[str, any]]):
+        self.root_dir = root_dir
+        self.responder = responder
+
+    def submit(self, requests_path: str) -> str:
+        batch_id = f"batch_{uuid4().hex}"
+        batch_dir = join(self.root_dir, batch_id)
+        os.makedirs(batch_dir)
+        shutil.copyfile(requests_path, join(batch_dir, REQUESTS_FILE))
+        with open(requests_path, encoding='utf-8') as requests_file, \
+                open(join(batch_dir, RESULTS_FILE), 'w', encoding='utf-8') as results_file:
+            for (request_number, line) in enumerate(requests_file, start=1):
+                request = json.loads(line)
+                results_file.write(json.dumps(self._respond(f"batch_req_{request_number}", request)) + "\n")
+        with open(join(batch_dir, 'status'), 'w', encoding='utf-8') as status_file:
+            status_file.write('completed')
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        with open(join(self.root_dir, batch_id, 'status'), encoding='utf-8') as status_file:
+            return status_file.read().strip()
+
+    def download_results(self, batch_id: str, results_path: str) -> None:
+        shutil.copyfile(join(self.root_dir, batch_id, RESULTS_FILE), results_path)
+
+    def _respond(self, request_id: str, request: Dict[str, any]) -> Dict[str, any]:
+        """Answers one batch request in the Batch API's result format."""
+        result = {'id': request_id, 'custom_id': request['custom_id'], 'response': None, 'error': None}
+        try:
+            result['response'] = {'status_code': 200, 'request_id': request_id, 'body': self.responder(request['body'])}
+        except Exception as error:  # pylint: disable=W0718
+            # a failed request is reported in its result, just like the real api does
+            result['error'] = {'code': type(error).__name__, 'message': str(error)}
+        return result
+
+
+def run_batch_api(transport: BatchTransport, parser: CommandParser,  # pylint: disable=R0913,R0914
+                  input_lines: Iterable[str], work_dir: str, output_file: TextIO, persist_reading: bool = False,
+                  poll_interval_secs: float = 60, batch_id: Optional[str] = None) -> BatchSummary:
+    """Runs the whole pipeline: render the requests, submit them, wait for the batch, and ingest its results.
+
+    When a batch id is given, rendering and submitting are skipped and the existing batch (whose manifest is in the
+    work dir) is waited on and ingested instead, e.g. to resume a run that was interrupted while polling."""
+    os.makedirs(work_dir, exist_ok=True)
+    summary = BatchSummary()
+    if batch_id is None:
+        with open(join(work_dir, REQUESTS_FILE), 'w', encoding='utf-8') as requests_file, \
+                open(join(work_dir, MANIFEST_FILE), 'w', encoding='utf-8') as manifest_file:
+            summary = render_batch_requests(parser, input_lines, requests_file, manifest_file)
+        if summary.succeeded == 0:
+            logger.warning("No valid reading requests to submit")
+            return summary
+        batch_id = transport.submit(join(work_dir, REQUESTS_FILE))
+        with open(join(work_dir, BATCH_ID_FILE), 'w', encoding='utf-8') as batch_id_file:
+            batch_id_file.write(batch_id)
+        logger.info("Submitted batch %s of %d reading requests", batch_id, summary.succeeded)
+    status = wait_for_batch(transport, batch_id, poll_interval_secs)
+    if status == 'failed':
+        raise RuntimeError(f"Batch {batch_id} failed")
+    results_path = join(work_dir, RESULTS_FILE)
+    transport.download_results(batch_id, results_path)
+    manifest = load_manifest(join(work_dir, MANIFEST_FILE))
+    with open(results_path, encoding='utf-8') as results_file:
+        ingested = ingest_batch_results(results_file, manifest, output_file, persist_reading)
+    # requests that failed to render never made it into the batch, but still count as failures
+    ingested.failed += summary.failed
+    logger.info("Batch %s ingested: %d readings succeeded, %d failed", batch_id, ingested.succeeded, ingested.failed)
+    return ingested
+
+
+def render_batch_requests(parser: CommandParser, input_lines: Iterable[str], requests_file: TextIO,
+                          manifest_file: TextIO) -> BatchSummary:
+    """Renders each reading request into a Batch API request line, recording the spread behind it in the manifest."""
+    summary = BatchSummary()
+    for (line_number, line) in enumerate(input_lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            command = parser.parse_reading_request(request)
+            spread = create_tarot_spread(command)
+        except Exception as error:  # pylint: disable=W0718
+            # one bad request must not hold back the rest of the batch
+            logger.warning("Skipping reading request on line %d: %s", line_number, error)
+            summary.failed += 1
+            continue
+        custom_id = f"line-{line_number}"
+        completion_kwargs = construct_chat_completion_request(spread)
+        # tell the api this conversation is over
+        completion_kwargs['stop'] = STOP_SEQUENCE
+        requests_file.write(json.dumps({'custom_id': custom_id, 'method': 'POST', 'url': BATCH_ENDPOINT,
+                                        'body': completion_kwargs}) + "\n")
+        manifest_file.write(json.dumps({
+            'custom_id': custom_id,
+            'id': request.get('id'),
+            'spread_type': str(spread.spread_type),
+            'cards': [tarot_card.value for tarot_card in spread.tarot_cards],
+            'seed': spread.seed,
+            'parameters': command.spread_parameters,
+            'prompt': spread.prompt,
+            'chat_completion_config': asdict(spread.chat_completion_config),
+            'persist_reading': command.persist_reading
+        }) + "\n")
+        summary.succeeded += 1
+    return summary
+
+
+def wait_for_batch(transport: BatchTransport, batch_id: str, poll_interval_secs: float) -> str:
+    """Polls the batch until it reaches a terminal status, which is returned."""
+    while True:
+        status = transport.status(batch_id)
+        if status in TERMINAL_STATUSES:
+            return status
+        logger.info("Batch %s is %s, checking again in %s secs", batch_id, status, poll_interval_secs)
+        time.sleep(poll_interval_secs)
+
+
+def load_manifest(manifest_path: str) -> Dict[str, Dict[str, any]]:
+    """Loads the manifest of a rendered batch, keyed by each request's custom id."""
+    if not exists(manifest_path):
+        raise ValueError(f"No batch manifest found at {manifest_path}")
+    with open(manifest_path, encoding='utf-8') as manifest_file:
+        entries = [json.loads(line) for line in manifest_file if line.strip()]
+    return {entry['custom_id']: entry for entry in entries}
+
+
+def ingest_batch_results(results_lines: Iterable[str], manifest: Dict[str, Dict[str, any]],  # pylint: disable=R0913,R0914
+                         output_file: TextIO, persist_reading: bool = False, chunk_size: int = 500) -> BatchSummary:
+    """Turns the batch's results back into card readings, writing each one out as a json line.
+
+    Readings to be persisted are bulk inserted chunk_size at a time, each chunk in a single transaction."""
+    summary = BatchSummary()
+    pending: List[CardReading] = []
+    for line in results_lines:
+        if not line.strip():
+            continue
+        try:
+            result = json.loads(line)
+            if not isinstance(result, dict):
+                raise ValueError("Batch result is not a json object")
+        except ValueError as error:
+            # one truncated or malformed line is one failed result, not the end of the whole ingest
+            summary.failed += 1
+            output_file.write(json.dumps({'custom_id': None, 'error': f"{type(error).__name__}: {error}"}) + "\n")
+            continue
+        entry = manifest.get(result.get('custom_id'), {})
+        output: Dict[str, any] = {'custom_id': result.get('custom_id')}
+        if entry.get('id') is not None:
+            output['id'] = entry['id']
+        try:
+            card_readings = _to_card_readings(result, entry)
+        except (KeyError, TypeError, ValueError) as error:
+            summary.failed += 1
+            output['error'] = f"{type(error).__name__}: {error}"
+            output_file.write(json.dumps(output) + "\n")
+            continue
+        summary.succeeded += 1
+        for (index, card_reading) in enumerate(card_readings):
+            choice = {'choice': index} if len(card_readings) > 1 else {}
+            output_file.write(json.dumps(dict(output, **choice, reading=card_reading.to_dict(encode_json=True))) + "\n")
+        if persist_reading or entry.get('persist_reading'):
+            pending.extend(card_readings)
+            if len(pending) >= chunk_size:
+                persist_card_readings(pending)
+                pending = []
+    if pending:
+        persist_card_readings(pending)
+    output_file.flush()
+    return summary
+
+
+def _to_card_readings(result: Dict[str, any], entry: Dict[str, any]) -> List[CardReading]:
+    """Rebuilds the card readings of one batch result from its response and the spread recorded in the manifest."""
+    if not entry:
+        raise ValueError(f"Unknown custom id: {result.get('custom_id')}")
+    if result.get('error'):
+        raise ValueError(_error_message(result['error']))
+    response = result['response']
+    if response['status_code'] != 200:
+        body = response.get('body')
+        raise ValueError(f"status {response['status_code']}: "
+                         f"{_error_message(body.get('error') if isinstance(body, dict) else body)}")
+    completion = _to_completion(response['body'])
+    completion_config = ChatCompletionParameters(**entry['chat_completion_config'])
+    spread = Spread(spread_type=SpreadType(entry['spread_type']),
+                    tarot_cards=[TarotCard(card) for card in entry['cards']],
+                    parameters=entry['parameters'],
+                    chat_completion_config=completion_config,
+                    prompt=entry['prompt'],
+                    seed=entry.get('seed'))
+    completion_kwargs = {name: value for (name, value) in asdict(completion_config).items() if value is not None}
+    if len(completion.choices) == 1:
+        return [build_card_reading(completion, join_choices(completion), spread, spread.prompt, entry['parameters'],
+                                   completion_kwargs)]
+    return build_card_readings(completion, spread, spread.prompt, entry['parameters'], completion_kwargs)
+
+
+def _error_message(error) -> str:
+    """The message of a batch result's error, which is usually an object with a message, but may be any json value."""
+    if isinstance(error, dict):
+        return str(error.get('message') or error)
+    return str(error)
+
+
+def _to_completion(body: Dict[str, any]) -> SimpleNamespace:
+    """Rebuilds a completion-like object from a result's chat completion response body."""
+    return SimpleNamespace(
+        id=body['id'],
+        model=body['model'],
+        created=body['created'],
+        usage=SimpleNamespace(**body['usage']),
+        choices=[SimpleNamespace(message=SimpleNamespace(content=choice['message']['content']))
+                 for choice in body['choices']])
+
+
+def read_batch_id(work_dir: str) -> Optional[str]:
+    """Returns the id of the batch last submitted from the work dir, if there is one."""
+    batch_id_path = join(work_dir, BATCH_ID_FILE)
+    if not exists(batch_id_path):
+        return None
+    with open(batch_id_path, encoding='utf-8') as batch_id_file:
+        return batch_id_file.read().strip() or None
@@ -2,24 +2,48 @@
 
 """Utility that parses the user input into commands and options for tarobot."""
 
-from argparse import ArgumentParser, RawTextHelpFormatter
-from dataclasses import dataclass
+from argparse import ArgumentError, ArgumentParser, ArgumentTypeError, RawTextHelpFormatter
+from dataclasses import dataclass, field
+from enum import Enum
+import os
 from typing import Dict, List, Optional, Tuple
 
 from . config import Config, Tarot as TarotConfig
-from .. tarot import spread_builder, resolver, SpreadTemplate, SpreadType, TarotCard, TarotDeck
+from .. tarot import CardSet, get_reading_config, get_spread_builder, ReadingConfig, SpreadTemplate, SpreadType, \
+    TarotCard
+from .. tarot.rng import check_seed, MAX_SEED
+
+
+class CommandType(str, Enum):
+    """Enumeration of the utility commands that run alongside the spread-type commands."""
+    BUILD_SNAPSHOT = "build-snapshot"
+    BATCH = "batch"
+    BATCH_API = "batch-api"
+    SERVE = "serve"
+    DAEMON = "daemon"
+    SIMULATE = "simulate"
+
+    def __str__(self):
+        return self.value
 
 
 @dataclass
-class CommandDto:
+class CommandDto:  # pylint: disable=R0902
     """Data class used for storing the commands given to the application from the user."""
     show_prompt: bool = False
     show_diagnostics: bool = False
     persist_reading: bool = False
+    stream_response: bool = False
     spread_type: SpreadType = SpreadType.CARD_LIST
     spread_parameters: Optional[Dict[str, str]] = None
     given_cards: List[TarotCard] = None
     card_count: int = 3
+    seed: Optional[int] = None
+    command_type: Optional[CommandType] = None
+    command_options: Optional[Dict[str, any]] = None
+    daemon_socket: Optional[str] = None
+    reading_config: Optional[ReadingConfig] = field(default=None, compare=False, repr=False)
+    """The spread and alias config the command was validated against, and its spread is to be built with."""
 
 
 class CommandParser:
@@ -39,38 +63,110 @@ class CommandParser:
         parsed_command.show_prompt = self.parsed_args.show_prompt
         parsed_command.show_diagnostics = self.parsed_args.show_diagnostics
         parsed_command.persist_reading = self.parsed_args.persist_reading
-        parsed_command.spread_type = SpreadType(self.parsed_args.spread_type)
-        spread_template: SpreadTemplate = [template
-                                           for template in spread_builder.spread_type_to_template.values()
+        parsed_command.stream_response = self.parsed_args.stream
+        parsed_command.daemon_socket = self.parsed_args.daemon_socket
+        if self.parsed_args.command in set(CommandType):
+            parsed_command.command_type = CommandType(self.parsed_args.command)
+            parsed_command.command_options = {option: value for (option, value) in vars(self.parsed_args).items()
+                                              if option not in _global_options}
+            if parsed_command.command_type == CommandType.SIMULATE:
+                parsed_command.command_options['card_count'] = self.parse_simulated_card_count()
+            return parsed_command
+        parsed_command.spread_type = SpreadType(self.parsed_args.command)
+        parsed_command.reading_config = get_reading_config()
+        spread_template: SpreadTemplate = [template for template in
+                                           parsed_command.reading_config.spread_builder.spread_type_to_template.values()
                                            if template.type == parsed_command.spread_type][0]
         if spread_template.required_card_count is not None:
             parsed_command.card_count = spread_template.required_card_count
         else:
             parsed_command.card_count = self.parsed_args.card_count
         if self.parsed_args.card is not None:
-            parsed_command.given_cards = self.parse_given_tarot_cards(spread_template)
+            parsed_command.given_cards = self.parse_given_tarot_cards(spread_template,
+                                                                      reading_config=parsed_command.reading_config)
+        if self.parsed_args.seed is not None:
+            check_seed(self.parsed_args.seed)
+            parsed_command.seed = self.parsed_args.seed
         parsed_command.spread_parameters = {}
         if spread_template.required_parameters is not None:
             for parameter in spread_template.required_parameters.keys():
                 parsed_command.spread_parameters[parameter] = getattr(self.parsed_args, parameter)
         return parsed_command
 
-    def parse_given_tarot_cards(self, spread_template: SpreadTemplate):
-        """Helper method for validating and parsing the given tarot cards."""
+    def parse_simulated_card_count(self) -> int:
+        """Helper method for resolving the number of cards in each spread of the simulate command.
+
+        Raises an ArgumentError if the spread has a fixed number of cards, and a different card count was given."""
+        template = get_spread_builder().spread_type_to_template[SpreadType(self.parsed_args.spread_type)]
+        card_count = self.parsed_args.card_count
+        if template.required_card_count is None:
+            return self.config.tarot.default_cards if card_count is None else card_count
+        if card_count not in (None, template.required_card_count):
+            raise ArgumentError(None, f"{template.type} spreads always have exactly {template.required_card_count} "
+                                      f"card[s], so --card-count {card_count} can not be simulated")
+        return template.required_card_count
+
+    def parse_reading_request(self, request: Dict[str, any]) -> CommandDto:
+        """Validates a reading request given as a dictionary, e.g. one line of a batch file, into a command dto.
+
+        The request names its spread_type, and may give spread parameters, a card_count, or a list of cards. Spread
+        parameters left out of the request take on their default values, just like omitted command line args. The
+        request is validated against the shared reading config as of now, which the command keeps to build its spread
+        with, so a config reloaded in the meantime can not change the rules halfway through a reading."""
+        if not isinstance(request, dict):
+            raise ValueError("Reading request must be a json object")
+        parsed_command = CommandDto(persist_reading=bool(request.get('persist_reading', False)),
+                                    reading_config=get_reading_config())
+        try:
+            parsed_command.spread_type = SpreadType(request.get('spread_type'))
+        except ValueError as cause:
+            raise ValueError(f"Unknown spread type: {request.get('spread_type')}") from cause
+        spread_template = parsed_command.reading_config.spread_builder.spread_type_to_template[
+            parsed_command.spread_type]
+        min_cards, max_cards = _get_min_max_card_count_for_template(spread_template, self.config.tarot)
+        card_count = request.get('card_count', spread_template.required_card_count or self.config.tarot.default_cards)
+        # bool is a subclass of int, but a card count of true is no card count
+        if isinstance(card_count, bool) or not isinstance(card_count, int) \
+                or card_count not in range(min_cards, max_cards + 1):
+            raise ValueError(f"Only [{min_cards}-{max_cards}] cards allowed in the tarot card spread")
+        parsed_command.card_count = card_count
+        cards = request.get('cards')
+        if cards is not None:
+            if not isinstance(cards, list) or not all(isinstance(card_name, str) for card_name in cards):
+                raise ValueError("Cards must be given as a list of card names")
+            parsed_command.given_cards = self.parse_given_tarot_cards(spread_template, cards,
+                                                                      parsed_command.reading_config)
+        if request.get('seed') is not None:
+            check_seed(request['seed'])
+            parsed_command.seed = request['seed']
+        parameters = request.get('parameters') or {}
+        if not isinstance(parameters, dict):
+            raise ValueError("Parameters must be given as a json object of parameter names to values")
+        parsed_command.spread_parameters = {}
+        if spread_template.required_parameters is not None:
+            for (param_name, parameter) in spread_template.required_parameters.items():
+                value = parameters.get(param_name, parameter.default_value)
+                if value is not None:
+                    parsed_command.spread_parameters[param_name] = str(value)
+        return parsed_command
+
+    def parse_given_tarot_cards(self, spread_template: SpreadTemplate, card_names: Optional[List[str]] = None,
+                                reading_config: Optional[ReadingConfig] = None):
+        """Helper method for validating and parsing the given tarot cards (defaults to the --card args), resolved with
+        the given reading config's aliases (defaults to the shared reading config)."""
+        if card_names is None:
+            card_names = self.parsed_args.card
         # ensure the cards are valid tarot cards
-        parsed_cards = []
-        for given_card_name in self.parsed_args.card:
-            tarot_card = resolver.get_optional_card_by_alias(given_card_name)
-            if tarot_card is None:
-                raise ValueError(f"Unknown card: {given_card_name}")
-            parsed_cards.append(tarot_card)
+        resolved = (reading_config or get_reading_config()).resolver.resolve_many(card_names)
+        if resolved.failures:
+            raise ValueError(f"Unknown card: {resolved.failures[0][1]}")
+        parsed_cards = resolved.cards
         # ensure a given card isn't used more than once
-        tarot_deck = TarotDeck()
+        given_cards = CardSet()
         for card in parsed_cards:
-            try:
-                tarot_deck.cards.remove(card)
-            except ValueError as cause:
-                raise ValueError(f"Duplicate card: {card}") from cause
+            if card in given_cards:
+                raise ValueError(f"Duplicate card: {card}")
+            given_cards = given_cards.with_card(card)
         min_cards, max_cards = _get_min_max_card_count_for_template(spread_template, self.config.tarot)
         if len(parsed_cards) not in range(min_cards, max_cards + 1):
             raise ValueError(f"Only [{min_cards}-{max_cards}] cards allowed in the tarot card spread")
@@ -103,16 +199,186 @@ def _build_parser(config: Config) -> ArgumentParser:
         '--persist-reading',
         help='records card reading (inputs, prompt, result, metadata) in the database\n\n',
         action='store_true')
+    parser.add_argument(
+        '--stream',
+        help='writes the response to stdout as it is generated, token by token\n\n',
+        action='store_true')
+    parser.add_argument(
+        '--daemon-socket',
+        help='sends the reading to the tarobot daemon listening on this unix socket, running it in-process\n'
+             'instead if no daemon is running\ndefault: TAROBOT_DAEMON_SOCKET environment variable, if set\n\n',
+        metavar='PATH')
     spread_type_subparsers = parser.add_subparsers(
         title='spread-type',
-        dest='spread_type',
+        dest='command',
         description='commands which type of tarot spread to use for the reading\n\n',
         required=True)
-    for spread_template in spread_builder.spread_type_to_template.values():
+    for spread_template in get_spread_builder().spread_type_to_template.values():
         _build_spread_type_parser(spread_type_subparsers, spread_template, tarot)
+    _build_command_type_parsers(spread_type_subparsers, tarot)
     return parser
 
 
+_global_options = {'show_prompt', 'show_diagnostics', 'persist_reading', 'stream', 'daemon_socket', 'command'}
+"""The options shared by all commands, which are stored in their own command dto fields."""
+
+
+def _build_command_type_parsers(subparsers, tarot: TarotConfig) -> None:
+    """Constructs the subparsers for the utility commands."""
+    subparsers.add_parser(
+        CommandType.BUILD_SNAPSHOT,
+        help='prebuilds the compiled config snapshot used at startup',
+        description='Parses the spread and alias config files and stores the compiled snapshot that later runs load\n'
+                    'instead of re-parsing the hocon config. The snapshot directory defaults to\n'
+                    '~/.cache/tarobot/snapshots and can be overridden with TAROBOT_SNAPSHOT_DIR.\n',
+        formatter_class=RawTextHelpFormatter,
+        exit_on_error=False)
+    batch_parser = subparsers.add_parser(
+        CommandType.BATCH,
+        help='streams jsonl reading requests in, and the resulting jsonl card readings out',
+        description='Reads one reading request per line, e.g.\n'
+                    '  {"id": "r-1", "spread_type": "card-list", "parameters": {"teller": "Dr Seuss"}}\n'
+                    'executes the readings concurrently, and writes one json result per line in completion order.\n',
+        formatter_class=RawTextHelpFormatter,
+        exit_on_error=False)
+    batch_parser.add_argument(
+        '--input',
+        help='jsonl file of reading requests\ndefault: stdin\n\n',
+        default='-')
+    batch_parser.add_argument(
+        '--output',
+        help='jsonl file for the resulting card readings\ndefault: stdout\n\n',
+        default='-')
+    batch_parser.add_argument(
+        '--max-concurrency',
+        help='maximum number of readings requested from openai at once\ndefault: openai.max-concurrency config\n\n',
+        type=_positive_int)
+    batch_api_parser = subparsers.add_parser(
+        CommandType.BATCH_API,
+        help='pre-generates jsonl reading requests in bulk through the offline openai batch api',
+        description='Renders one reading request per line (same format as the batch command) into a batch api\n'
+                    'request file, submits it, polls until the batch is done, and writes the resulting card readings\n'
+                    'as jsonl. The request, manifest, and result files are kept in the work dir.\n',
+        formatter_class=RawTextHelpFormatter,
+        exit_on_error=False)
+    batch_api_parser.add_argument(
+        '--work-dir',
+        help='directory for the batch\'s request, manifest, and result files\n\n',
+        required=True)
+    batch_api_parser.add_argument(
+        '--input',
+        help='jsonl file of reading requests\ndefault: stdin\n\n',
+        default='-')
+    batch_api_parser.add_argument(
+        '--output',
+        help='jsonl file for the resulting card readings\ndefault: stdout\n\n',
+        default='-')
+    batch_api_parser.add_argument(
+        '--transport',
+        help='where batches are run: openai, or a local file-based stand-in that answers each request directly\n'
+             'default: openai\n\n',
+        choices=['openai', 'file'],
+        default='openai')
+    batch_api_parser.add_argument(
+        '--poll-interval',
+        help='seconds between checks on the batch\'s progress\ndefault: 60\n\n',
+        type=float,
+        default=60)
+    batch_api_parser.add_argument(
+        '--resume',
+        help='waits on and ingests the batch last submitted from the work dir, instead of submitting a new one\n\n',
+        action='store_true')
+    serve_parser = subparsers.add_parser(
+        CommandType.SERVE,
+        help='runs a long-lived http service for tarot card readings',
+        description='Serves readings over http until interrupted. POST /readings takes one reading request\n'
+                    '(same format as a line of the batch command\'s input) and returns {"readings": [...]}.\n',
+        formatter_class=RawTextHelpFormatter,
+        exit_on_error=False)
+    serve_parser.add_argument(
+        '--host',
+        help='interface to listen on\ndefault: 127.0.0.1\n\n',
+        default='127.0.0.1')
+    serve_parser.add_argument(
+        '--port',
+        help='port to listen on\ndefault: 8080\n\n',
+        type=int,
+        default=8080)
+    serve_parser.add_argument(
+        '--max-concurrency',
+        help='maximum number of readings requested from openai at once\ndefault: openai.max-concurrency config\n\n',
+        type=_positive_int)
+    serve_parser.add_argument(
+        '--workers',
+        help='number of worker processes to fork, each with its own openai client and db connections, and an even\n'
+             'share of the configured rate limits\ndefault: 1 (serve from this process)\n\n',
+        type=_positive_int,
+        default=1)
+    serve_parser.add_argument(
+        '--watch-config',
+        help='reloads the spread and alias config whenever it changes, without a restart\n\n',
+        action='store_true')
+    daemon_parser = subparsers.add_parser(
+        CommandType.DAEMON,
+        help='runs a resident daemon that the cli sends its readings to',
+        description='Serves the readings requested by the cli over a unix socket until interrupted, keeping the\n'
+                    'config, openai client, and database connections warm between readings. The cli sends its\n'
+                    'readings to the daemon when given --daemon-socket or TAROBOT_DAEMON_SOCKET.\n',
+        formatter_class=RawTextHelpFormatter,
+        exit_on_error=False)
+    daemon_parser.add_argument(
+        '--socket',
+        help='unix socket to listen on\n'
+             'default: TAROBOT_DAEMON_SOCKET, otherwise tarobot.sock in $XDG_RUNTIME_DIR or ~/.cache/tarobot\n\n')
+    daemon_parser.add_argument(
+        '--max-concurrency',
+        help='maximum number of readings requested from openai at once\ndefault: openai.max-concurrency config\n\n',
+        type=_positive_int)
+    daemon_parser.add_argument(
+        '--watch-config',
+        help='reloads the spread and alias config whenever it changes, without a restart\n\n',
+        action='store_true')
+    simulate_parser = subparsers.add_parser(
+        CommandType.SIMULATE,
+        help='simulates many random draws to verify that they are unbiased',
+        description='Draws the given number of random spreads without asking openai for any readings, then reports\n'
+                    'how often every card, suit, and archana was drawn (overall and in each position) along with\n'
+                    'chi-square tests of those frequencies against a uniformly random draw. Exits with an error\n'
+                    'code if any test rejects uniformity.\n',
+        formatter_class=RawTextHelpFormatter,
+        exit_on_error=False)
+    simulate_parser.add_argument(
+        '--spread-type',
+        help='spread to draw, which may fix the number of cards\ndefault: card-list\n\n',
+        choices=[str(spread_type) for spread_type in SpreadType],
+        default=str(SpreadType.CARD_LIST))
+    simulate_parser.add_argument(
+        '--card-count',
+        help=f"number of cards in each spread, for spreads without a fixed number of cards "
+             f"[{tarot.min_cards}-{tarot.max_cards}]\ndefault: tarot.default-cards config\n\n",
+        type=int,
+        choices=range(tarot.min_cards, tarot.max_cards + 1))
+    simulate_parser.add_argument(
+        '--draws',
+        help='number of spreads to draw\ndefault: 1000000\n\n',
+        type=_positive_int,
+        default=1_000_000)
+    simulate_parser.add_argument(
+        '--seed',
+        help='seeds the simulation, making it reproducible for the same number of workers\n\n',
+        type=int)
+    simulate_parser.add_argument(
+        '--workers',
+        help='number of worker processes to draw with\ndefault: the number of cpus\n\n',
+        type=_positive_int,
+        default=os.cpu_count() or 1)
+    simulate_parser.add_argument(
+        '--alpha',
+        help='significance level of the chi-square tests\ndefault: 0.001\n\n',
+        type=float,
+        default=0.001)
+
+
 def _build_spread_type_parser(spread_type_subparsers, template: SpreadTemplate, tarot: TarotConfig) -> None:
     """Constructs a subparser for the given tarot pread template configuration."""
     spread_type_parser = spread_type_subparsers.add_parser(
@@ -132,6 +398,10 @@ def _build_spread_type_parser(spread_type_subparsers, template: SpreadTemplate,
                 default=parameter.default_value,
                 required=parameter.default_value is None)
     _build_card_count_or_card_list_parser(spread_type_parser, template, tarot)
+    spread_type_parser.add_argument(
+        '--seed',
+        help=f"seeds the draw, reproducing the spread of an earlier reading recorded with that seed [0-{MAX_SEED}]\n\n",
+        type=int)
 
 
 def _build_card_count_or_card_list_parser(spread_type_parser, template: SpreadTemplate, tarot: TarotConfig) -> None:
@@ -172,6 +442,17 @@ def _get_min_max_card_count_for_template(template: SpreadTemplate, tarot: TarotC
     return min_cards, max_cards
 
 
+def _positive_int(value: str) -> int:
+    """Argument type of a count that must be at least one."""
+    try:
+        count = int(value)
+    except ValueError:
+        count = 0
+    if count < 1:
+        raise ArgumentTypeError(f"must be a positive integer: {value}")
+    return count
+
+
 def _first_line_only(multiline_text: str) -> str:
     """Returns only the first line of possibly multi-line description, a flash briefing."""
     return multiline_text.split("\n")[0].lower().strip(".")
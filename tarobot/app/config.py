@@ -5,10 +5,13 @@
 from dataclasses import dataclass
 import logging
 from os.path import dirname, realpath
+from typing import Optional
 
 from dotenv import load_dotenv
 import dataconf
 
+from .. lazy import LazySingleton
+
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +25,7 @@ class AbstractBaseClass:
 class OpenAI(AbstractBaseClass):
     """Data class used for storing all openai-related configuration."""
     api_key: str
+    max_concurrency: int = 16
 
 
 @dataclass
@@ -53,6 +57,26 @@ class Database(AbstractBaseClass):
     pool: ConnectionPool
 
 
+@dataclass
+class Cache(AbstractBaseClass):
+    """Data class used for the chat completion response cache config."""
+    enabled: bool
+    path: str
+    max_entries: int
+    ttl_secs: int
+
+
+@dataclass
+class RateLimit(AbstractBaseClass):
+    """Data class used for the client-side openai rate limit scheduler config."""
+    enabled: bool
+    requests_per_minute: int
+    tokens_per_minute: int
+    max_retries: int
+    base_backoff_secs: float
+    max_backoff_secs: float
+
+
 @dataclass
 class Config(AbstractBaseClass):
     """Data class used for storing the tarobot app's configuration."""
@@ -60,6 +84,8 @@ class Config(AbstractBaseClass):
     openai: OpenAI
     tarot: Tarot
     db: Database
+    cache: Optional[Cache] = None
+    rate_limit: Optional[RateLimit] = None
 # pylint: enable=C0103,R0902,R0903
 
 
@@ -72,6 +98,18 @@ class ConfigLoader:  # pylint: disable=R0903
         self.config = dataconf.file(location, Config)
 
 
-# instantiate app config once and use various places: attempt base config if main config fails
+# app config is loaded once on first use and shared various places
 CONFIG_PATH = realpath(dirname(dirname(__file__)) + "/config/tarobot.conf")
-CONFIG = ConfigLoader(CONFIG_PATH).config
+_config: LazySingleton[Config] = LazySingleton(lambda: ConfigLoader(CONFIG_PATH).config)
+
+
+def get_config() -> Config:
+    """Returns the app config, loading it from CONFIG_PATH on first access."""
+    return _config.get()
+
+
+def __getattr__(name: str):
+    """Resolves the lazily loaded CONFIG module attribute."""
+    if name == 'CONFIG':
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+"""This module contains tarobot's resident reading daemon, and the thin client the command line uses to reach it.
+
+The daemon listens on a unix domain socket, holding the config, spreads, openai client, and database connections
+warm between readings. The cli still parses its arguments as usual, then forwards the resulting command to the daemon
+as a json line, and prints the events the daemon sends back, one json object per line:
+    {"event": "spread", "spread_type": ..., "cards": [...], "prompt": ...}
+    {"event": "token", "token": ...}           (only when the command asks for a streamed response)
+    {"event": "readings", "readings": [...]}
+    {"event": "error", "error": ...}
+"""
+
+import asyncio
+import json
+import logging
+import os
+from os.path import expanduser, join
+import signal
+import socket
+from typing import Dict, Iterator, Optional
+
+from .. tarot import SpreadType, TarotCard
+from . app import create_tarot_spread, persist_card_readings
+from . async_app import AsyncApp
+from . command_parser import CommandDto
+
+
+logger = logging.getLogger(__name__)
+
+
+DAEMON_SOCKET_ENV_VAR = "TAROBOT_DAEMON_SOCKET"
+"""The daemon's socket path; when it is set, readings from the cli are sent to the daemon listening on it."""
+
+MAX_COMMAND_BYTES = 64 * 1024
+"""Largest command line accepted by the daemon."""
+
+
+def default_daemon_socket_path() -> str:
+    """The daemon socket path from the environment, otherwise tarobot's socket in the user's runtime directory."""
+    if os.environ.get(DAEMON_SOCKET_ENV_VAR):
+        return os.environ[DAEMON_SOCKET_ENV_VAR]
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or join(expanduser("~/.cache"), "tarobot")
+    return join(runtime_dir, "tarobot.sock")
+
+
+def command_to_json(command: CommandDto) -> Dict[str, any]:
+    """Converts a reading command into a json-friendly dictionary, to send it to the daemon."""
+    return {
+        'show_prompt': command.show_prompt,
+        'show_diagnostics': command.show_diagnostics,
+        'persist_reading': command.persist_reading,
+        'stream_response': command.stream_response,
+        'spread_type': command.spread_type.value,
+        'spread_parameters': command.spread_parameters,
+        'given_cards': [card.name for card in command.given_cards] if command.given_cards is not None else None,
+        'card_count': command.card_count,
+        'seed': command.seed
+    }
+
+
+def command_from_json(command_json: Dict[str, any]) -> CommandDto:
+    """Converts a dictionary made by command_to_json back into a reading command."""
+    given_cards = command_json.get('given_cards')
+    try:
+        return CommandDto(
+            show_prompt=bool(command_json.get('show_prompt')),
+            show_diagnostics=bool(command_json.get('show_diagnostics')),
+            persist_reading=bool(command_json.get('persist_reading')),
+            stream_response=bool(command_json.get('stream_response')),
+            spread_type=SpreadType(command_json['spread_type']),
+            spread_parameters=command_json.get('spread_parameters'),
+            given_cards=[TarotCard[name] for name in given_cards] if given_cards is not None else None,
+            card_count=int(command_json.get('card_count', 3)),
+            seed=command_json.get('seed'))
+    except (KeyError, TypeError) as cause:
+        raise ValueError(f"Invalid command: {cause}") from cause
+
+
+class ReadingDaemon:
+    """Serves the reading commands forwarded by the cli over a unix domain socket, streaming the results back."""
+
+    def __init__(self, app: AsyncApp):
+        self.app = app
+        self.readings_served = 0
+        self._server: Optional[asyncio.Server] = None
+
+    async def start(self, socket_path: str) -> asyncio.Server:
+        """Starts listening on the socket path, taking it over from a daemon that is no longer running."""
+        if _is_listening(socket_path):
+            raise ValueError(f"A tarobot daemon is already listening on {socket_path}")
+        if os.path.exists(socket_path):
+            # left behind by a daemon that did not shut down cleanly
+            os.unlink(socket_path)
+        os.makedirs(os.path.dirname(socket_path) or '.', exist_ok=True)
+        self._server = await asyncio.start_unix_server(self.handle_connection, socket_path, limit=MAX_COMMAND_BYTES)
+        # readings may be persisted, and the openai key spent, on behalf of anyone who can connect
+        os.chmod(socket_path, 0o600)
+        return self._server
+
+    async def stop(self, socket_path: str) -> None:
+        """Stops listening, removing the socket file."""
+        self._server.close()
+        await self._server.wait_closed()
+        try:
+            os.unlink(socket_path)
+        except FileNotFoundError:
+            pass
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Reads one command from the connection and streams back the events of its reading."""
+        def send(event: Dict[str, any]) -> None:
+            writer.write(json.dumps(event).encode() + b"\n")
+        try:
+            try:
+                command = command_from_json(json.loads(await reader.readline()))
+            except ValueError as error:
+                # includes malformed json
+                send({'event': 'error', 'error': str(error)})
+                return
+            await self.run_command(command, send)
+            await writer.drain()
+        except ConnectionError:
+            # the client went away
+            pass
+        finally:
+            writer.close()
+
+    async def run_command(self, command: CommandDto, send) -> None:
+        """Creates, interprets, and (if requested) persists the reading, sending its events along the way."""
+        try:
+            spread = create_tarot_spread(command)
+            send({'event': 'spread', 'spread_type': str(spread.spread_type),
+                  'cards': [str(card) for card in spread.tarot_cards], 'prompt': spread.prompt})
+            on_token = (lambda token: send({'event': 'token', 'token': token})) if command.stream_response else None
+            card_readings = await self.app.interpret_tarot_spread_choices(spread, command, on_token)
+            if command.persist_reading:
+                # the db session is synchronous; keep it off the event loop
+                await asyncio.to_thread(persist_card_readings, card_readings)
+        except Exception as error:  # pylint: disable=W0718
+            logger.error("Failed to generate card reading", exc_info=True)
+            send({'event': 'error', 'error': f"{type(error).__name__}: {error}"})
+            return
+        self.readings_served += 1
+        send({'event': 'readings',
+              'readings': [card_reading.to_dict(encode_json=True) for card_reading in card_readings]})
+
+
+async def run_daemon(app: AsyncApp, socket_path: str) -> None:
+    """Runs the reading daemon until it receives SIGINT or SIGTERM."""
+    daemon = ReadingDaemon(app)
+    await daemon.start(socket_path)
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stopped.set)
+    logger.info("Serving tarot card readings on %s", socket_path)
+    await stopped.wait()
+    await daemon.stop(socket_path)
+    logger.info("Stopped serving after %d readings", daemon.readings_served)
+
+
+def send_command(socket_path: str, command: CommandDto) -> Iterator[Dict[str, any]]:
+    """Forwards the command to the daemon listening on the socket path, returning the events it sends back.
+
+    Raises FileNotFoundError or ConnectionRefusedError right away when no daemon is listening there."""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall(json.dumps(command_to_json(command)).encode() + b"\n")
+    except OSError:
+        client.close()
+        raise
+    return _read_events(client)
+
+
+def _read_events(client: socket.socket) -> Iterator[Dict[str, any]]:
+    """Yields each json event sent back by the daemon, until it closes the connection."""
+    with client, client.makefile('r', encoding='utf-8') as events:
+        for line in events:
+            yield json.loads(line)
+
+
+def _is_listening(socket_path: str) -> bool:
+    """Returns True if something is accepting connections on the socket path."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+    return True
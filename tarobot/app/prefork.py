@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+"""This module contains the prefork supervisor that runs tarobot's reading service on several worker processes.
+
+The supervisor does the expensive, process-wide setup once (parsing the config, spreads and card aliases, importing
+openai and sqlalchemy), then forks its workers, which share that state copy-on-write. Anything holding connections
+(the database engine, the openai client's http pool, the response cache) is created by each worker after the fork.
+Crashed workers are restarted, and each worker counts the readings it serves in shared memory, from which the
+supervisor periodically reports per-worker throughput.
+"""
+
+import ctypes
+from dataclasses import dataclass
+import gc
+import logging
+from multiprocessing.sharedctypes import RawArray
+import os
+import signal
+import socket
+import time
+from typing import Callable, Dict, List
+
+
+logger = logging.getLogger(__name__)
+
+
+MIN_UPTIME_SECS = 1.0
+"""Workers that die sooner than this after starting are restarted after a delay, rather than in a tight loop."""
+
+
+@dataclass
+class Worker:
+    """A forked worker process, by its slot in the supervisor's worker pool."""
+    index: int
+    pid: int
+    started: float
+
+
+class PreforkSupervisor:  # pylint: disable=R0902
+    """Forks and supervises worker_count workers, each of which runs run_worker(on_served) until it is terminated.
+
+    A worker calls on_served once for every reading it serves, which is counted in that worker's shared memory slot."""
+
+    def __init__(self, worker_count: int, run_worker: Callable[[Callable[[], None]], None],
+                 report_interval_secs: float = 60.0, restart_delay_secs: float = 1.0):
+        if worker_count < 1:
+            raise ValueError(f"worker count must be at least 1, not {worker_count}")
+        if not hasattr(os, 'fork'):
+            raise ValueError("Prefork workers are not supported on this platform")
+        self.worker_count = worker_count
+        self.run_worker = run_worker
+        self.report_interval_secs = report_interval_secs
+        self.restart_delay_secs = restart_delay_secs
+        # each slot is only ever written by its own worker, so no lock is needed
+        self.readings_served = RawArray(ctypes.c_ulonglong, worker_count)
+        self.restart_count = 0
+        self.workers: Dict[int, Worker] = {}
+        self._stopping = False
+        self._last_report = (time.monotonic(), [0] * worker_count)
+
+    def run(self) -> None:
+        """Starts the workers and supervises them until the supervisor receives SIGINT or SIGTERM."""
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signal_number, lambda *_: self.request_stop())
+        self.start()
+        try:
+            while not self._stopping:
+                self.check_workers()
+                if time.monotonic() - self._last_report[0] >= self.report_interval_secs:
+                    self.report_throughput()
+                time.sleep(0.5)
+        finally:
+            self.stop()
+            self.report_throughput()
+
+    def start(self) -> None:
+        """Forks every worker."""
+        for index in range(self.worker_count):
+            self._fork_worker(index)
+
+    def check_workers(self) -> None:
+        """Reaps any workers that have exited, restarting them unless the supervisor is stopping."""
+        while self.workers:
+            (pid, status) = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            worker = next((worker for worker in self.workers.values() if worker.pid == pid), None)
+            if worker is None:
+                continue
+            del self.workers[worker.index]
+            if self._stopping:
+                continue
+            logger.warning("Worker %d (pid %d) exited with status %d, restarting it", worker.index, pid,
+                           os.waitstatus_to_exitcode(status))
+            if time.monotonic() - worker.started < MIN_UPTIME_SECS:
+                time.sleep(self.restart_delay_secs)
+            self.restart_count += 1
+            self._fork_worker(worker.index)
+
+    def request_stop(self) -> None:
+        """Asks the supervision loop to stop, e.g. from a signal handler."""
+        self._stopping = True
+
+    def stop(self) -> None:
+        """Terminates every worker, waiting for each to exit."""
+        self._stopping = True
+        for worker in self.workers.values():
+            try:
+                os.kill(worker.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for worker in self.workers.values():
+            try:
+                os.waitpid(worker.pid, 0)
+            except ChildProcessError:
+                pass
+        self.workers.clear()
+
+    def throughput(self) -> List[float]:
+        """Returns each worker's readings per second since the last report."""
+        (last_time, last_counts) = self._last_report
+        elapsed = max(time.monotonic() - last_time, 1e-9)
+        return [(count - last_count) / elapsed for (count, last_count) in zip(self.readings_served, last_counts)]
+
+    def report_throughput(self) -> None:
+        """Logs the readings served by every worker, along with its throughput since the last report."""
+        rates = self.throughput()
+        for (index, rate) in enumerate(rates):
+            logger.info("Worker %d: %d readings served, %.2f readings/sec", index, self.readings_served[index], rate)
+        logger.info("All workers: %d readings served, %.2f readings/sec", sum(self.readings_served), sum(rates))
+        self._last_report = (time.monotonic(), list(self.readings_served))
+
+    def _fork_worker(self, index: int) -> None:
+        """Forks the worker for the given slot; the child runs the worker and never returns."""
+        # keep the child's garbage collector from touching (and so copying) the objects preloaded by the supervisor
+        gc.freeze()
+        pid = os.fork()
+        if pid != 0:
+            gc.unfreeze()
+            self.workers[index] = Worker(index, pid, time.monotonic())
+            return
+        exit_code = 0
+        try:
+            # the worker installs its own handlers, the supervisor's would only set a flag in the child's copy
+            for signal_number in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signal_number, signal.SIG_DFL)
+            self.run_worker(lambda: self._count_reading(index))
+        except BaseException:  # pylint: disable=W0718
+            logger.exception("Worker %d crashed", index)
+            exit_code = 1
+        finally:
+            logging.shutdown()
+            # skip the supervisor's cleanup (atexit handlers, unittest runners, ...) inherited by the child
+            os._exit(exit_code)  # pylint: disable=W0212
+
+    def _count_reading(self, index: int) -> None:
+        """Counts one reading served by the worker in the given slot."""
+        self.readings_served[index] += 1
+
+
+def bind_listening_socket(host: str, port: int) -> socket.socket:
+    """Binds the socket that every worker accepts connections from, before the workers are forked."""
+    return socket.create_server((host, port))
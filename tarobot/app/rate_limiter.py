@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+"""This module contains the client-side scheduler that keeps chat completion requests within openai's rate limits.
+
+Two token buckets track the request and token budgets. Each request reserves its estimated cost (prompt length plus
+max_tokens) up front and waits until both buckets can cover it. The x-ratelimit-* headers of every response resync
+the buckets with openai's own accounting, and a 429 pauses all submissions with jittered exponential backoff,
+honouring the server's retry-after hint. Reservations are made under a lock but waited out without holding it, so the
+same scheduler paces the sync app's requests and the asyncio pipeline's concurrent ones alike.
+"""
+
+import asyncio
+from itertools import count
+import logging
+import random
+import re
+from threading import Lock
+import time
+from typing import Callable, Dict, Mapping, Optional
+
+from . config import RateLimit as RateLimitConfig
+
+
+logger = logging.getLogger(__name__)
+
+
+CHARS_PER_TOKEN = 4
+"""Rough number of characters per token of english text, used to estimate the size of a prompt."""
+
+_duration_regex = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_duration_units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+class TokenBucket:
+    """A budget of capacity units that refills continuously, e.g. requests or tokens per minute."""
+
+    def __init__(self, capacity: float, refill_per_sec: float, now: float):
+        self.capacity = capacity
+        self.available = capacity
+        self.refill_per_sec = refill_per_sec
+        self.updated = now
+
+    def reserve(self, cost: float, now: float) -> float:
+        """Takes the cost out of the bucket, returning how many seconds to wait until the budget covers it.
+
+        The bucket may go into debt; later reservations then wait for the debt to be paid off as well."""
+        self._refill(now)
+        # a request bigger than the whole bucket could otherwise never be scheduled
+        cost = min(cost, self.capacity)
+        self.available -= cost
+        if self.available >= 0:
+            return 0.0
+        return -self.available / self.refill_per_sec
+
+    def sync(self, limit: float, remaining: float, reset_secs: Optional[float], now: float) -> None:
+        """Resyncs the bucket with the budget reported by openai, learning the refill rate from its reset time.
+
+        openai's remaining budget does not yet count the reservations still waiting to be sent, so the bucket never
+        forgets their debt: it only ever lowers the available budget to what openai reports."""
+        self._refill(now)
+        self.capacity = limit
+        self.available = min(self.available, remaining)
+        if reset_secs is not None and reset_secs > 0 and remaining < limit:
+            self.refill_per_sec = (limit - remaining) / reset_secs
+
+    def _refill(self, now: float) -> None:
+        """Adds the budget accrued since the last update, up to the bucket's capacity."""
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.refill_per_sec)
+        self.updated = now
+
+
+class RateLimiter:  # pylint: disable=R0902
+    """Paces chat completion requests to stay within the request and token budgets, retrying rate-limited requests.
+
+    When several worker processes share the one openai budget, each paces itself to its even share: both the configured
+    budgets and those reported by openai's headers are divided by the number of workers."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, max_retries: int = 6,  # pylint: disable=R0913
+                 base_backoff_secs: float = 0.5, max_backoff_secs: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic, rng: Optional[random.Random] = None, workers: int = 1):
+        now = clock()
+        self.workers = workers
+        self.requests = TokenBucket(requests_per_minute / workers, requests_per_minute / workers / 60, now)
+        self.tokens = TokenBucket(tokens_per_minute / workers, tokens_per_minute / workers / 60, now)
+        self.max_retries = max_retries
+        self.base_backoff_secs = base_backoff_secs
+        self.max_backoff_secs = max_backoff_secs
+        self.rate_limited_count = 0
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._paused_until = now
+        self._lock = Lock()
+
+    def reserve(self, cost: int) -> float:
+        """Reserves one request of the given token cost, returning how many seconds to wait before sending it."""
+        with self._lock:
+            now = self._clock()
+            return max(self.requests.reserve(1, now), self.tokens.reserve(cost, now), self._paused_until - now)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Resyncs the request and token budgets from the x-ratelimit-* headers of an openai response."""
+        with self._lock:
+            now = self._clock()
+            for (bucket, kind) in [(self.requests, 'requests'), (self.tokens, 'tokens')]:
+                limit = headers.get(f'x-ratelimit-limit-{kind}')
+                remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+                if limit is None or remaining is None:
+                    continue
+                try:
+                    bucket.sync(float(limit) / self.workers, float(remaining) / self.workers,
+                                parse_duration(headers.get(f'x-ratelimit-reset-{kind}')), now)
+                except ValueError:
+                    logger.debug("Ignoring malformed %s rate limit headers", kind)
+
+    def backoff(self, attempt: int, retry_after_secs: Optional[float]) -> float:
+        """Pauses all submissions after a rate-limited attempt, returning the (jittered, exponential) pause in seconds.
+
+        The pause is never shorter than the server's retry-after hint."""
+        delay = self._rng.uniform(0, min(self.max_backoff_secs, self.base_backoff_secs * 2 ** attempt))
+        if retry_after_secs is not None:
+            delay = max(delay, retry_after_secs)
+        with self._lock:
+            self.rate_limited_count += 1
+            self._paused_until = max(self._paused_until, self._clock() + delay)
+        return delay
+
+    def create_chat_completion(self, openai_client, chat_completion_kwargs: Dict[str, any]):
+        """Sends a chat completion request once the budget allows it, retrying it whenever it is rate limited."""
+        from openai import RateLimitError  # pylint: disable=C0415
+        cost = estimate_token_cost(chat_completion_kwargs)
+        for attempt in count():
+            time.sleep(self.reserve(cost))
+            try:
+                raw_response = openai_client.chat.completions.with_raw_response.create(**chat_completion_kwargs)
+            except RateLimitError as error:
+                self._handle_rate_limit(error, attempt)
+                continue
+            self.update_from_headers(raw_response.headers)
+            return raw_response.parse()
+
+    async def create_chat_completion_async(self, openai_client, chat_completion_kwargs: Dict[str, any]):
+        """Sends an async chat completion request once the budget allows it, retrying it whenever it is rate limited."""
+        from openai import RateLimitError  # pylint: disable=C0415
+        cost = estimate_token_cost(chat_completion_kwargs)
+        for attempt in count():
+            await asyncio.sleep(self.reserve(cost))
+            try:
+                raw_response = await openai_client.chat.completions.with_raw_response.create(**chat_completion_kwargs)
+            except RateLimitError as error:
+                self._handle_rate_limit(error, attempt)
+                continue
+            self.update_from_headers(raw_response.headers)
+            return raw_response.parse()
+
+    def _handle_rate_limit(self, error, attempt: int) -> None:
+        """Backs off after a 429, re-raising the error once the request has used up all of its retries."""
+        if attempt >= self.max_retries:
+            raise error
+        headers = error.response.headers
+        self.update_from_headers(headers)
+        delay = self.backoff(attempt, parse_retry_after(headers))
+        logger.debug("Rate limited by openai (attempt %d), backing off for %.2f secs", attempt + 1, delay)
+
+
+def estimate_token_cost(chat_completion_kwargs: Dict[str, any]) -> int:
+    """Estimates the tokens a chat completion request will use: its prompt length plus max_tokens for every choice."""
+    prompt_chars = sum(len(message.get('content') or '') for message in chat_completion_kwargs.get('messages', []))
+    max_tokens = chat_completion_kwargs.get('max_tokens') or 0
+    return prompt_chars // CHARS_PER_TOKEN + max_tokens * (chat_completion_kwargs.get('n') or 1)
+
+
+def parse_duration(duration: Optional[str]) -> Optional[float]:
+    """Parses an openai reset duration such as "20ms", "1.5s" or "6m0s" into seconds."""
+    if not duration:
+        return None
+    parts = _duration_regex.findall(duration)
+    if not parts:
+        raise ValueError(f"Invalid duration: {duration}")
+    return sum(float(amount) * _duration_units[unit] for (amount, unit) in parts)
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """The server's retry-after hint in seconds, if the response gave one."""
+    try:
+        if headers.get('retry-after-ms') is not None:
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after') is not None:
+            return float(headers['retry-after'])
+    except ValueError:
+        pass
+    return None
+
+
+def open_rate_limiter(rate_limit_config: Optional[RateLimitConfig], workers: int = 1) -> Optional[RateLimiter]:
+    """Creates the rate limiter described by the config, for one of the given number of worker processes sharing its
+    budget, or returns None if client-side rate limiting is disabled."""
+    if rate_limit_config is None or not rate_limit_config.enabled:
+        return None
+    return RateLimiter(rate_limit_config.requests_per_minute, rate_limit_config.tokens_per_minute,
+                       rate_limit_config.max_retries, rate_limit_config.base_backoff_secs,
+                       rate_limit_config.max_backoff_secs, workers=workers)
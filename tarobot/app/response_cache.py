@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""This module contains the content-addressed, sqlite-backed cache of openai chat completion responses.
+
+Readings for given cards with identical parameters render the exact same prompt, so their completion requests are
+identical too. Caching by a hash of the request lets repeat queries be answered in milliseconds instead of seconds.
+"""
+
+from hashlib import sha256
+import json
+import os
+from os.path import dirname, expanduser
+import sqlite3
+from threading import Lock
+import time
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+
+from . config import Cache as CacheConfig
+
+
+CACHE_KEY_FIELDS = ('model', 'messages', 'max_tokens', 'temperature', 'top_p', 'n')
+"""The chat completion request fields that determine the response, and so make up the cache key."""
+
+
+def cache_key(chat_completion_kwargs: Dict[str, any]) -> str:
+    """Hashes the fields of a chat completion request that determine its response."""
+    key_fields = {field: chat_completion_kwargs.get(field) for field in CACHE_KEY_FIELDS}
+    return sha256(json.dumps(key_fields, sort_keys=True).encode()).hexdigest()
+
+
+class ResponseCache:
+    """Caches chat completions by request, evicting the least recently used entries beyond max_entries.
+
+    Entries older than ttl_secs are treated as misses. Hit and miss counts are tracked for diagnostics."""
+
+    def __init__(self, path: str, max_entries: int, ttl_secs: int):
+        self.max_entries = max_entries
+        self.ttl_secs = ttl_secs
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        if path != ':memory:':
+            path = expanduser(path)
+            os.makedirs(dirname(path) or '.', exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS completion(
+                key TEXT PRIMARY KEY,
+                completion TEXT NOT NULL,
+                created_ts REAL NOT NULL,
+                accessed_ts REAL NOT NULL
+            )""")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_accessed_ts ON completion(accessed_ts)")
+
+    def get(self, chat_completion_kwargs: Dict[str, any]) -> Optional[Tuple[any, str]]:
+        """Returns the cached (completion, response) for the request, or None on a miss."""
+        key = cache_key(chat_completion_kwargs)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT completion, created_ts FROM completion WHERE key = ?",
+                                           (key,)).fetchone()
+            if row is None or row[1] < now - self.ttl_secs:
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE completion SET accessed_ts = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        cached = json.loads(row[0])
+        return _to_completion(cached), cached['response']
+
+    def put(self, chat_completion_kwargs: Dict[str, any], completion, response: str) -> None:
+        """Caches the completion and response for the request, then evicts expired and least recently used entries."""
+        cached = {
+            'id': completion.id,
+            'model': completion.model,
+            'created': completion.created,
+            'usage': {
+                'prompt_tokens': completion.usage.prompt_tokens,
+                'completion_tokens': completion.usage.completion_tokens,
+                'total_tokens': completion.usage.total_tokens
+            },
+            'choices': [choice.message.content for choice in completion.choices],
+            'response': response
+        }
+        now = time.time()
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO completion(key, completion, created_ts, accessed_ts) "
+                                     "VALUES (?, ?, ?, ?)", (cache_key(chat_completion_kwargs), json.dumps(cached),
+                                                             now, now))
+            self._connection.execute("DELETE FROM completion WHERE created_ts < ?", (now - self.ttl_secs,))
+            (count,) = self._connection.execute("SELECT COUNT(*) FROM completion").fetchone()
+            if count > self.max_entries:
+                self._connection.execute("DELETE FROM completion WHERE key IN "
+                                         "(SELECT key FROM completion ORDER BY accessed_ts ASC LIMIT ?)",
+                                         (count - self.max_entries,))
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM completion").fetchone()[0]
+
+    def close(self) -> None:
+        """Closes the underlying sqlite connection."""
+        self._connection.close()
+
+
+def _to_completion(cached: Dict[str, any]) -> SimpleNamespace:
+    """Rebuilds a completion-like object from its cached form, carrying the fields the card reading metadata needs."""
+    return SimpleNamespace(
+        id=cached['id'],
+        model=cached['model'],
+        created=cached['created'],
+        usage=SimpleNamespace(**cached['usage']),
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content)) for content in cached['choices']])
+
+
+def open_response_cache(cache_config: Optional[CacheConfig]) -> Optional[ResponseCache]:
+    """Opens the response cache described by the config, or returns None if the cache is not enabled."""
+    if cache_config is None or not cache_config.enabled:
+        return None
+    return ResponseCache(cache_config.path, cache_config.max_entries, cache_config.ttl_secs)
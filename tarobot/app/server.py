@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+"""This module contains tarobot's long-running http reading service.
+
+A resident service pays for config parsing, imports, tls setup, and database connections once at startup, rather than
+once per reading. It speaks just enough HTTP/1.1 (with keep-alive) to serve its endpoints:
+    POST /readings  takes a reading request, e.g. {"spread_type": "one-card", "cards": ["The Fool"]}, in the same
+                    format as a line of the batch command's input, and returns {"readings": [...]}
+    GET /health     returns {"status": "ok"}
+All readings share one AsyncApp, and so one pooled openai client, response cache, and rate limiter.
+"""
+
+import asyncio
+from http import HTTPStatus
+import json
+import logging
+import signal
+from socket import socket
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from .. tarot import get_reading_config
+from . async_app import AsyncApp
+from . command_parser import CommandParser
+
+
+logger = logging.getLogger(__name__)
+
+
+MAX_BODY_BYTES = 64 * 1024
+"""Largest request body accepted, far beyond any reasonable reading request."""
+
+MAX_HEADER_LINES = 100
+"""Most header lines accepted in one request."""
+
+MAX_HEADER_BYTES = 16 * 1024
+"""Largest total size of the request line and headers accepted in one request."""
+
+KEEP_ALIVE_SECS = 30
+"""How long an idle keep-alive connection is held open, waiting for its next request."""
+
+
+class ReadingServer:
+    """Serves tarot card readings over http, validating each request with the shared command parser.
+
+    Whether readings are persisted is the service's choice (persist_reading), never the client's."""
+
+    def __init__(self, app: AsyncApp, parser: CommandParser, on_served: Optional[Callable[[], None]] = None,
+                 persist_reading: bool = False):
+        self.app = app
+        self.parser = parser
+        self.persist_reading = persist_reading
+        self.requests_served = 0
+        # called after every reading served, e.g. to count readings for the prefork supervisor
+        self._on_served = on_served
+        self._server: Optional[asyncio.Server] = None
+        self._connections: Set[asyncio.Task] = set()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8080, sock: Optional[socket] = None) -> asyncio.Server:
+        """Starts accepting connections on the given host and port, or on an already bound listening socket."""
+        if sock is not None:
+            self._server = await asyncio.start_server(self.handle_connection, sock=sock)
+        else:
+            self._server = await asyncio.start_server(self.handle_connection, host, port)
+        return self._server
+
+    async def stop(self) -> None:
+        """Stops accepting connections, then closes the open ones, abandoning any readings still in progress."""
+        self._server.close()
+        connections = list(self._connections)
+        for connection in connections:
+            connection.cancel()
+        await asyncio.gather(*connections, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serves the http requests sent over one connection until the client closes it or stops keeping it alive."""
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_SECS)
+                except asyncio.TimeoutError:
+                    break
+                except ValueError:
+                    # the request line overran the stream's buffer limit
+                    _write_response(writer, HTTPStatus.BAD_REQUEST, {'error': "Request line too long"}, False)
+                    await writer.drain()
+                    break
+                if not request_line.strip():
+                    break
+                (status, payload, keep_alive) = await self._handle_http_request(request_line, reader)
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # the client went away, or the server is stopping
+            pass
+        finally:
+            self._connections.discard(connection)
+            writer.close()
+
+    async def handle_request(self, method: str, path: str, body: bytes) -> Tuple[HTTPStatus, Dict[str, any]]:
+        """Routes one request to its endpoint, returning the response status and json payload."""
+        if path == '/health':
+            if method != 'GET':
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': f"{method} not allowed"}
+            return HTTPStatus.OK, {'status': 'ok'}
+        if path == '/readings':
+            if method != 'POST':
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': f"{method} not allowed"}
+            return await self.create_readings(body)
+        return HTTPStatus.NOT_FOUND, {'error': f"{path} not found"}
+
+    async def create_readings(self, body: bytes) -> Tuple[HTTPStatus, Dict[str, any]]:
+        """Validates the reading request in the body and generates its readings."""
+        try:
+            command = self.parser.parse_reading_request(json.loads(body or b'null'))
+        except ValueError as error:
+            # includes malformed json, and well-formed json of the wrong shape; every bad request gets its 400
+            return HTTPStatus.BAD_REQUEST, {'error': str(error)}
+        # a remote client must not be able to write to the database, so any persist_reading it sent is overridden
+        command.persist_reading = self.persist_reading
+        try:
+            card_readings = await self.app.generate_card_reading_choices(command)
+        except Exception as error:  # pylint: disable=W0718
+            logger.error("Failed to generate card reading", exc_info=True)
+            return HTTPStatus.BAD_GATEWAY, {'error': f"{type(error).__name__}: {error}"}
+        self.requests_served += 1
+        if self._on_served is not None:
+            self._on_served()
+        return HTTPStatus.OK, {'readings': [card_reading.to_dict(encode_json=True) for card_reading in card_readings]}
+
+    async def _handle_http_request(self, request_line: bytes, reader: asyncio.StreamReader) \
+            -> Tuple[HTTPStatus, Dict[str, any], bool]:
+        """Reads the rest of an http request, returning the response status, payload, and whether to keep alive."""
+        try:
+            (method, target, version) = request_line.decode('latin-1').split()
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {'error': "Malformed request line"}, False
+        headers = await _read_headers(reader, len(request_line))
+        if headers is None:
+            return HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, {'error': "Request headers too large"}, False
+        try:
+            content_length = int(headers.get('content-length', 0))
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {'error': "Invalid content-length"}, False
+        if content_length > MAX_BODY_BYTES:
+            return HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': "Request body too large"}, False
+        body = await reader.readexactly(content_length) if content_length > 0 else b''
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        try:
+            (status, payload) = await self.handle_request(method, target.split('?')[0], body)
+        except Exception:  # pylint: disable=W0718
+            # a bug in the service is its own fault, not the client's, and must not take down the connection silently
+            logger.error("Failed to handle %s %s", method, target, exc_info=True)
+            (status, payload) = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "Internal server error"}
+        return status, payload, keep_alive
+
+
+async def _read_headers(reader: asyncio.StreamReader, request_line_bytes: int) -> Optional[Dict[str, str]]:
+    """Reads the headers of a request by lowercase name, or None if there are too many or they are too large."""
+    headers = {}
+    (header_count, header_bytes) = (0, request_line_bytes)
+    while True:
+        try:
+            header_line = await reader.readline()
+        except ValueError:
+            # a single header line overran the stream's buffer limit
+            return None
+        if header_line in (b'\r\n', b'\n', b''):
+            return headers
+        header_count += 1
+        header_bytes += len(header_line)
+        if header_count > MAX_HEADER_LINES or header_bytes > MAX_HEADER_BYTES:
+            return None
+        (name, _, value) = header_line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+def _write_response(writer: asyncio.StreamWriter, status: HTTPStatus, payload: Dict[str, any],
+                    keep_alive: bool) -> None:
+    """Writes a json http response."""
+    content = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode('latin-1') + content)
+
+
+def preload() -> None:
+    """Loads the process-wide spreads, card aliases, and libraries, without opening any connections.
+
+    A prefork supervisor calls this before forking, so its workers share the loaded state copy-on-write."""
+    get_reading_config().load()
+    # pylint: disable=C0415,W0611
+    import openai
+    from .. db import base
+    # pylint: enable=C0415,W0611
+
+
+def warm_up(app: AsyncApp) -> None:
+    """Loads everything a reading needs up front, so the first request is served as quickly as the rest."""
+    preload()
+    # constructing the client imports openai and sets up its connection pool
+    _ = app.openai_client
+    try:
+        from .. db import base  # pylint: disable=C0415
+        base.get_engine()
+    except Exception:  # pylint: disable=W0718
+        logger.warning("Database engine unavailable, readings can not be persisted", exc_info=True)
+
+
+async def serve(app: AsyncApp, parser: CommandParser, host: str = '127.0.0.1', port: int = 8080,  # pylint: disable=R0913
+                sock: Optional[socket] = None, on_served: Optional[Callable[[], None]] = None,
+                persist_reading: bool = False) -> None:
+    """Runs the reading service until it receives SIGINT or SIGTERM, persisting its readings if persist_reading."""
+    reading_server = ReadingServer(app, parser, on_served, persist_reading)
+    server = await reading_server.start(host, port, sock)
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stopped.set)
+    addresses = ", ".join(str(listening_socket.getsockname()) for listening_socket in server.sockets)
+    logger.info("Serving tarot card readings on %s", addresses)
+    await stopped.wait()
+    await reading_server.stop()
+    logger.info("Stopped serving after %d readings", reading_server.requests_served)
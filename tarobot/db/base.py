@@ -2,25 +2,70 @@
 
 """This module serves as a base class for all sqlalchemy entity classes. Used to establish database transactions."""
 
+import os
 from urllib.parse import quote_plus
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-from .. app.config import CONFIG
+from .. app.config import get_config
+from .. lazy import LazySingleton
 
-db, pool = CONFIG.db, CONFIG.db.pool
-encoded_pass = quote_plus(db.password)
-db_url = f"{db.dialect}+{db.driver}://{db.user}:{encoded_pass}@{db.host}:{db.port}/{db.schema}"
-engine = create_engine(db_url, pool_size=pool.size, pool_recycle=pool.recycle_secs, pool_timeout=pool.timeout_secs)
-# use session_factory() to get a new Session
-_SessionFactory = sessionmaker(bind=engine)
+
+def _create_engine() -> Engine:
+    """Creates the connection-pooled engine for the configured database."""
+    config = get_config()
+    db, pool = config.db, config.db.pool
+    encoded_pass = quote_plus(db.password)
+    db_url = f"{db.dialect}+{db.driver}://{db.user}:{encoded_pass}@{db.host}:{db.port}/{db.schema}"
+    return create_engine(db_url, pool_size=pool.size, pool_recycle=pool.recycle_secs, pool_timeout=pool.timeout_secs)
+
+
+# the engine (and its connection pool) is only created once a session is first requested
+_engine: LazySingleton[Engine] = LazySingleton(_create_engine)
+_SessionFactory: LazySingleton[sessionmaker] = LazySingleton(lambda: sessionmaker(bind=get_engine()))
 
 Base = declarative_base()
 
 
+def _create_schema() -> Engine:
+    """Creates any missing tables, returning the engine they were created with."""
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    return engine
+
+
+# the tables only need to be checked for once per process, not on every session
+_schema: LazySingleton[Engine] = LazySingleton(_create_schema)
+
+
+def get_engine() -> Engine:
+    """Returns the shared database engine, creating it on first access."""
+    return _engine.get()
+
+
 def session_factory():
     """Establishes and returns an open session from the associated connection pool."""
-    Base.metadata.create_all(engine)
-    return _SessionFactory()
+    _schema.get()
+    return _SessionFactory.get()()
+
+
+def _reset_after_fork() -> None:
+    """Gives a forked child process its own engine, rather than sharing the parent's pooled connections."""
+    if _engine.is_loaded():
+        # leave the parent's connections open for the parent, they are simply forgotten here
+        _engine.get().dispose(close=False)
+    _engine.reset()
+    _SessionFactory.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def __getattr__(name: str):
+    """Resolves the lazily created engine module attribute."""
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
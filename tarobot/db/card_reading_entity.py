@@ -5,7 +5,7 @@
 from datetime import datetime
 from json import dumps
 
-from sqlalchemy import Column, Float, Integer, String, Text, TIMESTAMP
+from sqlalchemy import BigInteger, Column, Float, Integer, String, Text, TIMESTAMP
 
 from .. tarot import CardReading
 from . base import Base
@@ -35,6 +35,10 @@ class CardReadingEntity(Base):
     total_tokens = Column(Integer, nullable=True)
     temperature = Column(Float, nullable=True)
     top_p = Column(Float, nullable=True)
+    time_to_first_token_ms = Column(Integer, nullable=True)
+    completion_tokens_per_sec = Column(Float, nullable=True)
+    choice_index = Column(Integer, nullable=True)
+    seed = Column(BigInteger, nullable=True)
 
     def __init__(self, dto: CardReading):
         self.card_one = dto.spread[0].value
@@ -54,11 +58,15 @@ class CardReadingEntity(Base):
         self.openai_id = dto.metadata.openai_id
         self.model = dto.metadata.model
         self.created_ts = datetime.fromtimestamp(dto.metadata.created_ts)
-        # self.response_ms = dto.metadata.response_ms
+        self.response_ms = dto.metadata.response_ms
         self.max_tokens = dto.metadata.max_tokens
         self.prompt_tokens = dto.metadata.prompt_tokens
         self.completion_tokens = dto.metadata.completion_tokens
         self.total_tokens = dto.metadata.total_tokens
         self.temperature = dto.metadata.temperature
         self.top_p = dto.metadata.top_p
+        self.time_to_first_token_ms = dto.metadata.time_to_first_token_ms
+        self.completion_tokens_per_sec = dto.metadata.completion_tokens_per_sec
+        self.choice_index = dto.metadata.choice_index
+        self.seed = dto.metadata.seed
 # pylint: enable=C0103,R0902,R0903
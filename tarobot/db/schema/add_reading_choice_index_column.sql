@@ -0,0 +1,5 @@
+-- adds the choice index column to a reading table created before it was part of the initial schema
+USE `${DB_SCHEMA_NAME}`;
+
+ALTER TABLE `reading`
+    ADD COLUMN `choice_index` TINYINT AFTER `completion_tokens_per_sec`;
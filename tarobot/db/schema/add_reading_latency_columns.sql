@@ -0,0 +1,6 @@
+-- adds the latency columns to a reading table created before they were part of the initial schema
+USE `${DB_SCHEMA_NAME}`;
+
+ALTER TABLE `reading`
+    ADD COLUMN `time_to_first_token_ms` INT AFTER `top_p`,
+    ADD COLUMN `completion_tokens_per_sec` FLOAT AFTER `time_to_first_token_ms`;
@@ -0,0 +1,5 @@
+-- adds the seed column to a reading table created before it was part of the initial schema
+USE `${DB_SCHEMA_NAME}`;
+
+ALTER TABLE `reading`
+    ADD COLUMN `seed` BIGINT AFTER `choice_index`;
@@ -36,6 +36,10 @@ CREATE TABLE `reading`(
     `total_tokens` INT,
     `temperature` FLOAT,
     `top_p` FLOAT,
+    `time_to_first_token_ms` INT,
+    `completion_tokens_per_sec` FLOAT,
+    `choice_index` TINYINT,
+    `seed` BIGINT,
     PRIMARY KEY (`id`),
     FOREIGN KEY `idx_card_one` (`card_one`) REFERENCES `card`(`ordinal`),
     FOREIGN KEY `idx_card_two` (`card_two`) REFERENCES `card`(`ordinal`),
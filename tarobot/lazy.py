@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+"""This module contains the lazy singleton holder used for tarobot's expensive module-level objects."""
+
+from threading import Lock
+from typing import Callable, Generic, Optional, TypeVar
+
+
+T = TypeVar('T')
+
+
+class LazySingleton(Generic[T]):
+    """Thread-safe holder that builds its value with the given factory on first access, rather than at import time."""
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._lock = Lock()
+
+    def get(self) -> T:
+        """Returns the held value, building it first if this is the first access."""
+        value = self._value
+        if value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+                value = self._value
+        return value
+
+    def is_loaded(self) -> bool:
+        """Returns True if the value has already been built."""
+        return self._value is not None
+
+    def reset(self) -> None:
+        """Drops the held value, so the next access builds a fresh one, e.g. in a child process after a fork."""
+        # the lock may have been held by another thread at the time of the fork
+        self._lock = Lock()
+        self._value = None
+
+    def set(self, value: T) -> None:
+        """Replaces the held value in one step, e.g. with one built from reloaded config; readers see either the old
+        value or the new one, never anything in between."""
+        with self._lock:
+            self._value = value
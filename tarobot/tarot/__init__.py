@@ -8,14 +8,37 @@ archana consists of 4 suites (Wands, Cups, Swords, and Pentacles). Each suit of
 has 14 cards, Ace through Ten, and 4 face cards: Page, Knight, Queen, and King.
 """
 
-__all__ = ['Archana', 'Suit', 'CardValue', 'TarotCard', 'TarotDeck', 'resolver', 'CardResolver', 'CardReading',
-           'SpreadType', 'ChatCompletionParameters', 'SpreadTemplate', 'Spread', 'SpreadBuilder', 'spread_builder']
+# pylint: disable=E0603
+__all__ = ['Archana', 'Suit', 'CardValue', 'TarotCard', 'CardSet', 'RngProvider', 'get_rng_provider', 'TarotDeck',
+           'draw_spread', 'draw_spreads', 'resolver', 'get_resolver', 'CardResolver', 'CardMatch', 'ResolvedCards',
+           'CardMention', 'CardMentionExtractor', 'get_mention_extractor', 'CardReading', 'SpreadType',
+           'ChatCompletionParameters', 'SpreadTemplate', 'Spread', 'SpreadBuilder', 'spread_builder',
+           'get_spread_builder', 'ReadingConfig', 'get_reading_config', 'ConfigReloader']
+# pylint: enable=E0603
 
 from . archana import Archana
 from . suit import Suit
 from . card_value import CardValue
 from . tarot_card import TarotCard
-from . deck import TarotDeck
-from . card_resolver import resolver, CardResolver
+from . card_set import CardSet
+from . rng import RngProvider, get_rng_provider
+from . deck import TarotDeck, draw_spread, draw_spreads
+from . card_resolver import CardMatch, CardResolver, ResolvedCards
+from . card_mentions import CardMention, CardMentionExtractor
 from . card_reading import CardReading
-from . tarot_spread import SpreadType, ChatCompletionParameters, SpreadTemplate, Spread, SpreadBuilder, spread_builder
+from . tarot_spread import SpreadType, ChatCompletionParameters, SpreadTemplate, Spread, SpreadBuilder
+from . reading_config import ReadingConfig, get_reading_config, get_mention_extractor, get_resolver, \
+    get_spread_builder
+
+
+def __getattr__(name: str):
+    """Resolves the lazily built resolver and spread_builder singletons, and the ConfigReloader, on first access."""
+    if name == 'resolver':
+        return get_resolver()
+    if name == 'spread_builder':
+        return get_spread_builder()
+    if name == 'ConfigReloader':
+        # only the long-running service and daemon watch their config
+        from . config_reloader import ConfigReloader  # pylint: disable=C0415
+        return ConfigReloader
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""This module contains a BK-tree, an index of strings for finding every indexed string near a misspelled one.
+
+A BK-tree (Burkhard-Keller tree) files each string under the node it was compared against, keyed by their edit
+distance. By the triangle inequality, a query within max_distance of a string can only lie under the children whose
+key is within max_distance of the query's own distance to the node, so a search for close matches only compares the
+query against a small part of the index, rather than scanning all of it.
+
+Edit distances are computed with Myers' bit-parallel algorithm (as formulated by Hyyrö), which advances a whole column
+of the Levenshtein table per character using integer bit operations, rather than filling the table cell by cell.
+"""
+
+from typing import Callable, Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+
+T = TypeVar('T')
+
+
+class _Node(Generic[T]):  # pylint: disable=R0903
+    """A string in the tree, its value, and its children keyed by their edit distance to it."""
+    __slots__ = ('key', 'value', 'children')
+
+    def __init__(self, key: str, value: T):
+        self.key = key
+        self.value = value
+        self.children: Dict[int, '_Node[T]'] = {}
+
+
+class BKTree(Generic[T]):
+    """An index of strings, each with a value, searchable by edit distance."""
+
+    def __init__(self, entries: Iterable[Tuple[str, T]] = ()):
+        self._root: Optional[_Node[T]] = None
+        self._size = 0
+        for (key, value) in entries:
+            self.add(key, value)
+
+    def add(self, key: str, value: T) -> None:
+        """Indexes the string with its value, unless the string is already indexed."""
+        if self._root is None:
+            self._root = _Node(key, value)
+            self._size = 1
+            return
+        node = self._root
+        distance_from_key = distance_from(key)
+        while True:
+            distance = distance_from_key(node.key)
+            if distance == 0:
+                return
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _Node(key, value)
+                self._size += 1
+                return
+            node = child
+
+    def search(self, query: str, max_distance: int) -> List[Tuple[int, str, T]]:
+        """Returns the (distance, key, value) of every indexed string within max_distance edits of the query,
+        closest first."""
+        matches = []
+        distance_from_query = distance_from(query)
+        pending = [self._root] if self._root is not None else []
+        while pending:
+            node = pending.pop()
+            distance = distance_from_query(node.key)
+            if distance <= max_distance:
+                matches.append((distance, node.key, node.value))
+            for (child_distance, child) in node.children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    pending.append(child)
+        matches.sort(key=lambda match: (match[0], match[1]))
+        return matches
+
+    def __len__(self) -> int:
+        return self._size
+
+
+def edit_distance(first: str, second: str) -> int:
+    """The Levenshtein distance between the strings: the fewest insertions, deletions, and substitutions of a single
+    character that turn one into the other."""
+    return distance_from(first)(second)
+
+
+def distance_from(pattern: str) -> Callable[[str], int]:
+    """Returns a function of the Levenshtein distance from the pattern to a given string, having prepared the bit
+    masks of the pattern's characters once for any number of comparisons."""
+    length = len(pattern)
+    if length == 0:
+        return len
+    char_masks: Dict[str, int] = {}
+    for (position, char) in enumerate(pattern):
+        char_masks[char] = char_masks.get(char, 0) | 1 << position
+    all_bits = (1 << length) - 1
+    last_bit = 1 << (length - 1)
+
+    def distance_to(text: str) -> int:
+        # the vertical deltas of the current column (+1 or -1 between consecutive rows) as bit vectors
+        (positive, negative, distance) = (all_bits, 0, length)
+        for char in text:
+            matches = char_masks.get(char, 0)
+            vertical = matches | negative
+            diagonal = (((matches & positive) + positive) ^ positive) | matches
+            horizontal_positive = negative | (~(diagonal | positive) & all_bits)
+            horizontal_negative = positive & diagonal
+            if horizontal_positive & last_bit:
+                distance += 1
+            elif horizontal_negative & last_bit:
+                distance -= 1
+            horizontal_positive = (horizontal_positive << 1 | 1) & all_bits
+            horizontal_negative = (horizontal_negative << 1) & all_bits
+            positive = horizontal_negative | (~(vertical | horizontal_positive) & all_bits)
+            negative = horizontal_positive & vertical
+        return distance
+    return distance_to
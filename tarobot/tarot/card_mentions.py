@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+"""This module finds the tarot cards mentioned in a reading's response, to check it against the cards of the spread.
+
+Every alias known to the card resolver, plus every "<rank> of <suit>" combination of the rank and suit aliases, is
+compiled into one Aho-Corasick automaton. The response is scanned in a single pass over its letters and digits, so
+the cost of the scan does not grow with the number of aliases. Like the resolver, the scan ignores case and spacing
+("the high priestess" matches "HighPriestess"); a mention must start and end on a word boundary, and where mentions
+overlap, the earliest and then longest one is kept ("the Ace of Cups" is never also read as "Cups"). Names of a single
+word, with or without "the", are also everyday words ("strength", "the sun"), so they only count as a mention when
+written like a card: capitalized ("the Sun"), or followed by "card" ("the sun card").
+"""
+
+from dataclasses import dataclass
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . card_resolver import CardResolver
+from . card_set import CardSet
+from . tarot_card import TarotCard
+
+
+@dataclass(frozen=True)
+class CardMention:
+    """A card mentioned in some text: the card, and where (and how) the text mentions it."""
+    card: TarotCard
+    start: int
+    end: int
+    text: str
+
+
+@dataclass(frozen=True)
+class MentionCheck:
+    """The cards a reading's response mentions, compared against the cards of its spread."""
+    mentions: List[CardMention]
+    missing: CardSet
+    """Cards of the spread the response never mentions."""
+    unexpected: CardSet
+    """Cards the response mentions that are not in the spread, e.g. hallucinated ones."""
+
+
+class CardMentionExtractor:
+    """Aho-Corasick automaton over every card alias, finding all the card mentions in a text in one pass."""
+
+    def __init__(self, patterns: Iterable[Tuple[str, TarotCard]]):
+        # the trie's transitions, and for each state: its failure link, the pattern (length and card) ending there,
+        # the link to the nearest state along its failure links where another pattern ends, and whether any does
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._match: List[Optional[Tuple[int, TarotCard]]] = [None]
+        self._output_link: List[int] = [0]
+        for (pattern, tarot_card) in patterns:
+            self._add_pattern(pattern, tarot_card)
+        self._link_failures()
+        self._emits = [self._match[state] is not None or self._output_link[state] != 0
+                       for state in range(len(self._goto))]
+
+    @classmethod
+    def from_resolver(cls, resolver: CardResolver) -> 'CardMentionExtractor':
+        """Builds the extractor over the resolver's card aliases and its combinations of rank and suit aliases."""
+        patterns = list(resolver.card_aliases.items())
+        for (rank_alias, card_value) in resolver.rank_aliases.items():
+            for (suit_alias, suit) in resolver.suit_aliases.items():
+                tarot_card = resolver.get_card_by_known_alias(f"{card_value}Of{suit}")
+                patterns.append((f"{rank_alias}of{suit_alias}", tarot_card))
+        return cls(patterns)
+
+    def extract(self, text: str) -> List[CardMention]:  # pylint: disable=R0914
+        """Returns every card mentioned in the text, in order of appearance."""
+        (goto, fail, match, output_link, emits) = (self._goto, self._fail, self._match, self._output_link, self._emits)
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # a few characters lowercase into several, which would shift the offsets
+            lowered = "".join(char.lower()[0] for char in text)
+        # the text offset of each letter or digit fed to the automaton
+        offsets: List[int] = []
+        candidates: List[Tuple[int, int, TarotCard]] = []
+        state = 0
+        for (offset, char) in enumerate(lowered):
+            if not char.isalnum():
+                continue
+            offsets.append(offset)
+            transitions = goto[state]
+            if char in transitions:
+                state = transitions[char]
+            else:
+                while state and char not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(char, 0)
+            if not emits[state]:
+                continue
+            # every pattern ending here is reached by following the output links from the current state
+            output = state
+            while output:
+                if match[output] is not None:
+                    (length, tarot_card) = match[output]
+                    (start, end) = (offsets[len(offsets) - length], offset + 1)
+                    if _starts_word(text, start) and _ends_word(text, end) and _card_like(text, start, end):
+                        candidates.append((start, end, tarot_card))
+                output = output_link[output]
+        return _earliest_longest(text, candidates)
+
+    def check(self, spread: Iterable[TarotCard], response: str) -> MentionCheck:
+        """Compares the cards mentioned in the response with the cards of the spread."""
+        mentions = self.extract(response)
+        spread_cards = CardSet.of(spread)
+        mentioned_cards = CardSet.of(mention.card for mention in mentions)
+        return MentionCheck(mentions, spread_cards - mentioned_cards, mentioned_cards - spread_cards)
+
+    def _add_pattern(self, pattern: str, tarot_card: TarotCard) -> None:
+        """Adds the pattern's letters and digits to the trie, ending in a state that matches the card."""
+        pattern = "".join(char for char in pattern.lower() if char.isalnum())
+        if not pattern:
+            return
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._match.append(None)
+                self._output_link.append(0)
+                self._goto[state][char] = next_state
+            state = next_state
+        self._match[state] = (len(pattern), tarot_card)
+
+    def _link_failures(self) -> None:
+        """Links every state to the state of its longest proper suffix in the trie, breadth first, and to the
+        nearest such suffix state that matches a pattern."""
+        pending = list(self._goto[0].values())
+        while pending:
+            next_pending = []
+            for state in pending:
+                for (char, next_state) in self._goto[state].items():
+                    fallback = self._fail[state]
+                    while fallback and char not in self._goto[fallback]:
+                        fallback = self._fail[fallback]
+                    self._fail[next_state] = self._goto[fallback].get(char, 0)
+                    next_pending.append(next_state)
+                fallback = self._fail[state]
+                self._output_link[state] = fallback if self._match[fallback] is not None \
+                    else self._output_link[fallback]
+            pending = next_pending
+
+
+def _starts_word(text: str, start: int) -> bool:
+    return start == 0 or not text[start - 1].isalnum()
+
+
+def _ends_word(text: str, end: int) -> bool:
+    return end == len(text) or not text[end].isalnum()
+
+
+_word_regex = re.compile(r'[^\W_]+')
+_card_suffix_regex = re.compile(r'\s+cards?\b', re.IGNORECASE)
+
+
+def _card_like(text: str, start: int, end: int) -> bool:
+    """Whether the mention reads as a card, rather than as an everyday word that happens to name one."""
+    words = _word_regex.findall(text[start:end])
+    if words and words[0].lower() == 'the':
+        words = words[1:]
+    if len(words) != 1:
+        # names of several words, e.g. "Wheel of Fortune" or "Ace of Cups", are unmistakable
+        return True
+    return words[0][0].isupper() or _card_suffix_regex.match(text, end) is not None
+
+
+def _earliest_longest(text: str, candidates: List[Tuple[int, int, TarotCard]]) -> List[CardMention]:
+    """Keeps the earliest, then longest, of any overlapping mentions."""
+    mentions = []
+    covered_to = 0
+    for (start, end, tarot_card) in sorted(candidates, key=lambda candidate: (candidate[0], -candidate[1])):
+        if start >= covered_to:
+            mentions.append(CardMention(tarot_card, start, end, text[start:end]))
+            covered_to = end
+    return mentions
@@ -23,23 +23,37 @@ class Metadata(AbstractBaseClass):
     openai_id: str
     model: str
     created_ts: int
-    # response_ms: int
     max_tokens: int
     prompt_tokens: int
     completion_tokens: int
     total_tokens: int
     temperature: Optional[float] = None
     top_p: Optional[float] = None
+    response_ms: Optional[int] = None
+    time_to_first_token_ms: Optional[int] = None
+    completion_tokens_per_sec: Optional[float] = None
+    choice_index: Optional[int] = None
+    seed: Optional[int] = None
 
     def __init__(self, completion):
         self.openai_id = completion.id
         self.model = completion.model
         self.created_ts = completion.created
-        # self.response_ms = completion.response_ms
         self.prompt_tokens = completion.usage.prompt_tokens
         self.completion_tokens = completion.usage.completion_tokens
         self.total_tokens = completion.usage.total_tokens
 
+    def record_latency(self, response_ms: int, time_to_first_token_ms: Optional[int] = None) -> None:
+        """Records the request's latency, along with the rate at which the completion tokens were generated.
+
+        When the time to first token is known (i.e. the response was streamed), the rate only covers the time spent
+        generating tokens; otherwise it is taken over the whole request."""
+        self.response_ms = response_ms
+        self.time_to_first_token_ms = time_to_first_token_ms
+        generation_ms = response_ms - (time_to_first_token_ms or 0)
+        if self.completion_tokens and generation_ms > 0:
+            self.completion_tokens_per_sec = round(self.completion_tokens * 1000 / generation_ms, 2)
+
 
 @dataclass_json
 @dataclass
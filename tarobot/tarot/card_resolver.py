@@ -1,18 +1,29 @@
 #!/usr/bin/env python3
 
-"""This module contains all the logic needed to normalize and resolve a given tarot card name into a TarotCard."""
+"""This module contains all the logic needed to normalize and resolve a given tarot card name into a TarotCard.
+
+Names that match no alias exactly are looked up in BK-trees over every card, suit, and rank alias, built along with
+the resolver, so misspelled names (e.g. "Kinng of Swrods") still resolve to their closest card. A name is matched
+both as a whole and as "<rank> of <suit>" with each part matched on its own; the closest match wins, with a
+confidence of 1.0 for an exact match, falling with the share of the name that had to be edited to match.
+"""
 
 from dataclasses import dataclass
+from enum import Enum
 from os.path import realpath, dirname
-from typing import Dict, List, Optional
-
-import dataconf
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Type, TypeVar
 
+from . bk_tree import BKTree
 from . card_value import CardValue
+from . config_snapshot import ConfigSnapshot, default_snapshot
 from . suit import Suit
 from . tarot_card import TarotCard
 
 
+T = TypeVar('T')
+E = TypeVar('E', bound=Enum)
+
+
 @dataclass
 class AliasConfig:
     """Data class used for storing all tarot card alias information."""
@@ -22,45 +33,34 @@ class AliasConfig:
 # pylint: enable=R0903
 
 
+@dataclass(frozen=True)
+class CardMatch:
+    """A card resolved from a given name, and how closely the name matched one of the card's aliases."""
+    card: TarotCard
+    confidence: float
+    """1.0 for an exact match, down to 0.0 for a name that had to be edited entirely."""
+
+
+@dataclass
+class ResolvedCards:
+    """The cards resolved from a list of names, in the same order, along with the names that resolved to no card."""
+    cards: List[Optional[TarotCard]]
+    failures: List[Tuple[int, str]]
+    """The index and name of every name that could not be resolved (its card being None)."""
+
+
 class CardResolver:
     """Utility class for mapping tarot cards, suits, and values from aliases to their strongly-typed enum values."""
 
-    def __init__(self, location):
-        self.aliases = dataconf.file(location, AliasConfig)
-        self.card_aliases: Dict[str, TarotCard] = {}
-        self.suit_aliases: Dict[str, Suit] = {}
-        self.rank_aliases: Dict[str, CardValue] = {}
-        # populate "identity" aliases
-        for tarot_card in list(TarotCard):
-            self.card_aliases[repr(tarot_card).lower()] = tarot_card
-        for tarot_suit in list(Suit):
-            self.suit_aliases[repr(tarot_suit).lower()] = tarot_suit
-        for card_value in list(CardValue):
-            self.rank_aliases[repr(card_value).lower()] = card_value
-        # populate typed alias -> card map from given config file
-        for (card_str, card_aliases) in self.aliases.cards.items():
-            tarot_card = TarotCard[card_str]
-            for card_alias in card_aliases:
-                key = card_alias.lower().replace(" ", "")
-                if key in self.card_aliases:
-                    raise ValueError(f"duplicate card alias for {key}")
-                self.card_aliases[key] = tarot_card
-        # populate typed alias -> suit map
-        for (suit_str, suit_aliases) in self.aliases.suits.items():
-            tarot_suit = Suit[suit_str]
-            for suit_alias in suit_aliases:
-                key = suit_alias.lower().replace(" ", "")
-                if key in self.suit_aliases:
-                    raise ValueError(f"duplicate card suit for {key}")
-                self.suit_aliases[key] = tarot_suit
-        # populate typed alias -> rank map
-        for (rank_str, rank_aliases) in self.aliases.ranks.items():
-            suit_rank = CardValue[rank_str]
-            for rank_alias in rank_aliases:
-                key = rank_alias.lower().replace(" ", "")
-                if key in self.rank_aliases:
-                    raise ValueError(f"duplicate card rank for {key}")
-                self.rank_aliases[key] = suit_rank
+    def __init__(self, location, snapshot: Optional[ConfigSnapshot] = None):
+        if snapshot is None:
+            snapshot = default_snapshot()
+        (self.aliases, self.card_aliases, self.suit_aliases, self.rank_aliases) = snapshot.load(
+            'aliases', location, load_alias_maps)
+        # fuzzy indexes over every alias, for the names that match none of them exactly
+        self._card_index = BKTree(self.card_aliases.items())
+        self._suit_index = BKTree(self.suit_aliases.items())
+        self._rank_index = BKTree(self.rank_aliases.items())
 
     def get_card_by_known_alias(self, given_card_name):
         """Normalizes and attempts to resolve the given card into a TarotCard."""
@@ -75,26 +75,143 @@ class CardResolver:
         return self.rank_aliases[given_rank_name.lower().replace(" ", "")]
 
     def get_optional_card_by_alias(self, given_card_name) -> Optional[TarotCard]:
-        """Attempts to resolve the given card name into a TarotCard.
+        """Attempts to resolve the given card name into a TarotCard, allowing for misspellings.
 
         If no matches can be resolved, then None is returned instead."""
-        try:
-            # see if the given name is already known
-            return self.get_card_by_known_alias(given_card_name)
-        except KeyError:
-            # card not recognized, if card matches pattern "< rank token >of< suit token >" try to infer card
-            alias = given_card_name.lower().replace(" ", "")
-            if "of" not in alias:
-                return None
-            try:
-                (rank_alias, suit_alias) = alias.split('of')
-                card_value = self.get_rank_by_known_alias(rank_alias)
-                suit = self.get_suit_by_known_alias(suit_alias)
-                return self.get_card_by_known_alias(f"{card_value}Of{suit}")
-            except KeyError:
-                return None
-
-
-# instantiate app config once and use various places
+        card_match = self.match_card(given_card_name)
+        return card_match.card if card_match is not None else None
+
+    def resolve_many(self, given_card_names: Iterable[str]) -> ResolvedCards:
+        """Resolves many card names at once, e.g. for a bulk import, just as get_optional_card_by_alias would.
+
+        Each distinct name is normalized and resolved only once, and an unresolvable name costs no exception."""
+        resolved = ResolvedCards([], [])
+        # memoized by the name as given, and by its normalized alias, so misspellings are only searched for once
+        by_name: Dict[str, Optional[TarotCard]] = {}
+        by_alias: Dict[str, Optional[TarotCard]] = {}
+        for (index, given_card_name) in enumerate(given_card_names):
+            if given_card_name in by_name:
+                tarot_card = by_name[given_card_name]
+            else:
+                alias = given_card_name.lower().replace(" ", "")
+                if alias in by_alias:
+                    tarot_card = by_alias[alias]
+                else:
+                    tarot_card = self.card_aliases.get(alias)
+                    if tarot_card is None:
+                        card_match = self._match_unknown_alias(alias)
+                        tarot_card = card_match.card if card_match is not None else None
+                    by_alias[alias] = tarot_card
+                by_name[given_card_name] = tarot_card
+            resolved.cards.append(tarot_card)
+            if tarot_card is None:
+                resolved.failures.append((index, given_card_name))
+        return resolved
+
+    def match_card(self, given_card_name) -> Optional[CardMatch]:
+        """Resolves the given card name into the closest matching TarotCard, along with the confidence of the match.
+
+        If no alias is close enough to the name, then None is returned instead."""
+        alias = given_card_name.lower().replace(" ", "")
+        # see if the given name is already known
+        if alias in self.card_aliases:
+            return CardMatch(self.card_aliases[alias], 1.0)
+        return self._match_unknown_alias(alias)
+
+    def _match_unknown_alias(self, alias: str) -> Optional[CardMatch]:
+        """Matches a normalized name that is not a known card alias by its rank and suit, or else by edit distance."""
+        # card not recognized, if card matches pattern "< rank token >of< suit token >" try to infer card
+        for (rank_alias, suit_alias) in _split_rank_and_suit(alias):
+            if rank_alias in self.rank_aliases and suit_alias in self.suit_aliases:
+                return CardMatch(self._card_of(self.rank_aliases[rank_alias], self.suit_aliases[suit_alias]), 1.0)
+        # otherwise settle for the closest alias, or closest rank and suit aliases, unless several cards are as close
+        matches = [match for match in [self._match_whole_name(alias)] +
+                   [self._match_rank_and_suit(alias, rank_alias, suit_alias)
+                    for (rank_alias, suit_alias) in _split_rank_and_suit(alias)]
+                   if match is not None]
+        if not matches:
+            return None
+        best = max(matches, key=lambda match: match.confidence)
+        if any(match.card != best.card and match.confidence == best.confidence for match in matches):
+            return None
+        return best
+
+    def _match_whole_name(self, alias: str) -> Optional[CardMatch]:
+        """Matches the whole name by the closest card alias."""
+        closest_card = _closest(self._card_index.search(alias, _max_edits(alias)))
+        if closest_card is None:
+            return None
+        (distance, card_alias, tarot_card) = closest_card
+        return CardMatch(tarot_card, _confidence(distance, alias, card_alias))
+
+    def _match_rank_and_suit(self, alias: str, rank_alias: str, suit_alias: str) -> Optional[CardMatch]:
+        """Matches one split of the name into "< rank token >of< suit token >" by the closest rank and suit aliases."""
+        closest_rank = _closest(self._rank_index.search(rank_alias, _max_edits(rank_alias)))
+        closest_suit = _closest(self._suit_index.search(suit_alias, _max_edits(suit_alias)))
+        if closest_rank is None or closest_suit is None:
+            return None
+        ((rank_distance, rank_key, card_value), (suit_distance, suit_key, suit)) = (closest_rank, closest_suit)
+        return CardMatch(self._card_of(card_value, suit),
+                         _confidence(rank_distance + suit_distance, alias, f"{rank_key}of{suit_key}"))
+
+    def _card_of(self, card_value: CardValue, suit: Suit) -> TarotCard:
+        """The minor archana card of the given rank and suit."""
+        return self.get_card_by_known_alias(f"{card_value}Of{suit}")
+
+
+def _split_rank_and_suit(alias: str) -> Iterator[Tuple[str, str]]:
+    """Yields every way of splitting the name into "< rank token >of< suit token >"."""
+    split_at = alias.find("of")
+    while split_at != -1:
+        yield (alias[:split_at], alias[split_at + 2:])
+        split_at = alias.find("of", split_at + 1)
+
+
+def _closest(matches: List[Tuple[int, str, T]]) -> Optional[Tuple[int, str, T]]:
+    """The closest of the (distance-ordered) search results, unless results of different values are just as close,
+    e.g. "free" being as close to "three" as to "five", in which case the misspelling is too ambiguous to resolve."""
+    if not matches:
+        return None
+    closest = matches[0]
+    if any(distance == closest[0] and value != closest[2] for (distance, _, value) in matches):
+        return None
+    return closest
+
+
+def _max_edits(alias: str) -> int:
+    """The most edits allowed for a misspelled name to still match: one for every four characters of the name."""
+    return len(alias) // 4
+
+
+def _confidence(distance: int, alias: str, matched_alias: str) -> float:
+    """The share of the longer of the two names left unedited by the match."""
+    return round(1 - distance / max(len(alias), len(matched_alias), 1), 3)
+
+
+def load_alias_maps(location) -> Tuple[AliasConfig, Dict[str, TarotCard], Dict[str, Suit], Dict[str, CardValue]]:
+    """Parses the alias config at the given location into the alias config and its normalized alias lookup maps."""
+    import dataconf  # pylint: disable=C0415
+    aliases: AliasConfig = dataconf.file(location, AliasConfig)
+    # populate "identity" aliases
+    card_aliases: Dict[str, TarotCard] = {repr(tarot_card).lower(): tarot_card for tarot_card in TarotCard}
+    suit_aliases: Dict[str, Suit] = {repr(tarot_suit).lower(): tarot_suit for tarot_suit in Suit}
+    rank_aliases: Dict[str, CardValue] = {repr(card_value).lower(): card_value for card_value in CardValue}
+    # populate typed alias -> card, suit, and rank maps from given config file
+    _add_aliases(card_aliases, aliases.cards, TarotCard, 'alias')
+    _add_aliases(suit_aliases, aliases.suits, Suit, 'suit')
+    _add_aliases(rank_aliases, aliases.ranks, CardValue, 'rank')
+    return aliases, card_aliases, suit_aliases, rank_aliases
+
+
+def _add_aliases(alias_map: Dict[str, E], given_aliases: Dict[str, List[str]], enum_type: Type[E], kind: str) -> None:
+    """Adds the configured aliases of each enum member, normalized, to the alias map, rejecting any duplicates."""
+    for (member_name, member_aliases) in given_aliases.items():
+        member = enum_type[member_name]
+        for member_alias in member_aliases:
+            key = member_alias.lower().replace(" ", "")
+            if key in alias_map:
+                raise ValueError(f"duplicate card {kind} for {key}")
+            alias_map[key] = member
+
+
 aliases_path = realpath(dirname(dirname(__file__)) + "/config/aliases.conf")
-resolver: CardResolver = CardResolver(aliases_path)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""Module containing the CardSet, a compact immutable set of tarot cards.
+
+A CardSet is a 78-bit integer mask with bit n set when the card whose TarotCard value is n belongs to the set, so
+membership, union, intersection, and difference are single integer operations, the set's size is a popcount, and
+the set itself hashes and compares like an int (e.g. as part of a cache key).
+"""
+
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List
+
+from . archana import Archana
+from . suit import Suit
+from . tarot_card import TarotCard
+
+
+FULL_MASK = (1 << len(TarotCard)) - 1
+"""The mask of a whole tarot deck."""
+
+
+@dataclass(frozen=True)
+class CardSet:
+    """An immutable set of tarot cards, backed by a 78-bit mask over their TarotCard values."""
+    mask: int = 0
+
+    def __post_init__(self):
+        if not 0 <= self.mask <= FULL_MASK:
+            raise ValueError(f"Invalid card set mask: {self.mask:#x}")
+
+    @classmethod
+    def of(cls, cards: Iterable[TarotCard]) -> 'CardSet':
+        """Returns the set of the given cards."""
+        mask = 0
+        for card in cards:
+            mask |= 1 << card.value
+        return cls(mask)
+
+    @classmethod
+    def full(cls) -> 'CardSet':
+        """Returns the set of every card in the deck."""
+        return cls(FULL_MASK)
+
+    @classmethod
+    def of_archana(cls, archana: Archana) -> 'CardSet':
+        """Returns the set of every card in the given archana."""
+        return _archana_sets[archana]
+
+    @classmethod
+    def of_suit(cls, suit: Suit) -> 'CardSet':
+        """Returns the set of every card in the given suit of the minor archana."""
+        return _suit_sets[suit]
+
+    def with_card(self, card: TarotCard) -> 'CardSet':
+        """Returns a copy of this set with the given card added."""
+        return CardSet(self.mask | 1 << card.value)
+
+    def values(self) -> List[int]:
+        """Returns the TarotCard values of the cards in this set, in ascending order."""
+        values = []
+        mask = self.mask
+        while mask:
+            lowest_bit = mask & -mask
+            values.append(lowest_bit.bit_length() - 1)
+            mask ^= lowest_bit
+        return values
+
+    def isdisjoint(self, other: 'CardSet') -> bool:
+        """Returns True if this set has no cards in common with the other."""
+        return not self.mask & other.mask
+
+    def issubset(self, other: 'CardSet') -> bool:
+        """Returns True if every card in this set is also in the other."""
+        return not self.mask & ~other.mask
+
+    def __contains__(self, card) -> bool:
+        return isinstance(card, TarotCard) and bool(self.mask >> card.value & 1)
+
+    def __iter__(self) -> Iterator[TarotCard]:
+        return (TarotCard(value) for value in self.values())
+
+    def __len__(self) -> int:
+        return self.mask.bit_count()
+
+    def __bool__(self) -> bool:
+        return self.mask != 0
+
+    def __or__(self, other: 'CardSet') -> 'CardSet':
+        if not isinstance(other, CardSet):
+            return NotImplemented
+        return CardSet(self.mask | other.mask)
+
+    def __and__(self, other: 'CardSet') -> 'CardSet':
+        if not isinstance(other, CardSet):
+            return NotImplemented
+        return CardSet(self.mask & other.mask)
+
+    def __sub__(self, other: 'CardSet') -> 'CardSet':
+        if not isinstance(other, CardSet):
+            return NotImplemented
+        return CardSet(self.mask & ~other.mask)
+
+    def __xor__(self, other: 'CardSet') -> 'CardSet':
+        if not isinstance(other, CardSet):
+            return NotImplemented
+        return CardSet(self.mask ^ other.mask)
+
+    def __invert__(self) -> 'CardSet':
+        """Returns the set of every card in the deck that is not in this set."""
+        return CardSet(FULL_MASK & ~self.mask)
+
+    def __repr__(self):
+        return f"CardSet([{', '.join(repr(card) for card in self)}])"
+
+
+_archana_sets = {archana: CardSet.of(card for card in TarotCard if card.archana() == archana) for archana in Archana}
+_suit_sets = {suit: CardSet.of(card for card in TarotCard if card.suit() == suit) for suit in Suit}
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+"""This module hot reloads the spread and alias config of a long-running process, e.g. the http service or daemon.
+
+A background thread polls the modification time and size of every config source (spreads.conf, aliases.conf, and
+everything they include). When any of them changes, it parses the config into a new reading config (spread builder,
+card resolver, and card mention extractor), and checks it by dry-rendering every spread's prompt with sample cards and
+parameters. Only if that succeeds is the new reading config swapped in, with a single assignment. A reading takes the
+shared reading config once and keeps it throughout, so readings in flight finish with the config they started with,
+never a mix of the old and the new; an invalid edit is logged and the current config is kept.
+"""
+
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+from . card_resolver import aliases_path
+from . config_snapshot import ConfigSnapshot, collect_config_sources, default_snapshot
+from . reading_config import ReadingConfig, get_reading_config, set_reading_config
+from . tarot_card import TarotCard
+from . tarot_spread import SpreadBuilder, spreads_path
+
+
+logger = logging.getLogger(__name__)
+
+
+SourceSignature = Tuple[Tuple[str, int, int], ...]
+"""The path, modification time, and size of every config source."""
+
+
+class ConfigReloader:  # pylint: disable=R0902
+    """Watches the spread and alias config, swapping in a new reading config whenever it changes."""
+
+    def __init__(self, spreads_location: str = spreads_path, aliases_location: str = aliases_path,
+                 poll_interval: float = 2.0, snapshot: Optional[ConfigSnapshot] = None):
+        self.spreads_location = spreads_location
+        self.aliases_location = aliases_location
+        self.poll_interval = poll_interval
+        self.snapshot = snapshot
+        self.reload_count = 0
+        self.failed_count = 0
+        self._signature = self._source_signature()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'ConfigReloader':
+        """Starts watching the config in a background thread."""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._watch, name='tarobot-config-reloader', daemon=True)
+        self._thread.start()
+        logger.info("Watching %s and %s for changes", self.spreads_location, self.aliases_location)
+        return self
+
+    def stop(self) -> None:
+        """Stops watching the config, waiting for a reload in progress to finish."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def check(self) -> bool:
+        """Reloads the config if any of its sources changed since the last check, returning True if it was reloaded."""
+        signature = self._source_signature()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        try:
+            self.reload()
+        except Exception:  # pylint: disable=W0718
+            # a half-saved or mistaken edit must never take down the process, nor replace a working config
+            self.failed_count += 1
+            logger.error("Keeping the current spreads and aliases, the changed config is invalid", exc_info=True)
+            return False
+        return True
+
+    def reload(self) -> ReadingConfig:
+        """Parses and validates the config, then swaps it in as the shared reading config, returning it.
+
+        Raises an exception, leaving the current reading config in place, if the config does not parse or validate."""
+        snapshot = self.snapshot if self.snapshot is not None else default_snapshot()
+        reading_config = ReadingConfig(self.spreads_location, self.aliases_location, snapshot).load()
+        validate_spread_builder(reading_config.spread_builder, get_reading_config().spread_builder)
+        set_reading_config(reading_config)
+        self.reload_count += 1
+        logger.info("Reloaded %d spreads and %d card aliases",
+                    len(reading_config.spread_builder.spread_type_to_template),
+                    len(reading_config.resolver.card_aliases))
+        return reading_config
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.poll_interval):
+            self.check()
+
+    def _source_signature(self) -> Optional[SourceSignature]:
+        """The current signature of the config sources, or None if they can not be read, e.g. midway through a save."""
+        try:
+            sources: List[str] = collect_config_sources(self.spreads_location) + \
+                collect_config_sources(self.aliases_location)
+            return tuple((source, stat.st_mtime_ns, stat.st_size) for (source, stat) in
+                         ((source, os.stat(source)) for source in sources))
+        except OSError:
+            return None
+
+
+def validate_spread_builder(spread_builder: SpreadBuilder, current: Optional[SpreadBuilder] = None) -> None:
+    """Dry-renders every spread's prompt with sample cards and parameters.
+
+    Raises ValueError if any spread fails to render, or if a spread type of the current builder is missing."""
+    if current is not None:
+        missing = set(current.spread_type_to_template) - set(spread_builder.spread_type_to_template)
+        if missing:
+            raise ValueError(f"Reloaded spread config is missing spreads {', '.join(sorted(missing))}")
+    for (spread_type, spread_template) in spread_builder.spread_type_to_template.items():
+        # a spread of no fixed size is rendered with the whole deck, so any card_n placeholder it may use is filled
+        card_count = spread_template.required_card_count or len(TarotCard)
+        parameters = {name: parameter.default_value or f"<{name}>"
+                      for (name, parameter) in (spread_template.required_parameters or {}).items()}
+        spread_builder.build(spread_type, list(TarotCard)[:card_count], parameters)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""This module caches parsed hocon config on disk as a compiled snapshot, so startup can skip dataconf entirely.
+
+A snapshot is keyed by a content hash of the config file, every file it (transitively) includes, and the source of the
+module that parses it. Editing any .conf file, or the parsing code, changes the key and the stale snapshot is ignored.
+Since unpickling a file runs whatever code it names, the snapshot directory is created private to the user, and a
+snapshot is only loaded if it is owned by the user and writable by no one else.
+"""
+
+from hashlib import sha256
+import logging
+import os
+from os.path import dirname, exists, expanduser, join, realpath
+import pickle
+import re
+from stat import S_IWGRP, S_IWOTH
+import sys
+from tempfile import NamedTemporaryFile
+from typing import Callable, List, Optional, TypeVar
+
+
+logger = logging.getLogger(__name__)
+
+
+T = TypeVar('T')
+
+SNAPSHOT_DIR_ENV_VAR = "TAROBOT_SNAPSHOT_DIR"
+"""Overrides the snapshot directory; set it to an empty string to disable snapshots."""
+
+_include_regex = re.compile(r'include\s+(?:required\(\s*)?(?:file\(\s*)?"([^"]+)"')
+
+
+class ConfigSnapshot:
+    """Loads parsed config from an on-disk snapshot, parsing and storing a new snapshot whenever the sources change."""
+
+    def __init__(self, snapshot_dir: Optional[str] = None):
+        self.snapshot_dir = snapshot_dir
+
+    def load(self, kind: str, location: str, parse: Callable[[str], T]) -> T:
+        """Returns the parsed config for the given location, from its snapshot if one matches the current sources."""
+        if not self.snapshot_dir:
+            return parse(location)
+        snapshot_path = self._snapshot_path(kind, location, parse)
+        try:
+            with open(snapshot_path, 'rb') as snapshot_file:
+                if _is_trusted(os.fstat(snapshot_file.fileno())):
+                    return pickle.load(snapshot_file)
+                logger.warning("Ignoring config snapshot %s, it is owned by another user or writable by others",
+                               snapshot_path)
+        except FileNotFoundError:
+            pass
+        except (OSError, pickle.UnpicklingError, AttributeError, EOFError, ImportError):
+            logger.warning("Ignoring unreadable config snapshot %s", snapshot_path, exc_info=True)
+        parsed = parse(location)
+        self._store(snapshot_path, parsed)
+        return parsed
+
+    def build(self, kind: str, location: str, parse: Callable[[str], T]) -> str:
+        """Parses the config for the given location and (re)writes its snapshot, returning the snapshot's path."""
+        if not self.snapshot_dir:
+            raise ValueError(f"config snapshots are disabled, set {SNAPSHOT_DIR_ENV_VAR} to enable them")
+        snapshot_path = self._snapshot_path(kind, location, parse)
+        self._store(snapshot_path, parse(location))
+        return snapshot_path
+
+    def _snapshot_path(self, kind: str, location: str, parse: Callable[[str], T]) -> str:
+        """The snapshot file path for the config at the given location, named after the hash of all of its sources."""
+        digest = sha256(f"{kind}:{sys.version_info.major}.{sys.version_info.minor}".encode())
+        parser_module = sys.modules[parse.__module__]
+        for source_path in [realpath(parser_module.__file__)] + collect_config_sources(location):
+            digest.update(source_path.encode())
+            with open(source_path, 'rb') as source_file:
+                digest.update(source_file.read())
+        return join(self.snapshot_dir, f"{kind}-{digest.hexdigest()[:32]}.pickle")
+
+    def _store(self, snapshot_path: str, parsed) -> None:
+        """Atomically writes the snapshot, so concurrent readers never see a partially written file."""
+        try:
+            os.makedirs(self.snapshot_dir, mode=0o700, exist_ok=True)
+            with NamedTemporaryFile('wb', dir=self.snapshot_dir, suffix='.tmp', delete=False) as temp_file:
+                pickle.dump(parsed, temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file.name, snapshot_path)
+        except OSError:
+            logger.warning("Unable to write config snapshot %s", snapshot_path, exc_info=True)
+
+
+def _is_trusted(snapshot_stat: os.stat_result) -> bool:
+    """Whether a snapshot file is safe to unpickle: owned by this user, and writable by neither group nor others."""
+    return snapshot_stat.st_uid == os.getuid() and not snapshot_stat.st_mode & (S_IWGRP | S_IWOTH)
+
+
+def collect_config_sources(location: str) -> List[str]:
+    """Returns the given config file followed by every file it includes, recursively, in a stable order."""
+    sources: List[str] = []
+    pending = [realpath(location)]
+    while pending:
+        source_path = pending.pop(0)
+        if source_path in sources:
+            continue
+        sources.append(source_path)
+        with open(source_path, encoding='utf-8') as source_file:
+            for include in _include_regex.findall(source_file.read()):
+                include_path = realpath(join(dirname(source_path), include))
+                if exists(include_path):
+                    pending.append(include_path)
+    return sources
+
+
+def default_snapshot_dir() -> Optional[str]:
+    """The snapshot directory from the environment, otherwise tarobot's folder in the user's cache directory."""
+    if SNAPSHOT_DIR_ENV_VAR in os.environ:
+        return os.environ[SNAPSHOT_DIR_ENV_VAR] or None
+    cache_home = os.environ.get('XDG_CACHE_HOME') or expanduser("~/.cache")
+    return join(cache_home, "tarobot", "snapshots")
+
+
+def default_snapshot() -> ConfigSnapshot:
+    """Returns a config snapshot store using the default snapshot directory."""
+    return ConfigSnapshot(default_snapshot_dir())
@@ -1,25 +1,95 @@
 #!/usr/bin/env python3
 
-"""Module containing the tarot deck card management logic."""
+"""Module containing the tarot deck card management logic.
+
+Cards are drawn by partial Fisher-Yates shuffle: the first k positions of the deck are each swapped with a uniformly
+chosen card from the rest of the deck, giving a uniformly random k-card spread without replacement in k steps.
+draw_spread deals a single spread in pure python, keeping numpy out of the cli's startup; draw_spreads deals
+millions of spreads at once as a numpy array of TarotCard values, shuffling a whole chunk of decks per step.
+Without a generator of their own, decks and spreads draw from a fresh stream of the rng provider, never from the
+random module's shared state.
+"""
 
 import random
+from typing import List, Optional, TYPE_CHECKING
 
+from . card_set import CardSet
+from . rng import get_rng_provider
 from . tarot_card import TarotCard
 
+if TYPE_CHECKING:
+    import numpy
+
+
+DECK_SIZE = len(TarotCard)
+
+DRAW_CHUNK_SIZE = 65536
+"""Number of spreads drawn together by draw_spreads, bounding its working memory to about 5 MB."""
+
 
 # pylint: disable=R0903
 class TarotDeck:
-    """Model that represents a shuffled tarot card deck."""
+    """Model that represents a shuffled tarot card deck, optionally leaving out some cards (e.g. ones already dealt)."""
 
-    def __init__(self):
-        self.cards = list(TarotCard)
+    def __init__(self, rng: Optional[random.Random] = None, excluded: Optional[CardSet] = None):
+        self.cards = list(CardSet.full() - (excluded or CardSet()))
         # always shuffle the tarot deck before use
-        random.shuffle(self.cards)
+        (rng or get_rng_provider().stream()[1]).shuffle(self.cards)
+
+    def remaining(self) -> CardSet:
+        """Returns the set of cards still in the deck."""
+        return CardSet.of(self.cards)
 
     def draw(self, count):
         """Returns the requested count of cards from the shuffled tarot card deck."""
-        drawn = []
-        for _ in range(count):
-            drawn.append(self.cards.pop(random.randint(0, len(self.cards) - 1)))
+        if count > len(self.cards):
+            raise ValueError(f"Cannot draw {count} cards from a deck of {len(self.cards)}")
+        # the deck is already shuffled, so the cards are simply dealt off the top
+        drawn = self.cards[:count]
+        del self.cards[:count]
         return drawn
 # pylint: enable=R0903
+
+
+def draw_spread(card_count: int, rng: Optional[random.Random] = None) -> List[TarotCard]:
+    """Draws a spread of card_count distinct cards, uniformly at random, from the given (seedable) generator."""
+    _check_card_count(card_count)
+    rng = rng or get_rng_provider().stream()[1]
+    cards = list(TarotCard)
+    for position in range(card_count):
+        swap = rng.randrange(position, DECK_SIZE)
+        (cards[position], cards[swap]) = (cards[swap], cards[position])
+    return cards[:card_count]
+
+
+def draw_spreads(spread_count: int, card_count: int, rng=None) -> 'numpy.ndarray':
+    """Draws spread_count spreads of card_count distinct cards each, uniformly at random.
+
+    Returns a (spread_count, card_count) uint8 array of TarotCard values. The rng may be a numpy Generator, a seed,
+    or None for fresh entropy."""
+    import numpy  # pylint: disable=C0415,W0621
+    _check_card_count(card_count)
+    rng = numpy.random.default_rng(rng)
+    spreads = numpy.empty((spread_count, card_count), dtype=numpy.uint8)
+    for start in range(0, spread_count, DRAW_CHUNK_SIZE):
+        rows = min(DRAW_CHUNK_SIZE, spread_count - start)
+        row_index = numpy.arange(rows)
+        decks = numpy.tile(numpy.arange(DECK_SIZE, dtype=numpy.uint8), (rows, 1))
+        for position in range(card_count):
+            swap = rng.integers(position, DECK_SIZE, size=rows)
+            drawn = decks[row_index, swap]
+            decks[row_index, swap] = decks[:, position]
+            decks[:, position] = drawn
+        spreads[start:start + rows] = decks[:, :card_count]
+    return spreads
+
+
+def to_tarot_cards(spread) -> List[TarotCard]:
+    """Converts a spread of TarotCard values, e.g. a row drawn by draw_spreads, back into tarot cards."""
+    return [TarotCard(int(value)) for value in spread]
+
+
+def _check_card_count(card_count: int) -> None:
+    """Ensures the spread fits in one deck."""
+    if not 0 <= card_count <= DECK_SIZE:
+        raise ValueError(f"Cannot draw {card_count} cards from a deck of {DECK_SIZE}")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""This module holds the spread and alias config that readings are built from, as one immutable, swappable whole.
+
+A reading config bundles the spread builder, the card resolver, and the card mention extractor built from the same
+version of spreads.conf and aliases.conf. Each part is built on first use (the cli only pays for the parts it needs)
+and never changes once built. A reading takes the shared config once, and validates and builds its spread against
+that one config throughout; a config reloader swaps in a newer config with a single assignment, so no reading ever
+sees the spreads of one version alongside the aliases (or templates) of another.
+"""
+
+from typing import Optional
+
+from .. lazy import LazySingleton
+from . card_mentions import CardMentionExtractor
+from . card_resolver import CardResolver, aliases_path
+from . config_snapshot import ConfigSnapshot
+from . tarot_spread import SpreadBuilder, spreads_path
+
+
+class ReadingConfig:
+    """The spread builder, card resolver, and card mention extractor of one version of the spread and alias config."""
+
+    def __init__(self, spreads_location: str = spreads_path, aliases_location: str = aliases_path,
+                 snapshot: Optional[ConfigSnapshot] = None):
+        self.spreads_location = spreads_location
+        self.aliases_location = aliases_location
+        self._spread_builder = LazySingleton(lambda: SpreadBuilder(spreads_location, snapshot))
+        self._resolver = LazySingleton(lambda: CardResolver(aliases_location, snapshot))
+        self._mention_extractor = LazySingleton(lambda: CardMentionExtractor.from_resolver(self.resolver))
+
+    @property
+    def spread_builder(self) -> SpreadBuilder:
+        """The spread builder, built from the spread config on first access."""
+        return self._spread_builder.get()
+
+    @property
+    def resolver(self) -> CardResolver:
+        """The card resolver, built from the alias config on first access."""
+        return self._resolver.get()
+
+    @property
+    def mention_extractor(self) -> CardMentionExtractor:
+        """The card mention extractor, built from the card resolver's aliases on first access."""
+        return self._mention_extractor.get()
+
+    def load(self) -> 'ReadingConfig':
+        """Builds every part of the config up front, raising an exception if any of its config is invalid."""
+        _ = (self.spread_builder, self.resolver, self.mention_extractor)
+        return self
+
+
+# the reading config is built on first use, and may later be swapped for a reloaded one
+_reading_config: LazySingleton[ReadingConfig] = LazySingleton(ReadingConfig)
+
+
+def get_reading_config() -> ReadingConfig:
+    """Returns the shared reading config; take it once per reading, so the whole reading sees the same config."""
+    return _reading_config.get()
+
+
+def set_reading_config(reading_config: ReadingConfig) -> None:
+    """Swaps in a new shared reading config, e.g. one built from reloaded spread and alias config."""
+    _reading_config.set(reading_config)
+
+
+def get_spread_builder() -> SpreadBuilder:
+    """Returns the shared spread builder, building it from the spread config on first access."""
+    return get_reading_config().spread_builder
+
+
+def get_resolver() -> CardResolver:
+    """Returns the shared card resolver, building it from the alias config on first access."""
+    return get_reading_config().resolver
+
+
+def get_mention_extractor() -> CardMentionExtractor:
+    """Returns the shared card mention extractor, building it on first access."""
+    return get_reading_config().mention_extractor
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""Module containing the seedable random number streams that tarot spreads are drawn from.
+
+Every spread is drawn from a random.Random of its own, seeded with a seed that is recorded alongside the reading, so
+the spread can be drawn again exactly by giving that seed back. Readings drawn on different threads or async tasks
+never share (or contend for) a generator's state. The seeds come from an RngProvider: an unseeded provider takes each
+one from the operating system's entropy pool, while a seeded provider derives them from its own seed and a counter,
+making a whole sequence of spreads reproducible. A forked child process starts a seed sequence of its own, so forked
+workers never repeat each other's (or their parent's) spreads.
+"""
+
+import hashlib
+import os
+import random
+import threading
+from typing import Optional, Tuple
+import weakref
+
+
+SEED_BITS = 63
+"""Size of a reading's seed; small enough to be stored in a signed 64 bit database column."""
+
+MAX_SEED = (1 << SEED_BITS) - 1
+
+
+class RngProvider:
+    """Hands out independent random streams, each with the seed it can be recreated from."""
+
+    def __init__(self, seed: Optional[int] = None):
+        if seed is not None:
+            check_seed(seed)
+        self.seed = seed
+        self._stream_key: Tuple[int, ...] = ()
+        self._spawned = 0
+        self._lock = threading.Lock()
+        _providers.add(self)
+
+    def next_seed(self) -> int:
+        """Returns the seed of the next stream: random if the provider is unseeded, otherwise derived from its seed."""
+        if self.seed is None:
+            return int.from_bytes(os.urandom(8), 'big') & MAX_SEED
+        with self._lock:
+            index = self._spawned
+            self._spawned += 1
+        return derive_seed(self.seed, *self._stream_key, index)
+
+    def stream(self, seed: Optional[int] = None) -> Tuple[int, random.Random]:
+        """Returns a new random stream along with its seed, which is the given seed, if any, or the next seed."""
+        if seed is None:
+            seed = self.next_seed()
+        else:
+            check_seed(seed)
+        return (seed, random.Random(seed))
+
+    def _reseed_after_fork(self) -> None:
+        """Moves a forked child onto its own seed sequence, set apart from its parent's by its process id."""
+        self._stream_key = self._stream_key + (os.getpid(),)
+        self._spawned = 0
+        self._lock = threading.Lock()
+
+
+def derive_seed(seed: int, *key: int) -> int:
+    """Derives a seed from the given seed and key, e.g. the index of a stream, independent of every other key's."""
+    digest = hashlib.blake2b(repr((seed,) + key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') & MAX_SEED
+
+
+def check_seed(seed: int) -> None:
+    """Ensures the seed is one a reading can be recorded with."""
+    if isinstance(seed, bool) or not isinstance(seed, int) or not 0 <= seed <= MAX_SEED:
+        raise ValueError(f"Seed must be an integer in [0-{MAX_SEED}]: {seed!r}")
+
+
+_providers: 'weakref.WeakSet[RngProvider]' = weakref.WeakSet()
+
+_default_provider = RngProvider()
+
+
+def get_rng_provider() -> RngProvider:
+    """Returns the process-wide provider that spreads are drawn from, unless they are given a generator."""
+    return _default_provider
+
+
+def _reseed_providers_after_fork() -> None:
+    """Gives every provider in a forked child process a seed sequence of its own."""
+    for provider in list(_providers):
+        provider._reseed_after_fork()  # pylint: disable=W0212
+
+
+os.register_at_fork(after_in_child=_reseed_providers_after_fork)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+"""Monte Carlo statistics over randomly drawn tarot spreads, used to verify that the draw is unbiased.
+
+A simulation draws N spreads with draw_spreads, counting how often every card lands in every position of the spread.
+From those counts it derives the per-card, per-suit, and per-archana frequencies, and runs a chi-square goodness of
+fit test of each against the uniform draw: every card equally likely in every position. Large simulations are split
+across worker processes, each drawing from its own independent stream spawned from one seed sequence, so a seeded
+simulation is reproducible for a given worker count.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import math
+from typing import Dict, List, Optional, TextIO, Tuple, TYPE_CHECKING
+
+from . archana import Archana
+from . card_set import CardSet
+from . deck import DECK_SIZE, draw_spreads
+from . suit import Suit
+from . tarot_card import TarotCard
+
+if TYPE_CHECKING:
+    import numpy
+
+
+SIMULATION_BATCH_SIZE = 1_000_000
+"""Number of spreads each worker draws and counts at a time, bounding its working memory."""
+
+
+@dataclass
+class UniformityTest:
+    """The result of a chi-square goodness of fit test of observed counts against their expected counts."""
+    name: str
+    chi_square: float
+    degrees_of_freedom: int
+    p_value: float
+
+    def passed(self, alpha: float) -> bool:
+        """Returns True unless the counts deviate from the expected ones at the given significance level."""
+        return self.p_value >= alpha
+
+
+@dataclass
+class SpreadStats:
+    """The counts of every card in every position, over all the simulated spreads."""
+    draws: int
+    card_count: int
+    position_counts: 'numpy.ndarray'
+    """A (card_count, 78) array: how often each card (by TarotCard value) was drawn into each position."""
+
+    def card_counts(self) -> 'numpy.ndarray':
+        """How often each card was drawn, in any position."""
+        return self.position_counts.sum(axis=0)
+
+    def suit_counts(self) -> Dict[Suit, int]:
+        """How often a card of each suit of the minor archana was drawn."""
+        card_counts = self.card_counts()
+        return {suit: int(card_counts[CardSet.of_suit(suit).values()].sum()) for suit in Suit}
+
+    def archana_counts(self) -> Dict[Archana, int]:
+        """How often a card of each archana was drawn."""
+        card_counts = self.card_counts()
+        return {archana: int(card_counts[CardSet.of_archana(archana).values()].sum()) for archana in Archana}
+
+    def uniformity_tests(self) -> List[UniformityTest]:
+        """Tests every card, position, suit, and archana frequency against those of a uniformly random draw."""
+        card_counts = self.card_counts()
+        tests = [chi_square_test("card", card_counts.tolist(), [self.draws * self.card_count / DECK_SIZE] * DECK_SIZE)]
+        for position in range(self.card_count):
+            tests.append(chi_square_test(f"position {position + 1}", self.position_counts[position].tolist(),
+                                         [self.draws / DECK_SIZE] * DECK_SIZE))
+        suit_counts = self.suit_counts()
+        minor_draws = sum(suit_counts.values())
+        tests.append(chi_square_test("suit", list(suit_counts.values()), [minor_draws / len(Suit)] * len(Suit)))
+        archana_counts = self.archana_counts()
+        tests.append(chi_square_test("archana", [archana_counts[archana] for archana in Archana],
+                                     [self.draws * self.card_count * len(CardSet.of_archana(archana)) / DECK_SIZE
+                                      for archana in Archana]))
+        return tests
+
+    def write_report(self, output: TextIO, alpha: float) -> bool:
+        """Writes the frequency distributions and uniformity tests, returning True if every test passed."""
+        total = self.draws * self.card_count
+        output.write(f"{self.draws} spreads of {self.card_count} cards ({total} cards drawn)\n\n")
+        output.write(f"{'card':<22} {'count':>12} {'frequency':>10}\n")
+        for (card, count) in zip(TarotCard, self.card_counts().tolist()):
+            output.write(f"{str(card):<22} {count:>12} {count / total:>10.5f}\n")
+        output.write(f"\n{'suit':<22} {'count':>12} {'frequency':>10}\n")
+        minor_total = sum(self.suit_counts().values()) or 1
+        for (suit, count) in self.suit_counts().items():
+            output.write(f"{str(suit):<22} {count:>12} {count / minor_total:>10.5f}\n")
+        output.write(f"\n{'archana':<22} {'count':>12} {'frequency':>10}\n")
+        for (archana, count) in self.archana_counts().items():
+            output.write(f"{archana.value:<22} {count:>12} {count / total:>10.5f}\n")
+        output.write(f"\n{'chi-square test':<22} {'statistic':>12} {'df':>4} {'p-value':>10}\n")
+        all_passed = True
+        for test in self.uniformity_tests():
+            flag = "" if test.passed(alpha) else "  NOT UNIFORM"
+            all_passed = all_passed and test.passed(alpha)
+            output.write(f"{test.name:<22} {test.chi_square:>12.2f} {test.degrees_of_freedom:>4} "
+                         f"{test.p_value:>10.4f}{flag}\n")
+        return all_passed
+
+
+def simulate(draws: int, card_count: int, seed: Optional[int] = None, workers: int = 1) -> SpreadStats:
+    """Draws and counts the given number of spreads, split across the given number of worker processes."""
+    import numpy  # pylint: disable=C0415,W0621
+    if draws < 1 or workers < 1:
+        raise ValueError("A simulation needs at least one draw and one worker")
+    if not 1 <= card_count <= DECK_SIZE:
+        raise ValueError(f"A simulated spread needs [1-{DECK_SIZE}] cards")
+    workers = min(workers, draws)
+    # independent streams for each worker, all derived from the one (possibly random) seed
+    seeds = numpy.random.SeedSequence(seed).spawn(workers)
+    shares = [draws // workers + (1 if index < draws % workers else 0) for index in range(workers)]
+    if workers == 1:
+        position_counts = _count_spreads((shares[0], card_count, seeds[0]))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            position_counts = sum(executor.map(_count_spreads, zip(shares, [card_count] * workers, seeds)))
+    return SpreadStats(draws, card_count, position_counts)
+
+
+def _count_spreads(work: Tuple[int, int, any]) -> 'numpy.ndarray':
+    """Draws a worker's share of the spreads, returning how often each card landed in each position."""
+    import numpy  # pylint: disable=C0415,W0621
+    (draws, card_count, seed) = work
+    rng = numpy.random.default_rng(seed)
+    position_counts = numpy.zeros((card_count, DECK_SIZE), dtype=numpy.int64)
+    for start in range(0, draws, SIMULATION_BATCH_SIZE):
+        spreads = draw_spreads(min(SIMULATION_BATCH_SIZE, draws - start), card_count, rng)
+        for position in range(card_count):
+            position_counts[position] += numpy.bincount(spreads[:, position], minlength=DECK_SIZE)
+    return position_counts
+
+
+def chi_square_test(name: str, observed: List[float], expected: List[float]) -> UniformityTest:
+    """Pearson's chi-square goodness of fit test of the observed counts against the expected counts."""
+    chi_square = sum((count - expect) ** 2 / expect for (count, expect) in zip(observed, expected))
+    degrees_of_freedom = len(observed) - 1
+    return UniformityTest(name, chi_square, degrees_of_freedom, chi_square_survival(chi_square, degrees_of_freedom))
+
+
+def chi_square_survival(chi_square: float, degrees_of_freedom: int) -> float:
+    """The probability of a chi-square statistic at least this large under the null hypothesis.
+
+    This is the regularized upper incomplete gamma function Q(df / 2, x / 2), computed by its series expansion below
+    a + 1 and by its continued fraction above it (as in Numerical Recipes), which avoids depending on scipy."""
+    if chi_square <= 0:
+        return 1.0
+    (a, x) = (degrees_of_freedom / 2, chi_square / 2)
+    prefactor = math.exp(a * math.log(x) - x - math.lgamma(a))
+    if x < a + 1:
+        return max(0.0, 1 - _lower_gamma_series(a, x) * prefactor)
+    return min(1.0, _upper_gamma_continued_fraction(a, x) * prefactor)
+
+
+def _lower_gamma_series(a: float, x: float) -> float:
+    """The series expansion of the regularized lower incomplete gamma function P(a, x), less its prefactor."""
+    term = total = 1 / a
+    denominator = a
+    for _ in range(1000):
+        denominator += 1
+        term *= x / denominator
+        total += term
+        if abs(term) < abs(total) * 1e-15:
+            break
+    return total
+
+
+def _upper_gamma_continued_fraction(a: float, x: float) -> float:
+    """The continued fraction of the regularized upper incomplete gamma function Q(a, x), less its prefactor,
+    evaluated by the modified Lentz's method."""
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    fraction = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        fraction *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return fraction
@@ -1,16 +1,21 @@
 #!/usr/bin/env python3
 
-"""This module contains knowledge about some different common tarot spreads and card layouts."""
+"""This module contains knowledge about some different common tarot spreads and card layouts.
+
+Each spread's prompt template is compiled once, as the spread builder loads, into its literal text and the
+"[placeholder]" tokens between it; every placeholder is checked against the spread's parameters and cards right then,
+so a bad template fails at startup rather than on some later reading. Building a prompt is then a single join.
+"""
 
 from dataclasses import dataclass
 from enum import Enum
 from inspect import cleandoc
+from itertools import repeat
 from os.path import dirname, realpath
 import re
-from typing import Dict, List, Optional, Set
-
-import dataconf
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
+from . config_snapshot import ConfigSnapshot, default_snapshot
 from . tarot_card import TarotCard
 
 
@@ -68,46 +73,137 @@ class Spread:
     parameters: Dict[str, str]
     chat_completion_config: ChatCompletionParameters
     prompt: str
+    seed: Optional[int] = None
+    """The seed the cards were drawn with; None when the cards were given rather than drawn."""
 
 
 SpreadConfig = Dict[SpreadType, SpreadTemplate]
 """Type alias for the spread type to template dictionary."""
 
+_placeholder_regex = re.compile(r'\[([^\[\]]+)]')
+_card_placeholder_regex = re.compile(r'card_([1-9]\d*)')
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """A prompt template compiled into the literal text between its placeholders, and the placeholders' names."""
+    segments: Tuple[str, ...]
+    """Literal text at even indexes, alternating with the names of the placeholders in between at odd indexes."""
+
+    def placeholders(self) -> Tuple[str, ...]:
+        """The names of the template's placeholders, in order."""
+        return self.segments[1::2]
+
+    def render(self, parameters: Dict[str, str]) -> str:
+        """Fills every placeholder with its parameter value, in a single join.
+
+        Raises ValueError if any placeholder has no value."""
+        pieces = list(self.segments)
+        try:
+            for index in range(1, len(pieces), 2):
+                pieces[index] = parameters[pieces[index]]
+        except KeyError as missing:
+            raise ValueError(f'Prompt template still has empty token "{missing.args[0]}"') from None
+        return "".join(pieces)
+
+
+def compile_prompt_template(spread_template: SpreadTemplate) -> PromptTemplate:
+    """Compiles the spread's prompt template, collapsing redundant whitespace once and for all.
+
+    Raises ValueError if a placeholder is neither a parameter of the spread, nor card_list, nor card_n for one of the
+    spread's cards."""
+    # eliminate redundant whitespace
+    prompt = re.sub(r'\s{2,}', ' ', spread_template.prompt_template.replace('\n', ' ')).strip()
+    prompt_template = PromptTemplate(tuple(_placeholder_regex.split(prompt)))
+    parameters = set(spread_template.required_parameters or {}) | {'card_list'}
+    for placeholder in prompt_template.placeholders():
+        card_match = _card_placeholder_regex.fullmatch(placeholder)
+        if placeholder in parameters or (card_match is not None and (
+                spread_template.required_card_count is None
+                or int(card_match.group(1)) <= spread_template.required_card_count)):
+            continue
+        raise ValueError(f'{spread_template.type} prompt template has unknown token "{placeholder}"')
+    return prompt_template
+
+spreads_path = realpath(dirname(dirname(__file__)) + "/config/spreads.conf")
+
 
 class SpreadBuilder:
     """Service class that transforms a tarot spread request into a prompt-ready package for OpenAI."""
 
-    def __init__(self, location: str = realpath(dirname(dirname(__file__)) + "/config/spreads.conf")):
-        spread_types: List[SpreadTemplate] = dataconf.file(location, List[SpreadTemplate])
+    def __init__(self, location: str = spreads_path,
+                 snapshot: Optional[ConfigSnapshot] = None):
+        if snapshot is None:
+            snapshot = default_snapshot()
+        spread_types: List[SpreadTemplate] = snapshot.load('spreads', location, load_spread_templates)
         self.spread_type_to_template: SpreadConfig = {spread_template.type: spread_template
                                                       for spread_template in spread_types}
-        for template in self.spread_type_to_template.values():
-            template.description = cleandoc(template.description)
-            # assemble the prompt template as a summation of all the roles, rules, body, and disclaimers
-            template.prompt_template = " ".join(list(template.roles.values()) +
-                                                list(template.rules.values()) +
-                                                [cleandoc(template.body)] +
-                                                list(template.disclaimers.values()))
+        self.spread_type_to_prompt: Dict[SpreadType, PromptTemplate] = {
+            spread_template.type: compile_prompt_template(spread_template) for spread_template in spread_types}
 
     def build(self, spread_type: SpreadType, tarot_cards: List[TarotCard],
-              additional_parameters: Optional[Dict[str, str]] = None) -> Spread:
+              additional_parameters: Optional[Dict[str, str]] = None, seed: Optional[int] = None) -> Spread:
         """Factory method that builds a Spread DTO for the given spread type, tarot cards, and additional parameters."""
-        parameters = {}
-        if additional_parameters is not None:
-            parameters.update(additional_parameters)
         spread_template: SpreadTemplate = self.spread_type_to_template[spread_type]
         if spread_template.required_card_count is not None:
             _validate_tarot_cards(spread_type, tarot_cards, spread_template.required_card_count)
-        if spread_template.required_parameters is not None:
-            _validate_spread_parameters(spread_type, parameters, set(spread_template.required_parameters.keys()))
-        for n, tarot_card in enumerate(tarot_cards, start=1):
-            parameters[f"card_{n}"] = str(tarot_card)
-        parameters["card_list"] = ", ".join(str(tarot_card) for tarot_card in tarot_cards)
-        return Spread(spread_type=spread_type,
+        parameters = self._spread_parameters(spread_template, additional_parameters)
+        return self._build_spread(spread_template, tarot_cards, parameters, seed)
+
+    def build_many(self, spread_type: SpreadType, card_spreads: Iterable[List[TarotCard]],
+                   additional_parameters: Optional[Dict[str, str]] = None,
+                   seeds: Optional[Iterable[Optional[int]]] = None) -> List[Spread]:
+        """Builds a Spread DTO for each of the given lists of tarot cards (and their seeds, if given), all of the same
+        spread type and additional parameters, which are only validated once."""
+        spread_template: SpreadTemplate = self.spread_type_to_template[spread_type]
+        parameters = self._spread_parameters(spread_template, additional_parameters)
+        spreads = []
+        for (tarot_cards, seed) in zip(card_spreads, repeat(None) if seeds is None else seeds):
+            if spread_template.required_card_count is not None:
+                _validate_tarot_cards(spread_type, tarot_cards, spread_template.required_card_count)
+            spreads.append(self._build_spread(spread_template, tarot_cards, parameters, seed))
+        return spreads
+
+    def _build_spread(self, spread_template: SpreadTemplate, tarot_cards: List[TarotCard],
+                      parameters: Dict[str, str], seed: Optional[int]) -> Spread:
+        """Renders the spread's prompt with the given (already validated) parameters and the cards drawn."""
+        parameters = dict(parameters)
+        card_names = [str(tarot_card) for tarot_card in tarot_cards]
+        for (n, card_name) in enumerate(card_names, start=1):
+            parameters[f"card_{n}"] = card_name
+        parameters["card_list"] = ", ".join(card_names)
+        return Spread(spread_type=spread_template.type,
                       tarot_cards=tarot_cards,
                       parameters=parameters,
                       chat_completion_config=spread_template.chat_completion_parameters,
-                      prompt=_replace_tokens(spread_template.prompt_template, parameters))
+                      prompt=self.spread_type_to_prompt[spread_template.type].render(parameters),
+                      seed=seed)
+
+    @staticmethod
+    def _spread_parameters(spread_template: SpreadTemplate,
+                           additional_parameters: Optional[Dict[str, str]]) -> Dict[str, str]:
+        """Validates the additional parameters against the ones the spread requires."""
+        parameters = {}
+        if additional_parameters is not None:
+            parameters.update(additional_parameters)
+        if spread_template.required_parameters is not None:
+            _validate_spread_parameters(spread_template.type, parameters,
+                                        set(spread_template.required_parameters.keys()))
+        return parameters
+
+
+def load_spread_templates(location: str) -> List[SpreadTemplate]:
+    """Parses the spread config at the given location into spread templates with fully assembled prompt templates."""
+    import dataconf  # pylint: disable=C0415
+    spread_types: List[SpreadTemplate] = dataconf.file(location, List[SpreadTemplate])
+    for template in spread_types:
+        template.description = cleandoc(template.description)
+        # assemble the prompt template as a summation of all the roles, rules, body, and disclaimers
+        template.prompt_template = " ".join(list(template.roles.values()) +
+                                            list(template.rules.values()) +
+                                            [cleandoc(template.body)] +
+                                            list(template.disclaimers.values()))
+    return spread_types
 
 
 def _validate_tarot_cards(spread_type: SpreadType, tarot_cards: List[TarotCard], required_card_count: int) -> None:
@@ -121,24 +217,3 @@ def _validate_spread_parameters(spread_type: SpreadType, parameters: Dict[str, s
     if not required.issubset(parameters.keys()):
         missing_params = ", ".join(required.difference(parameters.keys()))
         raise ValueError(f"{spread_type} tarot card spread is missing required parameters {missing_params}")
-
-
-def _replace_tokens(template: str, replacements: Dict[str, str]) -> str:
-    """Replaces all placeholder tokens with their replacement value in the prompt template, not unlike "mad libs".
-
-    Raises ValueError if any placeholder tokens remain empty."""
-    # eliminate redundant whitespace
-    prompt = template
-    prompt = prompt.replace('\n', ' ')
-    prompt = re.sub(r'\s{2,}', ' ', prompt)
-    # replace all placeholder tokens with their replacement value
-    for (token, replacement) in replacements.items():
-        prompt = prompt.replace(f'[{token}]', replacement)
-    # raise an exception if there are any remaining placeholder tokens
-    leftover_token_match = re.search(r'\[(.+)]', prompt)
-    if leftover_token_match is not None:
-        raise ValueError(f'Prompt template still has empty token "{leftover_token_match.group(1)}"')
-    return prompt.strip()
-
-
-spread_builder: SpreadBuilder = SpreadBuilder()
@@ -10,27 +10,42 @@ from . card_value import CardValue
 from . suit import Suit
 
 
+_name_words_regex = re.compile('[A-Z][^A-Z]*')
+
+
 class TarotTrait(IntEnum):
-    """A trait for all tarot cards, including both major and minor archana."""
+    """A trait for all tarot cards, including both major and minor archana.
+
+    Each card's display name, repr, archana, suit, and value are worked out once, as the enumeration is created, so
+    looking any of them up later is a plain attribute access."""
+
+    def __init__(self, *_):
+        words = ["of" if word == "Of" else word for word in _name_words_regex.findall(self.name)]
+        self._display_name = " ".join(words)
+        self._repr = "".join(words)
+        if self.value < 22:
+            self._archana = Archana.MAJOR
+            self._suit = None
+            self._card_value = None
+        else:
+            self._archana = Archana.MINOR
+            self._suit = Suit((self.value - 22) // 14 + 1)
+            self._card_value = CardValue((self.value - 22) % 14 + 1)
 
     def archana(self):
         """Returns the archana to which this tarot card belongs."""
-        return Archana.MAJOR if self.value < 22 else Archana.MINOR
+        return self._archana
 
     def suit(self):
         """Returns the suit to which this card belongs, or None in the case of the major archana."""
-        if self.archana() == Archana.MAJOR:
-            return None
-        return Suit((self.value - 22) // 14 + 1)
+        return self._suit
 
     def card_value(self):
         """Returns the value of this tarot card, or None in the case of the major archana."""
-        if self.archana() == Archana.MAJOR:
-            return None
-        return CardValue((self.value - 22) % 14 + 1)
+        return self._card_value
 
     def __str__(self):
-        return " ".join(list(map(lambda t: "of" if t == "Of" else t, re.findall('[A-Z][^A-Z]*', self.name))))
+        return self._display_name
 
     def __repr__(self):
-        return "".join(list(map(lambda t: "of" if t == "Of" else t, re.findall('[A-Z][^A-Z]*', self.name))))
+        return self._repr
@@ -5,6 +5,7 @@
 from os.path import dirname, realpath
 import unittest
 
+import temp_snapshot_dir  # pylint: disable=E0401,W0611
 from tarobot.app import ConfigLoader
 
 
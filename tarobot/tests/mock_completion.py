@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+
+"""Test fixture of a mocked up openai chat completion, for any test classes that stub out the openai client."""
+
+from unittest.mock import Mock
+
+
+def mock_completion(content: str) -> Mock:
+    """Returns a mocked up chat completion with the given content as its only choice's message."""
+    completion = Mock()
+    completion.id = 'cmpl-444555'
+    completion.model = 'scatgpt-4'
+    completion.created = 1681571451
+    completion.usage = Mock()
+    completion.usage.prompt_tokens = 30
+    completion.usage.completion_tokens = 200
+    completion.usage.total_tokens = 230
+    choice = Mock()
+    choice.message.content = content
+    completion.choices = [choice]
+    return completion
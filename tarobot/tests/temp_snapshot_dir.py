@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+
+"""Test fixture that points the config snapshot store at a temporary directory, for any test modules that load the
+spread or alias config, so the tests never read or write snapshots in the user's real cache directory."""
+
+import os
+from tempfile import TemporaryDirectory
+
+from tarobot.tarot.config_snapshot import SNAPSHOT_DIR_ENV_VAR
+
+
+# removed along with its snapshots when the test run ends
+_snapshot_dir = TemporaryDirectory(prefix='tarobot-snapshots-')  # pylint: disable=R1732
+os.environ[SNAPSHOT_DIR_ENV_VAR] = _snapshot_dir.name
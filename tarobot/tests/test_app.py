@@ -1,6 +1,12 @@
 #!/usr/bin/env python3
 
 """Module containing all the core application's unit tests."""
+from dataclasses import replace
+from io import StringIO
+from os.path import dirname, realpath
+import subprocess
+import sys
+from types import SimpleNamespace
 from unittest.mock import patch, Mock, MagicMock
 
 # pylint: disable=E0401
@@ -8,6 +14,8 @@ from base_test_with_config import BaseTestWithConfig
 # pylint: enable=E0401
 from tarobot.tarot import CardReading, ChatCompletionParameters, Spread, SpreadType, TarotCard
 from tarobot.app import App, CommandDto
+from tarobot.app.command_parser import CommandType
+from tarobot.app.app import _execute_streaming_chat_completion_request
 
 
 # pylint: disable=C0115,C0116,R0903
@@ -29,6 +37,24 @@ class TestApp(BaseTestWithConfig):
 
         # Then:  the expected number of cards is drawn
         self.assertEqual(4, len(app.spread.tarot_cards))
+        self.assertIsNotNone(app.spread.seed)
+
+    def test_create_tarot_spread_by_seed(self):
+        # Given: a reading whose cards were drawn at random
+        app = App(self.test_config)
+        parameters = {'seeker': 'the seeker', 'teller': 'a mystic'}
+        app.command = CommandDto(spread_type=SpreadType.CARD_LIST, spread_parameters=parameters, card_count=5)
+        app.create_tarot_spread()
+        first_spread = app.spread
+
+        # When:  the spread is drawn again with the seed it was recorded with
+        app.command = CommandDto(spread_type=SpreadType.CARD_LIST, spread_parameters=parameters, card_count=5,
+                                 seed=first_spread.seed)
+        app.create_tarot_spread()
+
+        # Then:  the very same cards are drawn
+        self.assertEqual(first_spread.seed, app.spread.seed)
+        self.assertEqual(first_spread.tarot_cards, app.spread.tarot_cards)
 
     def test_create_tarot_spread_by_given_cards(self):
         # Given: a mocked up request with specified cards
@@ -43,10 +69,11 @@ class TestApp(BaseTestWithConfig):
         # When:  the tarot card spread is created
         app.create_tarot_spread()
 
-        # Then:  the expected spread is found
+        # Then:  the expected spread is found, with no seed since nothing was drawn
         self.assertEqual(SpreadType.CARD_LIST, app.spread.spread_type)
         self.assertEqual(3, len(app.spread.tarot_cards))
         self.assertEqual([TarotCard.TheMagician, TarotCard.SixOfWands, TarotCard.TheTower], app.spread.tarot_cards)
+        self.assertIsNone(app.spread.seed)
 
     def test_interpret_tarot_spread(self):
         # Given: a mocked up command
@@ -72,7 +99,8 @@ class TestApp(BaseTestWithConfig):
                             ),
                             prompt=('Tarot card reading for the seeker '
                                     'with the cards The Magician, The Tower '
-                                    'in the style of Dr Seuss.'))
+                                    'in the style of Dr Seuss.'),
+                            seed=1234)
         # And:  stubbed out responses from openai
         reading_completion = Mock()
         reading_completion.id = 'cmpl-444555'
@@ -102,11 +130,100 @@ class TestApp(BaseTestWithConfig):
         self.assertEqual(230, card_reading.metadata.total_tokens)
         self.assertIsNone(card_reading.metadata.temperature)
         self.assertEqual(0.1, card_reading.metadata.top_p)
+        self.assertIsNotNone(card_reading.metadata.response_ms)
+        self.assertIsNone(card_reading.metadata.time_to_first_token_ms)
+        self.assertEqual(1234, card_reading.metadata.seed)
         self.assertEqual([TarotCard.TheMagician, TarotCard.TheTower], card_reading.spread)
         self.assertEqual(app.spread.prompt, card_reading.prompt)
         self.assertEqual("one fish two fish red fish dead fish", card_reading.response)
         self.assertEqual(parameters, card_reading.parameters)
 
+    def test_interpret_tarot_spread_with_n_choices(self):
+        # Given: a spread configured for 3 choices per completion
+        mock_openai_client = MagicMock()
+        app = App(self.test_config, mock_openai_client)
+        app.command = CommandDto(spread_type=SpreadType.ONE_CARD, given_cards=[TarotCard.TheFool])
+        app.create_tarot_spread()
+        app.spread.chat_completion_config = replace(app.spread.chat_completion_config, n=3)
+        # And:  a completion with 3 choices of different lengths
+        completion = SimpleNamespace(
+            id='chatcmpl-333', model='scatgpt-4', created=1681571451,
+            usage=SimpleNamespace(prompt_tokens=31, completion_tokens=100, total_tokens=131),
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))
+                     for content in ['a' * 50, 'b' * 30, 'c' * 20]])
+        mock_openai_client.chat.completions.create.return_value = completion
+
+        # When:  the app interprets the tarot spread via openai
+        card_reading: CardReading = app.interpret_tarot_spread()
+
+        # Then:  one request produced a card reading per choice, sharing the one prompt
+        self.assertEqual(1, mock_openai_client.chat.completions.create.call_count)
+        self.assertEqual(3, mock_openai_client.chat.completions.create.call_args.kwargs['n'])
+        self.assertEqual(card_reading, app.card_readings[0])
+        self.assertEqual(['a' * 50, 'b' * 30, 'c' * 20], [reading.response for reading in app.card_readings])
+        self.assertEqual([0, 1, 2], [reading.metadata.choice_index for reading in app.card_readings])
+        self.assertEqual({app.spread.prompt}, {reading.prompt for reading in app.card_readings})
+        # And:   the usage is split across the readings, adding up to the completion's totals
+        self.assertEqual([11, 10, 10], [reading.metadata.prompt_tokens for reading in app.card_readings])
+        self.assertEqual([50, 30, 20], [reading.metadata.completion_tokens for reading in app.card_readings])
+        self.assertEqual(131, sum(reading.metadata.total_tokens for reading in app.card_readings))
+
+    def test_execute_streaming_chat_completion_request(self):
+        # Given: a stream of chat completion chunks, the last of which only carries the usage
+        def chunk(content=None, usage=None):
+            choices = [] if content is None else [SimpleNamespace(index=0, delta=SimpleNamespace(content=content))]
+            return SimpleNamespace(id='chatcmpl-777', model='scatgpt-4', created=1681571451, choices=choices,
+                                   usage=usage)
+        stream = MagicMock()
+        stream.__iter__.return_value = iter([chunk(''), chunk('one fish '), chunk('two fish'),
+                                             chunk(usage={'prompt_tokens': 30, 'completion_tokens': 4,
+                                                          'total_tokens': 34})])
+        mock_openai_client = MagicMock()
+        mock_openai_client.chat.completions.create.return_value = stream
+        output = StringIO()
+
+        # When:  the streamed completion request is executed
+        completion, response, latency = _execute_streaming_chat_completion_request(
+            mock_openai_client, {'model': 'scatgpt-4', 'messages': []}, output)
+
+        # Then:  the tokens are written to the output as they arrive
+        self.assertEqual("one fish two fish\n", output.getvalue())
+        self.assertTrue(mock_openai_client.chat.completions.create.call_args.kwargs['stream'])
+        self.assertTrue(stream.close.called)
+        # And:   the complete response and usage are assembled from the chunks
+        self.assertEqual("one fish two fish", response)
+        self.assertEqual('chatcmpl-777', completion.id)
+        self.assertEqual(34, completion.usage.total_tokens)
+        # And:   both the total latency and the time to first token are measured
+        self.assertIsNotNone(latency.time_to_first_token_ms)
+        self.assertGreaterEqual(latency.response_ms, latency.time_to_first_token_ms)
+
+    def test_interpret_tarot_spread_streamed(self):
+        # Given: a command asking for a streamed response
+        mock_openai_client = MagicMock()
+        app = App(self.test_config, mock_openai_client)
+        app.command = CommandDto(spread_type=SpreadType.ONE_CARD, given_cards=[TarotCard.TheFool],
+                                 stream_response=True)
+        app.create_tarot_spread()
+        # And:  a stream of chunks from openai, without any usage reported
+        stream = MagicMock()
+        stream.__iter__.return_value = iter([SimpleNamespace(
+            id='chatcmpl-888', model='scatgpt-4', created=1681571451,
+            choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content='a leap of faith'))])])
+        mock_openai_client.chat.completions.create.return_value = stream
+
+        # When:  the app interprets the tarot spread via openai
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            card_reading: CardReading = app.interpret_tarot_spread()
+
+        # Then:  the response was streamed to stdout
+        self.assertIn("a leap of faith\n", mock_stdout.getvalue())
+        # And:   the card reading is complete, with the time to first token measured
+        self.assertEqual("a leap of faith", card_reading.response)
+        self.assertEqual('chatcmpl-888', card_reading.metadata.openai_id)
+        self.assertIsNone(card_reading.metadata.total_tokens)
+        self.assertIsNotNone(card_reading.metadata.time_to_first_token_ms)
+
     @patch('tarobot.app.app.App.interpret_tarot_spread')
     @patch('tarobot.app.app.App.create_tarot_spread')
     @patch('tarobot.app.command_parser.CommandParser.parse_command_line_args')
@@ -124,4 +241,35 @@ class TestApp(BaseTestWithConfig):
         # And:   the expected helper methods are called
         self.assertTrue(mock_create_spread.called)
         self.assertTrue(mock_interpret_spread.called)
+
+    @patch('tarobot.app.batch_api.run_batch_api')
+    def test_run_batch_api_failed_batch(self, mock_run_batch_api):
+        # Given: a batch-api command whose batch fails
+        app = App(self.test_config)
+        app.command = CommandDto(command_type=CommandType.BATCH_API,
+                                 command_options={'work_dir': 'work', 'input': '-', 'output': '-', 'transport': 'file',
+                                                  'poll_interval': 60, 'resume': False})
+        mock_run_batch_api.side_effect = RuntimeError("Batch batch-123 failed")
+
+        # When:  the command is run
+        # Then:  the failure is logged, and the app exits with an error code rather than a traceback
+        with self.assertLogs('tarobot.app.app', level='CRITICAL') as logs, self.assertRaises(SystemExit) as exit_:
+            app.run_command()
+        self.assertEqual(1, exit_.exception.code)
+        self.assertIn("Batch batch-123 failed", logs.output[0])
+
+    def test_import_is_lazy(self):
+        # Given: a fresh interpreter that only imports the tarobot package
+        script = ("import sys, tarobot, tarobot.app.config as config, tarobot.tarot.reading_config as reading; "
+                  "print(config._config.is_loaded(), reading._reading_config.is_loaded(), "
+                  "'openai' in sys.modules, 'sqlalchemy' in sys.modules, 'asyncio' in sys.modules, "
+                  "'sqlite3' in sys.modules)")
+
+        # When:  the package is imported
+        repo_root = dirname(dirname(dirname(realpath(__file__))))
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, check=True, text=True,
+                                cwd=repo_root).stdout
+
+        # Then:  no config has been parsed, and none of openai, sqlalchemy, asyncio, or sqlite3 has been imported
+        self.assertEqual("False False False False False False", output.strip())
 # pylint: enable=C0115,C0116,R0903
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around the asyncio reading pipeline."""
+
+import asyncio
+import threading
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# pylint: disable=E0401
+from base_test_with_config import BaseTestWithConfig
+from mock_completion import mock_completion
+# pylint: enable=E0401
+from tarobot.app import CommandDto
+from tarobot.app.async_app import AsyncApp
+from tarobot.tarot import SpreadType, TarotCard
+
+
+# pylint: disable=C0115,C0116
+class TestAsyncApp(BaseTestWithConfig, IsolatedAsyncioTestCase):
+
+    async def test_generate_card_reading(self):
+        # Given: a mocked up async openai client
+        mock_openai_client = MagicMock()
+        mock_openai_client.chat.completions.create = AsyncMock(return_value=mock_completion('one fish two fish'))
+        app = AsyncApp(self.test_config, mock_openai_client)
+        # And:   a command with given cards
+        command = CommandDto(spread_type=SpreadType.ONE_CARD, given_cards=[TarotCard.TheSun])
+
+        # When:  the card reading is generated
+        card_reading = await app.generate_card_reading(command)
+
+        # Then:  the card reading contains the spread and the response
+        self.assertEqual([TarotCard.TheSun], card_reading.spread)
+        self.assertEqual('one fish two fish', card_reading.response)
+        self.assertEqual('cmpl-444555', card_reading.metadata.openai_id)
+        self.assertIn('The Sun', card_reading.prompt)
+        # And:   the stop sequence was sent with the request
+        self.assertEqual('END-OF-TRANSMISSION', mock_openai_client.chat.completions.create.call_args.kwargs['stop'])
+
+    async def test_generate_card_readings_bounded_concurrency(self):
+        # Given: a mocked up async openai client that tracks how many requests are in flight
+        in_flight, peak_in_flight = 0, 0
+
+        async def create(**_kwargs):
+            nonlocal in_flight, peak_in_flight
+            in_flight += 1
+            peak_in_flight = max(peak_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return mock_completion('reading')
+        mock_openai_client = MagicMock()
+        mock_openai_client.chat.completions.create = create
+        app = AsyncApp(self.test_config, mock_openai_client, max_concurrency=3)
+        # And:   many commands to execute
+        commands = [CommandDto(spread_type=SpreadType.ONE_CARD, card_count=1) for _ in range(20)]
+
+        # When:  all the readings are generated
+        card_readings = [card_reading async for card_reading in app.generate_card_readings(commands)]
+
+        # Then:  every reading completed, without ever exceeding the concurrency limit
+        self.assertEqual(20, len(card_readings))
+        self.assertEqual(3, peak_in_flight)
+
+    async def test_generate_card_readings_pulls_commands_lazily(self):
+        # Given: a mocked up async openai client
+        mock_openai_client = MagicMock()
+        mock_openai_client.chat.completions.create = AsyncMock(return_value=mock_completion('reading'))
+        app = AsyncApp(self.test_config, mock_openai_client, max_concurrency=2)
+        # And:   a generator of commands that tracks how many have been pulled
+        pulled = 0
+
+        def commands():
+            nonlocal pulled
+            for _ in range(20):
+                pulled += 1
+                yield CommandDto(spread_type=SpreadType.ONE_CARD, card_count=1)
+
+        # When:  the first reading is generated
+        card_readings = app.generate_card_readings(commands())
+        await anext(card_readings)
+
+        # Then:  only as many commands as fit in the pending set were pulled
+        self.assertEqual(4, pulled)
+        # And:   the rest are pulled as the readings complete
+        self.assertEqual(19, len([card_reading async for card_reading in card_readings]))
+        self.assertEqual(20, pulled)
+
+    async def test_generate_card_readings_yields_every_choice(self):
+        # Given: a mocked up async openai client whose completions have two choices
+        completion = mock_completion('first choice')
+        second_choice = MagicMock()
+        second_choice.message.content = 'second choice'
+        completion.choices.append(second_choice)
+        mock_openai_client = MagicMock()
+        mock_openai_client.chat.completions.create = AsyncMock(return_value=completion)
+        app = AsyncApp(self.test_config, mock_openai_client)
+        # And:   two commands
+        commands = [CommandDto(spread_type=SpreadType.ONE_CARD, card_count=1) for _ in range(2)]
+
+        # When:  all the readings are generated
+        card_readings = [card_reading async for card_reading in app.generate_card_readings(commands)]
+
+        # Then:  a reading was yielded for every choice of every command
+        self.assertEqual(['first choice', 'first choice', 'second choice', 'second choice'],
+                         sorted(card_reading.response for card_reading in card_readings))
+
+    async def test_response_cache_used_off_the_event_loop(self):
+        # Given: a mocked up async openai client
+        mock_openai_client = MagicMock()
+        mock_openai_client.chat.completions.create = AsyncMock(return_value=mock_completion('reading'))
+        app = AsyncApp(self.test_config, mock_openai_client)
+        # And:   a response cache that records the threads it is called from
+        cache_threads = []
+        app.response_cache = MagicMock()
+        app.response_cache.get.side_effect = lambda *_args: cache_threads.append(threading.current_thread())
+        app.response_cache.put.side_effect = lambda *_args: cache_threads.append(threading.current_thread())
+
+        # When:  a card reading is generated
+        await app.generate_card_reading(CommandDto(spread_type=SpreadType.ONE_CARD, given_cards=[TarotCard.TheSun]))
+
+        # Then:  the cache was read and written, but never on the event loop's thread
+        self.assertEqual(2, len(cache_threads))
+        self.assertNotIn(threading.current_thread(), cache_threads)
+
+    async def test_streamed_reading_served_from_cache(self):
+        # Given: an app whose response cache holds a completion with two choices
+        completion = mock_completion('first choice')
+        second_choice = MagicMock()
+        second_choice.message.content = 'second choice'
+        completion.choices.append(second_choice)
+        app = AsyncApp(self.test_config, MagicMock())
+        app.response_cache = MagicMock()
+        app.response_cache.get.return_value = (completion, 'first choice\nsecond choice')
+        command = CommandDto(spread_type=SpreadType.ONE_CARD, given_cards=[TarotCard.TheSun])
+        tokens = []
+
+        # When:  the reading is generated, streamed
+        card_readings = await app.generate_card_reading_choices(command, tokens.append)
+
+        # Then:  only the first choice was streamed, though every choice became a reading
+        self.assertEqual(['first choice'], tokens)
+        self.assertEqual(['first choice', 'second choice'], [card_reading.response for card_reading in card_readings])
+
+    @patch('tarobot.app.async_app.persist_card_readings')
+    async def test_generate_card_reading_persisted(self, mock_persist_card_readings):
+        # Given: a mocked up async openai client
+        mock_openai_client = MagicMock()
+        mock_openai_client.chat.completions.create = AsyncMock(return_value=mock_completion('reading'))
+        app = AsyncApp(self.test_config, mock_openai_client)
+        # And:   a command that asks for the reading to be persisted
+        command = CommandDto(spread_type=SpreadType.ONE_CARD, card_count=1, persist_reading=True)
+
+        # When:  the card reading is generated
+        card_reading = await app.generate_card_reading(command)
+
+        # Then:  the card reading is persisted
+        mock_persist_card_readings.assert_called_once_with([card_reading])
+
+    async def test_identical_requests_coalesced(self):
+        # Given: a mocked up async openai client that takes a moment to respond
+        async def create(**_kwargs):
+            await asyncio.sleep(0.01)
+            return mock_completion('card of the day')
+        mock_openai_client = MagicMock()
+        mock_openai_client.chat.completions.create = AsyncMock(side_effect=create)
+        app = AsyncApp(self.test_config, mock_openai_client)
+        # And:   a burst of identical given-card commands
+        commands = [CommandDto(spread_type=SpreadType.ONE_CARD, given_cards=[TarotCard.TheStar]) for _ in range(5)]
+
+        # When:  the readings are generated concurrently
+        card_readings = await asyncio.gather(*[app.generate_card_reading(command) for command in commands])
+
+        # Then:  openai was only asked once
+        self.assertEqual(1, mock_openai_client.chat.completions.create.call_count)
+        self.assertEqual(4, app.coalesced_count)
+        # And:   every caller received its own copy of the reading
+        self.assertEqual(5, len({id(card_reading) for card_reading in card_readings}))
+        self.assertEqual({'card of the day'}, {card_reading.response for card_reading in card_readings})
+
+    async def test_coalesced_request_failure(self):
+        # Given: a mocked up async openai client that fails, then recovers
+        async def fail(**_kwargs):
+            await asyncio.sleep(0.01)
+            raise ConnectionError("no route to openai")
+        mock_openai_client = MagicMock()
+        mock_openai_client.chat.completions.create = AsyncMock(side_effect=fail)
+        app = AsyncApp(self.test_config, mock_openai_client)
+        command = CommandDto(spread_type=SpreadType.ONE_CARD, given_cards=[TarotCard.TheMoon])
+
+        # When:  identical readings are requested concurrently
+        results = await asyncio.gather(app.generate_card_reading(command), app.generate_card_reading(command),
+                                       return_exceptions=True)
+
+        # Then:  every caller sees the failure
+        self.assertTrue(all(isinstance(result, ConnectionError) for result in results))
+        # And:   the failed request is not reused by the next reading
+        mock_openai_client.chat.completions.create.side_effect = None
+        mock_openai_client.chat.completions.create.return_value = mock_completion('a new moon')
+        card_reading = await app.generate_card_reading(command)
+        self.assertEqual('a new moon', card_reading.response)
+        self.assertEqual(2, mock_openai_client.chat.completions.create.call_count)
+
+    def test_invalid_max_concurrency(self):
+        # When:  an async app is created without any request slots
+        # Then:  an exception is raised
+        with self.assertRaises(ValueError):
+            AsyncApp(self.test_config, MagicMock(), max_concurrency=0)
+# pylint: enable=C0115,C0116
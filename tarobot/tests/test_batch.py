@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around the jsonl batch reading mode."""
+
+from io import StringIO
+import json
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock
+
+# pylint: disable=E0401
+from base_test_with_config import BaseTestWithConfig
+from mock_completion import mock_completion
+# pylint: enable=E0401
+from tarobot.app import CommandParser
+from tarobot.app.async_app import AsyncApp
+from tarobot.app.batch import run_batch
+
+
+# pylint: disable=C0115,C0116
+class TestBatch(BaseTestWithConfig, IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.mock_openai_client = MagicMock()
+        self.mock_openai_client.chat.completions.create = AsyncMock(return_value=mock_completion('one fish two fish'))
+
+    async def test_run_batch(self):
+        # Given: an async app and a command parser
+        app = AsyncApp(self.test_config, self.mock_openai_client, max_concurrency=2)
+        parser = CommandParser(self.test_config)
+        # And:   jsonl reading requests, including blank and invalid lines
+        input_lines = [
+            '{"id": "a", "spread_type": "one-card", "cards": ["The Fool"]}\n',
+            '\n',
+            '{"id": "b", "spread_type": "card-list", "parameters": {"teller": "Dr Seuss"}, "card_count": 2}\n',
+            '{"id": "c", "spread_type": "no-such-spread"}\n',
+            '{"id": "d", "spread_type": "situation"}\n',
+            'not json\n',
+            '{"id": "e", "spread_type": "timeline", "cards": ["The Fool", "Fool", "The Sun"]}\n'
+        ]
+        output_file = StringIO()
+
+        # When:  the batch is run
+        summary = await run_batch(app, parser, input_lines, output_file)
+
+        # Then:  every request produced one result line
+        results = {result['line']: result for result in map(json.loads, output_file.getvalue().splitlines())}
+        self.assertEqual({1, 3, 4, 5, 6, 7}, set(results.keys()))
+        self.assertEqual(2, summary.succeeded)
+        self.assertEqual(4, summary.failed)
+        # And:   the successful readings hold the requested spreads
+        self.assertEqual('a', results[1]['id'])
+        self.assertEqual([0], results[1]['reading']['spread'])
+        self.assertEqual('one fish two fish', results[1]['reading']['response'])
+        self.assertEqual(2, len(results[3]['reading']['spread']))
+        self.assertEqual({'seeker': 'the seeker', 'teller': 'Dr Seuss'}, results[3]['reading']['parameters'])
+        # And:   the failures explain what went wrong
+        self.assertEqual('ValueError: Unknown spread type: no-such-spread', results[4]['error'])
+        self.assertIn('missing required parameters', results[5]['error'])
+        self.assertIn('JSONDecodeError', results[6]['error'])
+        self.assertEqual('ValueError: Duplicate card: The Fool', results[7]['error'])
+        # And:   only the valid requests were sent to openai
+        self.assertEqual(2, self.mock_openai_client.chat.completions.create.call_count)
+# pylint: enable=C0115,C0116
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around the offline batch api pipeline."""
+
+from io import StringIO
+import json
+import os
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest.mock import MagicMock, patch
+
+# pylint: disable=E0401
+from base_test_with_config import BaseTestWithConfig
+# pylint: enable=E0401
+from tarobot.app import CommandParser
+from tarobot.app.batch_api import FileBatchTransport, ingest_batch_results, OpenAIBatchTransport, REQUESTS_FILE, \
+    RESULTS_FILE, run_batch_api
+from tarobot.tarot import TarotCard
+
+
+def _respond(body):
+    if 'Dr Seuss' in body['messages'][1]['content']:
+        raise ValueError("the model is having a bad day")
+    return {'id': 'chatcmpl-batch', 'object': 'chat.completion', 'created': 1681571451, 'model': body['model'],
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ' a reading '}}],
+            'usage': {'prompt_tokens': 30, 'completion_tokens': 2, 'total_tokens': 32}}
+
+
+# pylint: disable=C0103,C0115,C0116
+class TestBatchApi(BaseTestWithConfig):
+
+    def setUp(self):
+        super().setUp()
+        self.parser = CommandParser(self.test_config)
+        work_dir = TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(work_dir.cleanup)
+        self.work_dir = work_dir.name
+        self.transport = FileBatchTransport(join(self.work_dir, 'transport'), _respond)
+        self.input_lines = [
+            '{"id": "a", "spread_type": "one-card", "cards": ["The Fool"], "persist_reading": true}\n',
+            '\n',
+            '{"id": "b", "spread_type": "card-list", "card_count": 2}\n',
+            '{"id": "c", "spread_type": "no-such-spread"}\n',
+            '{"id": "d", "spread_type": "card-list", "parameters": {"teller": "Dr Seuss"}}\n'
+        ]
+
+    @patch('tarobot.app.batch_api.persist_card_readings')
+    def test_run_batch_api(self, mock_persist_card_readings):
+        # Given: jsonl reading requests, including one that cannot be rendered and one the model fails on
+        output_file = StringIO()
+
+        # When:  the batch pipeline is run against the file-based transport
+        summary = run_batch_api(self.transport, self.parser, self.input_lines, self.work_dir, output_file,
+                                poll_interval_secs=0)
+
+        # Then:  every rendered request was sent in the batch api format
+        with open(join(self.work_dir, REQUESTS_FILE), encoding='utf-8') as requests_file:
+            requests = [json.loads(line) for line in requests_file]
+        self.assertEqual(['line-1', 'line-3', 'line-5'], [request['custom_id'] for request in requests])
+        self.assertEqual({'/v1/chat/completions'}, {request['url'] for request in requests})
+        # And:   the results were ingested back into card readings
+        results = {result['custom_id']: result for result in map(json.loads, output_file.getvalue().splitlines())}
+        self.assertEqual(2, summary.succeeded)
+        self.assertEqual(2, summary.failed)
+        self.assertEqual('a', results['line-1']['id'])
+        self.assertEqual('a reading', results['line-1']['reading']['response'])
+        self.assertEqual([TarotCard.TheFool.value], results['line-1']['reading']['spread'])
+        self.assertEqual(2, len(results['line-3']['reading']['spread']))
+        self.assertIn("bad day", results['line-5']['error'])
+        # And:   only the reading that asked to be persisted was bulk inserted
+        (persisted,) = mock_persist_card_readings.call_args.args
+        self.assertEqual(["a reading"], [card_reading.response for card_reading in persisted])
+
+    @patch('tarobot.app.batch_api.persist_card_readings')
+    def test_run_batch_api_resume(self, _):
+        # Given: a batch that was already submitted
+        run_batch_api(self.transport, self.parser, self.input_lines, self.work_dir, StringIO(), poll_interval_secs=0)
+        (batch_id,) = os.listdir(join(self.work_dir, 'transport'))
+        responder = MagicMock()
+        self.transport.responder = responder
+
+        # When:  the pipeline is resumed for that batch
+        output_file = StringIO()
+        summary = run_batch_api(self.transport, self.parser, [], self.work_dir, output_file, poll_interval_secs=0,
+                                batch_id=batch_id)
+
+        # Then:  the existing results are ingested without submitting anything new
+        self.assertFalse(responder.called)
+        self.assertEqual(2, summary.succeeded)
+        self.assertTrue(output_file.getvalue())
+
+    def test_openai_batch_transport(self):
+        # Given: a mocked up openai client
+        openai_client = MagicMock()
+        openai_client.files.create.return_value.id = 'file-in'
+        openai_client.post.return_value = {'id': 'batch_123', 'status': 'validating'}
+        openai_client.get.return_value = {'id': 'batch_123', 'status': 'completed', 'output_file_id': 'file-out',
+                                          'error_file_id': None}
+        openai_client.files.content.return_value.content = b'{"custom_id": "line-1"}\n'
+        transport = OpenAIBatchTransport(openai_client)
+        requests_path = join(self.work_dir, REQUESTS_FILE)
+        with open(requests_path, 'w', encoding='utf-8') as requests_file:
+            requests_file.write('{}\n')
+
+        # When:  a batch is submitted, polled, and downloaded
+        batch_id = transport.submit(requests_path)
+        status = transport.status(batch_id)
+        transport.download_results(batch_id, join(self.work_dir, RESULTS_FILE))
+
+        # Then:  the batch api endpoints were used
+        self.assertEqual('batch_123', batch_id)
+        self.assertEqual('completed', status)
+        self.assertEqual('file-in', openai_client.post.call_args.kwargs['body']['input_file_id'])
+        openai_client.files.content.assert_called_once_with('file-out')
+        with open(join(self.work_dir, RESULTS_FILE), encoding='utf-8') as results_file:
+            self.assertEqual('{"custom_id": "line-1"}\n', results_file.read())
+
+    def test_openai_batch_transport_output_and_error_files(self):
+        # Given: a mocked up openai client with a batch whose output file does not end in a newline
+        openai_client = MagicMock()
+        openai_client.get.return_value = {'id': 'batch_123', 'status': 'completed', 'output_file_id': 'file-out',
+                                          'error_file_id': 'file-err'}
+        contents = {'file-out': b'{"custom_id": "line-1"}', 'file-err': b'{"custom_id": "line-2"}\n'}
+        openai_client.files.content.side_effect = lambda file_id: MagicMock(content=contents[file_id])
+        transport = OpenAIBatchTransport(openai_client)
+
+        # When:  the batch's results are downloaded
+        transport.download_results('batch_123', join(self.work_dir, RESULTS_FILE))
+
+        # Then:  the output and error files are joined into separate jsonl lines
+        with open(join(self.work_dir, RESULTS_FILE), encoding='utf-8') as results_file:
+            self.assertEqual(['{"custom_id": "line-1"}', '{"custom_id": "line-2"}'], results_file.read().splitlines())
+
+    def test_ingest_batch_results_with_malformed_errors(self):
+        # Given: batch results whose errors are not objects with a message
+        manifest = {f"line-{n}": {'custom_id': f"line-{n}", 'id': str(n)} for n in range(1, 4)}
+        results_lines = [
+            '{"custom_id": "line-1", "error": "batch expired"}\n',
+            '{"custom_id": "line-2", "error": null, "response": {"status_code": 500, "body": "server error"}}\n',
+            '{"custom_id": "line-3", "error": null, "response": {"status_code": 429, "body": {"error": "slow down"}}}\n'
+        ]
+        output_file = StringIO()
+
+        # When:  the results are ingested
+        summary = ingest_batch_results(results_lines, manifest, output_file)
+
+        # Then:  every result was reported as a failure with its error message
+        self.assertEqual(3, summary.failed)
+        self.assertEqual(['ValueError: batch expired', 'ValueError: status 500: server error',
+                          'ValueError: status 429: slow down'],
+                         [json.loads(line)['error'] for line in output_file.getvalue().splitlines()])
+
+    def test_ingest_batch_results_with_malformed_lines(self):
+        # Given: batch results with a truncated line and a line that is not a json object, among other results
+        results_lines = [
+            '{"custom_id": "line-1", "error": "batch expired"}\n',
+            '{"custom_id": "line-2", "resp\n',
+            '["line-3"]\n',
+            '{"custom_id": "line-4", "error": "batch expired"}\n'
+        ]
+        output_file = StringIO()
+
+        # When:  the results are ingested
+        summary = ingest_batch_results(results_lines, {}, output_file)
+
+        # Then:  every line was reported as a failure, and the malformed ones did not stop the rest being ingested
+        self.assertEqual(4, summary.failed)
+        outputs = [json.loads(line) for line in output_file.getvalue().splitlines()]
+        self.assertEqual(['line-1', None, None, 'line-4'], [output['custom_id'] for output in outputs])
+        self.assertTrue(outputs[1]['error'].startswith('JSONDecodeError: '))
+        self.assertEqual('ValueError: Batch result is not a json object', outputs[2]['error'])
+# pylint: enable=C0103,C0115,C0116
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around the Aho-Corasick card mention extractor."""
+
+from os.path import dirname, realpath
+import unittest
+
+import temp_snapshot_dir  # pylint: disable=E0401,W0611
+from tarobot.tarot import CardMentionExtractor, CardResolver, CardSet, TarotCard
+
+
+# pylint: disable=C0103,C0115,C0116
+class TestCardMentionExtractor(unittest.TestCase):
+
+    def setUp(self):
+        config_path = realpath(dirname(__file__)) + '/config/test_aliases.conf'
+        self.extractor = CardMentionExtractor.from_resolver(CardResolver(config_path))
+
+    def test_extract(self):
+        # Given: a response mentioning cards by name, by alias, and by rank and suit aliases
+        response = ("The Tower looms, while the Ace of Cups promises renewal. The high-priestess whispers;\n"
+                    "the Deuce of Coins balances it all, and THE SUN's warmth follows.")
+
+        # When:  the card mentions are extracted
+        mentions = self.extractor.extract(response)
+
+        # Then:  every mention is found in order, with its offsets into the response
+        self.assertEqual([TarotCard.TheTower, TarotCard.AceOfCups, TarotCard.TheHighPriestess,
+                          TarotCard.TwoOfPentacles, TarotCard.TheSun], [mention.card for mention in mentions])
+        for mention in mentions:
+            self.assertEqual(mention.text, response[mention.start:mention.end])
+        self.assertEqual(["The Tower", "Ace of Cups", "The high-priestess", "Deuce of Coins", "THE SUN"],
+                         [mention.text for mention in mentions])
+
+    def test_extract_whole_words_only(self):
+        # Given: a response with card names only inside other words, or as part of a longer card name
+        response = "Sunday's peace brings no starlight, but the Wheel of Fortune turns."
+
+        # When:  the card mentions are extracted
+        mentions = self.extractor.extract(response)
+
+        # Then:  only the whole, longest name is a mention
+        self.assertEqual([TarotCard.TheWheelOfFortune], [mention.card for mention in mentions])
+
+    def test_extract_ignores_everyday_words(self):
+        # Given: ordinary prose using words that are also the names of cards
+        response = ("You have the strength to face the world, and justice will be done. Like the sun after rain, "
+                    "the lovers of old knew that the death of one season is the birth of the next.")
+
+        # When:  the response is checked against a spread
+        mention_check = self.extractor.check([TarotCard.TheStar], response)
+
+        # Then:  none of those words is taken for a card
+        self.assertEqual([], mention_check.mentions)
+        self.assertEqual(CardSet(), mention_check.unexpected)
+
+    def test_extract_single_word_names_written_as_cards(self):
+        # Given: single word card names, capitalized or called a card
+        response = "Strength steadies you, the world card completes the cycle, and the Sun shines on Justice."
+
+        # When:  the card mentions are extracted
+        mentions = self.extractor.extract(response)
+
+        # Then:  each is a mention
+        self.assertEqual([TarotCard.Strength, TarotCard.TheWorld, TarotCard.TheSun, TarotCard.Justice],
+                         [mention.card for mention in mentions])
+
+    def test_check(self):
+        # Given: a spread and a response that skips one of its cards but brings up another
+        spread = [TarotCard.TheMoon, TarotCard.TheFool, TarotCard.KingOfSwords]
+        response = "The Moon shows illusion and the Fool a leap, much like the Magician's trickery."
+
+        # When:  the response is checked against the spread
+        mention_check = self.extractor.check(spread, response)
+
+        # Then:  the missing and unexpected cards are flagged
+        self.assertEqual(CardSet.of([TarotCard.KingOfSwords]), mention_check.missing)
+        self.assertEqual(CardSet.of([TarotCard.TheMagician]), mention_check.unexpected)
+        self.assertEqual(3, len(mention_check.mentions))
+# pylint: enable=C0103,C0115,C0116
@@ -6,6 +6,9 @@ from datetime import datetime
 import unittest
 from unittest.mock import patch, Mock
 
+# pylint: disable=E0401
+from mock_completion import mock_completion
+# pylint: enable=E0401
 from tarobot.app.app import persist_card_reading
 from tarobot.db.card_reading_entity import CardReadingEntity
 from tarobot.tarot import CardReading, TarotCard
@@ -25,15 +28,7 @@ class TestCommandParser(unittest.TestCase):
             "teller": "Bob"
         }
         # And:   a mocked up openai Completion response
-        completion = Mock()
-        completion.id = 'cmpl-444555'
-        completion.engine = 'generate'
-        completion.model = 'scatgpt-4'
-        completion.created = 1681571451
-        completion.usage = Mock()
-        completion.usage.prompt_tokens = 30
-        completion.usage.completion_tokens = 200
-        completion.usage.total_tokens = 230
+        completion = mock_completion(response)
 
         # When:  the CardReading is constructed from the Completion and card reading attributes
         card_reading = CardReading(completion, spread, prompt, response, parameters, summary)
@@ -50,6 +45,21 @@ class TestCommandParser(unittest.TestCase):
         self.assertEqual(30, metadata.prompt_tokens)
         self.assertEqual(200, metadata.completion_tokens)
         self.assertEqual(230, metadata.total_tokens)
+        self.assertIsNone(metadata.response_ms)
+
+    def test_record_latency(self):
+        # Given: a card reading for a completion of 200 tokens
+        completion = Mock()
+        completion.usage.completion_tokens = 200
+        card_reading = CardReading(completion, [TarotCard.TheFool], "prompt", "response")
+
+        # When:  the latency of a streamed request is recorded
+        card_reading.metadata.record_latency(4500, 500)
+
+        # Then:  the latencies are stored, and the token rate only covers the time spent generating tokens
+        self.assertEqual(4500, card_reading.metadata.response_ms)
+        self.assertEqual(500, card_reading.metadata.time_to_first_token_ms)
+        self.assertEqual(50.0, card_reading.metadata.completion_tokens_per_sec)
 
     @patch("tarobot.app.app.session_factory")
     def test_persist_card_reading(self, mock_session_factory):
@@ -67,18 +77,12 @@ class TestCommandParser(unittest.TestCase):
         prompt = "Tarot card reading for the seeker blah blah blah"
         response = "Yo, good things are gonna come to you"
         summary = "Positive"
-        completion = Mock()
-        completion.id = 'cmpl-444555'
-        completion.engine = 'generate'
-        completion.model = 'scatgpt-4'
-        completion.created = 1681571451
-        completion.usage = Mock()
-        completion.usage.prompt_tokens = 30
-        completion.usage.completion_tokens = 200
-        completion.usage.total_tokens = 230
+        completion = mock_completion(response)
         card_reading = CardReading(completion, spread, prompt, response, parameters, summary)
         card_reading.metadata.max_tokens = 2000
         card_reading.metadata.top_p = 0.1
+        card_reading.metadata.record_latency(2000, 400)
+        card_reading.metadata.seed = 8675309
 
         # When:  the card reading is persisted to the database
         persist_card_reading(card_reading)
@@ -104,4 +108,8 @@ class TestCommandParser(unittest.TestCase):
         self.assertEqual(230, entity.total_tokens)
         self.assertIsNone(entity.temperature)
         self.assertEqual(0.1, entity.top_p)
+        self.assertEqual(2000, entity.response_ms)
+        self.assertEqual(400, entity.time_to_first_token_ms)
+        self.assertEqual(125.0, entity.completion_tokens_per_sec)
+        self.assertEqual(8675309, entity.seed)
 # pylint: disable=C0115,C0116,R0914
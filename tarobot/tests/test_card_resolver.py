@@ -3,9 +3,12 @@
 """Module containing all the tarot card resolver logic unit tests."""
 
 from os.path import dirname, realpath
+import random
 import unittest
 
-from tarobot.tarot import CardResolver, CardValue, Suit, TarotCard
+import temp_snapshot_dir  # pylint: disable=E0401,W0611
+from tarobot.tarot import CardMatch, CardResolver, CardValue, Suit, TarotCard
+from tarobot.tarot.bk_tree import BKTree, edit_distance
 
 
 # pylint: disable=C0115,C0116
@@ -134,4 +137,82 @@ class TestCardResolver(unittest.TestCase):
 
         # Then:  no matching TarotCard is found
         self.assertIsNone(tarot_card)
+
+    def test_match_card_misspelled(self):
+        # Given: misspelled card names, with the cards they were meant to be
+        misspellings = {
+            "Kinng of Swrods": TarotCard.KingOfSwords,
+            "The Hermitt": TarotCard.TheHermit,
+            "hierophnt": TarotCard.TheHierophant,
+            "Qeen of Coins": TarotCard.QueenOfPentacles,
+            "Page of Wnads": TarotCard.PageOfWands
+        }
+
+        # When:  the cards are matched by name
+        matches = {name: self.resolver.match_card(name) for name in misspellings}
+
+        # Then:  each resolves to the intended card, with less than full confidence
+        for (name, tarot_card) in misspellings.items():
+            self.assertEqual(tarot_card, matches[name].card, name)
+            self.assertTrue(0.5 < matches[name].confidence < 1.0, name)
+        self.assertEqual(TarotCard.KingOfSwords, self.resolver.get_optional_card_by_alias("Kinng of Swrods"))
+
+    def test_match_card_ambiguous_misspelling(self):
+        # Given: misspellings just as close to two different cards, e.g. "free" to both "three" and "five"
+        ambiguous_names = ["free of pentacles", "Kinght of Wands"]
+
+        # When:  the cards are matched by name
+        # Then:  neither card is guessed at
+        for name in ambiguous_names:
+            self.assertIsNone(self.resolver.match_card(name), name)
+        self.assertEqual([(0, "free of pentacles")], self.resolver.resolve_many(["free of pentacles"]).failures)
+        # And:   a misspelling closer to one of them still resolves
+        self.assertEqual(TarotCard.ThreeOfPentacles, self.resolver.match_card("thre of pentacles").card)
+
+    def test_match_card_exact(self):
+        # When:  known aliases, whole or by rank and suit, are matched
+        # Then:  they match with full confidence
+        self.assertEqual(CardMatch(TarotCard.TheHierophant, 1.0), self.resolver.match_card("The POPE"))
+        self.assertEqual(CardMatch(TarotCard.TwoOfPentacles, 1.0), self.resolver.match_card("Deuce of Coins"))
+        # And:   names too far from every alias do not match at all
+        self.assertIsNone(self.resolver.match_card("Bob"))
+        self.assertIsNone(self.resolver.match_card(""))
+
+    def test_resolve_many(self):
+        # Given: card names, some repeated, misspelled, or unresolvable
+        card_names = ["The POPE", "FooOfBar", "Deuce of Coins", "the pope", "Kinng of Swrods", "FooOfBar", "sun"]
+
+        # When:  the names are resolved all at once
+        resolved = self.resolver.resolve_many(card_names)
+
+        # Then:  the cards are returned in order, with the unresolvable names listed by index
+        self.assertEqual([TarotCard.TheHierophant, None, TarotCard.TwoOfPentacles, TarotCard.TheHierophant,
+                          TarotCard.KingOfSwords, None, TarotCard.TheSun], resolved.cards)
+        self.assertEqual([(1, "FooOfBar"), (5, "FooOfBar")], resolved.failures)
+        self.assertEqual([self.resolver.get_optional_card_by_alias(name) for name in card_names], resolved.cards)
+
+
+class TestBKTree(unittest.TestCase):
+
+    def test_edit_distance(self):
+        self.assertEqual(0, edit_distance("tower", "tower"))
+        self.assertEqual(3, edit_distance("kitten", "sitting"))
+        self.assertEqual(5, edit_distance("", "wands"))
+        self.assertEqual(2, edit_distance("swords", "swrods"))
+
+    def test_search_finds_every_close_string(self):
+        # Given: a tree over random strings
+        rng = random.Random(21)
+        words = {"".join(rng.choice("abcd") for _ in range(rng.randrange(1, 9))) for _ in range(300)}
+        tree = BKTree((word, word.upper()) for word in words)
+
+        # When:  strings are searched for
+        for query in ("abc", "dddd", "abcdabcd", "b"):
+            matches = tree.search(query, 2)
+
+            # Then:  exactly the strings within the distance are found, closest first
+            expected = sorted((edit_distance(query, word), word, word.upper()) for word in words
+                              if edit_distance(query, word) <= 2)
+            self.assertEqual(expected, matches)
+        self.assertEqual(len(words), len(tree))
 # pylint: enable=C0115,C0116
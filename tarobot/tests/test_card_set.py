@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around the bitset-backed CardSet."""
+
+import unittest
+
+from tarobot.tarot import Archana, CardSet, Suit, TarotCard, TarotDeck
+
+
+# pylint: disable=C0115,C0116
+class TestCardSet(unittest.TestCase):
+
+    def test_membership_and_size(self):
+        # When:  a card set is built from some cards, listed out of order and more than once
+        card_set = CardSet.of([TarotCard.TheWorld, TarotCard.TheFool, TarotCard.AceOfCups, TarotCard.TheFool])
+
+        # Then:  it holds each card once, iterating them in deck order
+        self.assertEqual(3, len(card_set))
+        self.assertIn(TarotCard.AceOfCups, card_set)
+        self.assertNotIn(TarotCard.TheSun, card_set)
+        self.assertNotIn(0, card_set)
+        self.assertEqual([TarotCard.TheFool, TarotCard.TheWorld, TarotCard.AceOfCups], list(card_set))
+        self.assertEqual((1 << 0) | (1 << 21) | (1 << TarotCard.AceOfCups.value), card_set.mask)
+
+    def test_set_operations(self):
+        # Given: two overlapping card sets
+        first = CardSet.of([TarotCard.TheFool, TarotCard.TheMagician])
+        second = CardSet.of([TarotCard.TheMagician, TarotCard.TheEmpress])
+
+        # Then:  they combine like sets
+        self.assertEqual(CardSet.of([TarotCard.TheFool, TarotCard.TheMagician, TarotCard.TheEmpress]), first | second)
+        self.assertEqual(CardSet.of([TarotCard.TheMagician]), first & second)
+        self.assertEqual(CardSet.of([TarotCard.TheFool]), first - second)
+        self.assertEqual(CardSet.of([TarotCard.TheFool, TarotCard.TheEmpress]), first ^ second)
+        self.assertEqual(76, len(~first))
+        self.assertFalse(first.isdisjoint(second))
+        self.assertTrue((first & second).issubset(first))
+        self.assertEqual(first, CardSet().with_card(TarotCard.TheMagician).with_card(TarotCard.TheFool))
+        self.assertEqual(hash(first), hash(CardSet.of([TarotCard.TheMagician, TarotCard.TheFool])))
+        self.assertFalse(CardSet())
+
+    def test_archana_and_suits(self):
+        # When:  the card sets of the archana and suits are looked up
+        # Then:  they partition the deck
+        self.assertEqual(22, len(CardSet.of_archana(Archana.MAJOR)))
+        self.assertEqual(CardSet.full(), CardSet.of_archana(Archana.MAJOR) | CardSet.of_archana(Archana.MINOR))
+        minor = CardSet()
+        for suit in Suit:
+            self.assertEqual(14, len(CardSet.of_suit(suit)))
+            self.assertTrue(minor.isdisjoint(CardSet.of_suit(suit)))
+            minor |= CardSet.of_suit(suit)
+        self.assertEqual(CardSet.of_archana(Archana.MINOR), minor)
+
+    def test_invalid_mask(self):
+        # When:  a card set is created with bits beyond the deck
+        # Then:  an exception is raised
+        with self.assertRaises(ValueError):
+            CardSet(1 << 78)
+
+    def test_deck_excluding_cards(self):
+        # Given: cards that were already dealt
+        dealt = CardSet.of([TarotCard.TheTower, TarotCard.KingOfSwords])
+
+        # When:  a deck is created without them
+        deck = TarotDeck(excluded=dealt)
+
+        # Then:  the deck holds every other card
+        self.assertEqual(76, len(deck.cards))
+        self.assertEqual(~dealt, deck.remaining())
+        # And:   drawing from the deck removes the drawn cards
+        drawn = CardSet.of(deck.draw(5))
+        self.assertTrue(drawn.isdisjoint(deck.remaining() | dealt))
+# pylint: enable=C0115,C0116
@@ -7,8 +7,9 @@ from argparse import ArgumentError
 # pylint: disable=E0401
 from base_test_with_config import BaseTestWithConfig
 # pylint: enable=E0401
-from tarobot.tarot import TarotCard
+from tarobot.tarot import SpreadType, TarotCard
 from tarobot.app import CommandParser
+from tarobot.app.command_parser import CommandType
 
 
 # pylint: disable=C0115,C0116
@@ -21,6 +22,7 @@ class TestCommandParser(BaseTestWithConfig):
             '--show-prompt',
             '--show-diagnostics',
             '--persist-reading',
+            '--stream',
             'card-list',
             '--card-count', '4',
             '--seeker', 'nobody',
@@ -37,6 +39,7 @@ class TestCommandParser(BaseTestWithConfig):
         self.assertTrue(command.show_prompt)
         self.assertTrue(command.show_diagnostics)
         self.assertTrue(command.persist_reading)
+        self.assertTrue(command.stream_response)
 
     def test_parse_command_line_args_invalid_card_count(self):
         # Given: some mocked up command line arguments
@@ -133,4 +136,178 @@ class TestCommandParser(BaseTestWithConfig):
         with self.assertRaises(ValueError) as val_error:
             parser.parse_command_line_args(args)
         self.assertEqual("Only [1-3] cards allowed in the tarot card spread", str(val_error.exception))
+
+    def test_parse_reading_request(self):
+        # Given: a reading request with given cards and some of the spread parameters
+        parser = CommandParser(self.test_config)
+        request = {'spread_type': 'card-list', 'parameters': {'teller': 'Dr Seuss'}, 'cards': ['The Sun', 'Fool']}
+
+        # When:  the reading request is parsed
+        command = parser.parse_reading_request(request)
+
+        # Then:  the command holds the spread type, cards, and parameters (with defaults filled in)
+        self.assertEqual(SpreadType.CARD_LIST, command.spread_type)
+        self.assertEqual([TarotCard.TheSun, TarotCard.TheFool], command.given_cards)
+        self.assertEqual({'seeker': 'the seeker', 'teller': 'Dr Seuss'}, command.spread_parameters)
+
+    def test_parse_command_line_args_with_seed(self):
+        # Given: command line arguments asking for a spread drawn with a given seed
+        parser = CommandParser(self.test_config)
+        args = ['card-list', '--card-count', '5', '--seed', '8675309']
+
+        # When:  the command line arguments are parsed
+        command = parser.parse_command_line_args(args)
+
+        # Then:  the command holds the seed
+        self.assertEqual(8675309, command.seed)
+        self.assertEqual(5, command.card_count)
+        # And:   a seed out of range is rejected
+        with self.assertRaises(ValueError):
+            parser.parse_command_line_args(['card-list', '--seed', '-1'])
+
+    def test_parse_reading_request_invalid_card_count(self):
+        # Given: a reading request with too many cards for the spread
+        parser = CommandParser(self.test_config)
+        request = {'spread_type': 'card-list', 'card_count': 42}
+
+        # When:  the reading request is parsed
+        # Then:  an exception is raised due to the card count
+        with self.assertRaises(ValueError) as val_error:
+            parser.parse_reading_request(request)
+        self.assertEqual("Only [1-5] cards allowed in the tarot card spread", str(val_error.exception))
+
+    def test_parse_reading_request_malformed_fields(self):
+        # Given: reading requests with fields of the wrong type
+        parser = CommandParser(self.test_config)
+        malformed_requests = [
+            ({'spread_type': 'card-list', 'card_count': True},
+             "Only [1-5] cards allowed in the tarot card spread"),
+            ({'spread_type': 'card-list', 'card_count': '3'},
+             "Only [1-5] cards allowed in the tarot card spread"),
+            ({'spread_type': 'one-card', 'cards': 5}, "Cards must be given as a list of card names"),
+            ({'spread_type': 'one-card', 'cards': 'The Fool'}, "Cards must be given as a list of card names"),
+            ({'spread_type': 'one-card', 'cards': [5]}, "Cards must be given as a list of card names"),
+            ({'spread_type': 'card-list', 'parameters': ['Dr Seuss']},
+             "Parameters must be given as a json object of parameter names to values"),
+            ({'spread_type': ['card-list']}, "Unknown spread type: ['card-list']")
+        ]
+        for (request, message) in malformed_requests:
+            with self.subTest(request=request):
+                # When:  the reading request is parsed
+                # Then:  a ValueError describes the malformed field
+                with self.assertRaises(ValueError) as val_error:
+                    parser.parse_reading_request(request)
+                self.assertEqual(message, str(val_error.exception))
+
+    def test_parse_command_line_args_batch(self):
+        # Given: the command line arguments for the batch command
+        parser = CommandParser(self.test_config)
+        args = ['--persist-reading', 'batch', '--input', 'requests.jsonl', '--max-concurrency', '8']
+
+        # When:  the command line arguments are parsed
+        command = parser.parse_command_line_args(args)
+
+        # Then:  the utility command and its options are identified
+        self.assertEqual(CommandType.BATCH, command.command_type)
+        self.assertTrue(command.persist_reading)
+        self.assertEqual({'input': 'requests.jsonl', 'output': '-', 'max_concurrency': 8}, command.command_options)
+
+    def test_parse_command_line_args_batch_api(self):
+        # Given: the command line arguments for the batch-api command
+        parser = CommandParser(self.test_config)
+        args = ['batch-api', '--work-dir', 'work', '--transport', 'file', '--resume']
+
+        # When:  the command line arguments are parsed
+        command = parser.parse_command_line_args(args)
+
+        # Then:  the utility command and its options are identified
+        self.assertEqual(CommandType.BATCH_API, command.command_type)
+        self.assertEqual({'work_dir': 'work', 'input': '-', 'output': '-', 'transport': 'file', 'poll_interval': 60,
+                          'resume': True}, command.command_options)
+
+    def test_parse_command_line_args_serve(self):
+        # Given: the command line arguments for the serve command
+        parser = CommandParser(self.test_config)
+        args = ['serve', '--port', '9090', '--workers', '4', '--watch-config']
+
+        # When:  the command line arguments are parsed
+        command = parser.parse_command_line_args(args)
+
+        # Then:  the utility command and its options are identified
+        self.assertEqual(CommandType.SERVE, command.command_type)
+        self.assertEqual({'host': '127.0.0.1', 'port': 9090, 'max_concurrency': None, 'workers': 4,
+                          'watch_config': True}, command.command_options)
+
+    def test_parse_command_line_args_invalid_concurrency_options(self):
+        # Given: batch, serve, and daemon commands with out of range concurrency options
+        parser = CommandParser(self.test_config)
+        invalid_args = [
+            (['batch', '--max-concurrency', '0'], "argument --max-concurrency: must be a positive integer: 0"),
+            (['serve', '--max-concurrency', '-2'], "argument --max-concurrency: must be a positive integer: -2"),
+            (['daemon', '--max-concurrency', 'lots'], "argument --max-concurrency: must be a positive integer: lots"),
+            (['serve', '--workers', '0'], "argument --workers: must be a positive integer: 0")
+        ]
+        for (args, message) in invalid_args:
+            with self.subTest(args=args):
+                # When:  the command line arguments are parsed
+                # Then:  an exception is raised due to the illegal argument
+                with self.assertRaises(ArgumentError) as arg_error:
+                    parser.parse_command_line_args(args)
+                self.assertEqual(message, str(arg_error.exception))
+
+    def test_parse_command_line_args_simulate(self):
+        # Given: the command line arguments for the simulate command
+        parser = CommandParser(self.test_config)
+        args = ['simulate', '--spread-type', 'timeline', '--draws', '500', '--seed', '7', '--workers', '2']
+
+        # When:  the command line arguments are parsed
+        command = parser.parse_command_line_args(args)
+
+        # Then:  the utility command and its options are identified
+        self.assertEqual(CommandType.SIMULATE, command.command_type)
+        self.assertEqual({'spread_type': 'timeline', 'card_count': 3, 'draws': 500, 'seed': 7, 'workers': 2,
+                          'alpha': 0.001}, command.command_options)
+
+    def test_parse_command_line_args_simulate_default_card_count(self):
+        # Given: the command line arguments for simulating a spread without a fixed number of cards
+        parser = CommandParser(self.test_config)
+        args = ['simulate', '--spread-type', 'card-list']
+
+        # When:  the command line arguments are parsed
+        command = parser.parse_command_line_args(args)
+
+        # Then:  the spreads default to the configured number of cards
+        self.assertEqual(3, command.command_options['card_count'])
+
+    def test_parse_command_line_args_simulate_invalid_options(self):
+        # Given: simulate commands with out of range options
+        parser = CommandParser(self.test_config)
+        invalid_args = [
+            (['simulate', '--draws', '0'], "argument --draws: must be a positive integer: 0"),
+            (['simulate', '--workers', 'many'], "argument --workers: must be a positive integer: many"),
+            (['simulate', '--card-count', '0'],
+             "argument --card-count: invalid choice: 0 (choose from 1, 2, 3, 4, 5)"),
+            (['simulate', '--card-count', '100'],
+             "argument --card-count: invalid choice: 100 (choose from 1, 2, 3, 4, 5)"),
+            (['simulate', '--spread-type', 'timeline', '--card-count', '5'],
+             "timeline spreads always have exactly 3 card[s], so --card-count 5 can not be simulated")
+        ]
+        for (args, message) in invalid_args:
+            with self.subTest(args=args):
+                # When:  the command line arguments are parsed
+                # Then:  an exception is raised due to the illegal argument
+                with self.assertRaises(ArgumentError) as arg_error:
+                    parser.parse_command_line_args(args)
+                self.assertEqual(message, str(arg_error.exception))
+
+    def test_parse_command_line_args_build_snapshot(self):
+        # Given: the command line arguments for the build-snapshot command
+        parser = CommandParser(self.test_config)
+        args = ['build-snapshot']
+
+        # When:  the command line arguments are parsed
+        command = parser.parse_command_line_args(args)
+
+        # Then:  the utility command is identified
+        self.assertEqual(CommandType.BUILD_SNAPSHOT, command.command_type)
 # pylint: enable=C0115,C0116
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around hot reloading the spread and alias config."""
+
+from os.path import dirname, join, realpath
+from shutil import copytree
+from tempfile import TemporaryDirectory
+import time
+import unittest
+
+# pylint: disable=E0401
+from base_test_with_config import BaseTestWithConfig
+# pylint: enable=E0401
+from tarobot.app import CommandParser
+from tarobot.app.app import create_tarot_spread
+from tarobot.tarot import ReadingConfig, SpreadType, TarotCard, get_reading_config
+from tarobot.tarot.config_reloader import ConfigReloader
+from tarobot.tarot.config_snapshot import ConfigSnapshot
+from tarobot.tarot.reading_config import set_reading_config
+
+
+ONE_CARD_BODY = 'The fortune-teller has pulled pulled the following Tarot card: [card_1].'
+
+
+# pylint: disable=C0103,C0115,C0116
+class TestConfigReloader(BaseTestWithConfig):
+
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = TemporaryDirectory()  # pylint: disable=R1732
+        config_dir = join(self.temp_dir.name, 'config')
+        copytree(join(dirname(dirname(realpath(__file__))), 'config'), config_dir)
+        self.one_card_path = join(config_dir, 'spreads', 'one-card.conf')
+        with open(self.one_card_path, encoding='utf-8') as one_card_file:
+            self.one_card_conf = one_card_file.read()
+        # the shared reading config is put back after every test
+        self.original_config = get_reading_config()
+        snapshot = ConfigSnapshot(None)
+        (spreads_path, aliases_path) = (join(config_dir, 'spreads.conf'), join(config_dir, 'aliases.conf'))
+        set_reading_config(ReadingConfig(spreads_path, aliases_path, snapshot).load())
+        self.reloader = ConfigReloader(spreads_path, aliases_path, poll_interval=0.01, snapshot=snapshot)
+
+    def tearDown(self):
+        self.reloader.stop()
+        set_reading_config(self.original_config)
+        self.temp_dir.cleanup()
+
+    def _rewrite_one_card_body(self, body: str) -> None:
+        with open(self.one_card_path, 'w', encoding='utf-8') as one_card_file:
+            one_card_file.write(self.one_card_conf.replace(ONE_CARD_BODY, body))
+
+    def test_unchanged_config_is_not_reloaded(self):
+        # Given: the current reading config
+        reading_config = get_reading_config()
+
+        # When:  the config is checked without any change to it
+        reloaded = self.reloader.check()
+
+        # Then:  nothing was reloaded
+        self.assertFalse(reloaded)
+        self.assertIs(reading_config, get_reading_config())
+        self.assertEqual(0, self.reloader.reload_count)
+
+    def test_changed_template_is_swapped_in(self):
+        # Given: the current reading config
+        reading_config = get_reading_config()
+        # And:   an edit to the one card spread's template
+        self._rewrite_one_card_body('The fortune-teller has just drawn the card [card_1].')
+
+        # When:  the config is checked
+        reloaded = self.reloader.check()
+
+        # Then:  a new reading config was swapped in, rendering the edited template
+        self.assertTrue(reloaded)
+        self.assertIsNot(reading_config, get_reading_config())
+        spread = get_reading_config().spread_builder.build(SpreadType.ONE_CARD, [TarotCard.TheFool])
+        self.assertIn('The fortune-teller has just drawn the card The Fool.', spread.prompt)
+        # And:   the previous reading config is left just as it was
+        self.assertIn('The fortune-teller has pulled pulled', reading_config.spread_builder.build(
+            SpreadType.ONE_CARD, [TarotCard.TheFool]).prompt)
+        self.assertEqual(1, self.reloader.reload_count)
+
+    def test_invalid_template_keeps_current_config(self):
+        # Given: the current reading config
+        reading_config = get_reading_config()
+        # And:   an edit to the one card spread's template with a token it has no value for
+        self._rewrite_one_card_body('The fortune-teller has pulled the following Tarot card: [card_2].')
+
+        # When:  the config is checked
+        reloaded = self.reloader.check()
+
+        # Then:  the edit was rejected, and the current reading config was kept
+        self.assertFalse(reloaded)
+        self.assertIs(reading_config, get_reading_config())
+        self.assertEqual(1, self.reloader.failed_count)
+        # And:   the rejected edit is not retried until the config changes again
+        self.assertFalse(self.reloader.check())
+        self.assertEqual(1, self.reloader.failed_count)
+
+    def test_reading_in_flight_keeps_its_config(self):
+        # Given: a reading request validated against the current config
+        command = CommandParser(self.test_config).parse_reading_request(
+            {'spread_type': 'one-card', 'cards': ['The Fool']})
+        # And:   a template edit reloaded before the reading's spread is built
+        self._rewrite_one_card_body('The fortune-teller has just drawn the card [card_1].')
+        self.assertTrue(self.reloader.check())
+
+        # When:  the reading's spread is built
+        spread = create_tarot_spread(command)
+
+        # Then:  it is built with the config it was validated against
+        self.assertIn('The fortune-teller has pulled pulled the following Tarot card: The Fool.', spread.prompt)
+
+    def test_start_and_stop(self):
+        # Given: a reloader watching the config in the background
+        reading_config = get_reading_config()
+        self.reloader.start()
+
+        # When:  the config is edited
+        self._rewrite_one_card_body('The fortune-teller has just drawn the card [card_1].')
+        deadline = time.monotonic() + 10
+        while self.reloader.reload_count == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # And:   the reloader is stopped before the config is edited again
+        self.reloader.stop()
+        reloaded_config = get_reading_config()
+        self._rewrite_one_card_body('The fortune-teller has drawn [card_1] at last.')
+        time.sleep(0.1)
+
+        # Then:  the first edit was swapped in by the background thread, but the second never was
+        self.assertEqual(1, self.reloader.reload_count)
+        self.assertIsNot(reading_config, reloaded_config)
+        self.assertIs(reloaded_config, get_reading_config())
+# pylint: enable=C0103,C0115,C0116
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around the compiled config snapshot cache."""
+
+import os
+from os.path import dirname, join, realpath
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import Mock, patch
+
+from tarobot.tarot.config_snapshot import ConfigSnapshot, collect_config_sources
+from tarobot.tarot.tarot_spread import SpreadBuilder, load_spread_templates
+
+
+# pylint: disable=C0115,C0116
+class TestConfigSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()  # pylint: disable=R1732
+        self.config_path = join(self.temp_dir.name, 'main.conf')
+        self.include_path = join(self.temp_dir.name, 'included.conf')
+        with open(self.config_path, 'w', encoding='utf-8') as config_file:
+            config_file.write('include required("included.conf")\n')
+        with open(self.include_path, 'w', encoding='utf-8') as include_file:
+            include_file.write('value = 1\n')
+        self.snapshot = ConfigSnapshot(join(self.temp_dir.name, 'snapshots'))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_collect_config_sources(self):
+        # When:  the sources of the config file are collected
+        sources = collect_config_sources(self.config_path)
+
+        # Then:  the config file and its include are both found
+        self.assertEqual([realpath(self.config_path), realpath(self.include_path)], sources)
+
+    def test_load_uses_snapshot(self):
+        # Given: a config parser
+        parse = Mock(return_value={'value': 1})
+        parse.__module__ = __name__
+
+        # When:  the config is loaded twice
+        first = self.snapshot.load('test', self.config_path, parse)
+        second = self.snapshot.load('test', self.config_path, parse)
+
+        # Then:  the config was only parsed once, the second load came from the snapshot
+        self.assertEqual(1, parse.call_count)
+        self.assertEqual({'value': 1}, first)
+        self.assertEqual(first, second)
+
+    def test_load_after_include_changes(self):
+        # Given: a config that has already been snapshotted
+        parse = Mock(side_effect=[{'value': 1}, {'value': 2}])
+        parse.__module__ = __name__
+        self.snapshot.load('test', self.config_path, parse)
+        # And:   a subsequent change to an included file
+        with open(self.include_path, 'w', encoding='utf-8') as include_file:
+            include_file.write('value = 2\n')
+
+        # When:  the config is loaded again
+        reloaded = self.snapshot.load('test', self.config_path, parse)
+
+        # Then:  the stale snapshot is ignored and the config is parsed again
+        self.assertEqual(2, parse.call_count)
+        self.assertEqual({'value': 2}, reloaded)
+
+    def test_snapshot_dir_is_private(self):
+        # Given: a config parser
+        parse = Mock(return_value={'value': 1})
+        parse.__module__ = __name__
+
+        # When:  the config is loaded, creating its snapshot
+        self.snapshot.load('test', self.config_path, parse)
+
+        # Then:  the snapshot directory is only accessible to the user
+        self.assertEqual(0o700, os.stat(self.snapshot.snapshot_dir).st_mode & 0o777)
+
+    def test_load_ignores_untrusted_snapshots(self):
+        # Given: a config that has already been snapshotted
+        parse = Mock(return_value={'value': 1})
+        parse.__module__ = __name__
+        self.snapshot.load('test', self.config_path, parse)
+        (snapshot_name,) = os.listdir(self.snapshot.snapshot_dir)
+        snapshot_path = join(self.snapshot.snapshot_dir, snapshot_name)
+
+        # When:  the snapshot is writable by others, or owned by another user
+        os.chmod(snapshot_path, 0o666)
+        self.snapshot.load('test', self.config_path, parse)
+        with patch('os.getuid', return_value=os.getuid() + 1):
+            self.snapshot.load('test', self.config_path, parse)
+
+        # Then:  the snapshot was never unpickled, and the config was parsed every time
+        self.assertEqual(3, parse.call_count)
+
+    def test_load_when_disabled(self):
+        # Given: a snapshot store without a snapshot directory
+        snapshot = ConfigSnapshot(None)
+        parse = Mock(return_value={'value': 1})
+
+        # When:  the config is loaded twice
+        snapshot.load('test', self.config_path, parse)
+        snapshot.load('test', self.config_path, parse)
+
+        # Then:  the config is parsed every time
+        self.assertEqual(2, parse.call_count)
+
+    def test_spread_builder_from_snapshot(self):
+        # Given: a prebuilt snapshot of the spread config
+        spreads_path = realpath(dirname(dirname(__file__)) + "/config/spreads.conf")
+        self.snapshot.build('spreads', spreads_path, load_spread_templates)
+
+        # When:  spread builders are created from the snapshot and from the hocon config
+        from_snapshot = SpreadBuilder(spreads_path, self.snapshot)
+        from_config = SpreadBuilder(spreads_path, ConfigSnapshot(None))
+
+        # Then:  both spread builders have the same templates
+        self.assertEqual(from_config.spread_type_to_template, from_snapshot.spread_type_to_template)
+# pylint: enable=C0115,C0116
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around the resident reading daemon and its cli client."""
+
+import asyncio
+from os.path import join
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock
+
+# pylint: disable=E0401
+from base_test_with_config import BaseTestWithConfig
+# pylint: enable=E0401
+from tarobot.app import App, CommandDto
+from tarobot.app.async_app import AsyncApp
+from tarobot.app.daemon import command_from_json, command_to_json, ReadingDaemon, send_command
+from tarobot.tarot import SpreadType, TarotCard
+
+
+class _FakeAsyncStream:  # pylint: disable=C0115,C0116
+
+    def __init__(self, tokens):
+        self.chunks = [SimpleNamespace(id='chatcmpl-999', model='scatgpt-4', created=1681571451, usage=None,
+                                       choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=token))])
+                       for token in tokens]
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+# pylint: disable=C0103,C0115,C0116
+class TestReadingDaemon(BaseTestWithConfig, IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        socket_dir = TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(socket_dir.cleanup)
+        self.socket_path = join(socket_dir.name, 'tarobot.sock')
+        self.mock_openai_client = MagicMock()
+        self.mock_openai_client.chat.completions.create = AsyncMock(
+            side_effect=lambda **_: _FakeAsyncStream(['a leap ', 'of faith']))
+        self.daemon = ReadingDaemon(AsyncApp(self.test_config, self.mock_openai_client))
+        await self.daemon.start(self.socket_path)
+        self.addAsyncCleanup(self.daemon.stop, self.socket_path)
+
+    async def test_streamed_reading(self):
+        # Given: a command asking for a streamed response
+        command = CommandDto(spread_type=SpreadType.ONE_CARD, given_cards=[TarotCard.TheFool], stream_response=True)
+
+        # When:  the command is sent to the daemon
+        events = await asyncio.to_thread(lambda: list(send_command(self.socket_path, command)))
+
+        # Then:  the spread, the streamed tokens, and the reading are sent back in order
+        self.assertEqual(['spread', 'token', 'token', 'readings'], [event['event'] for event in events])
+        self.assertEqual([str(TarotCard.TheFool)], events[0]['cards'])
+        self.assertEqual('a leap of faith', "".join(event['token'] for event in events[1:3]))
+        (reading,) = events[3]['readings']
+        self.assertEqual('a leap of faith', reading['response'])
+        self.assertEqual(1, self.daemon.readings_served)
+
+    async def test_invalid_command(self):
+        # Given: a command the daemon can not read back
+        command = CommandDto(spread_type=SpreadType.ONE_CARD)
+        command.spread_type = MagicMock(value='no-such-spread')
+
+        # When:  the command is sent to the daemon
+        events = await asyncio.to_thread(lambda: list(send_command(self.socket_path, command)))
+
+        # Then:  an error is sent back, and openai is never asked for a reading
+        (error,) = events
+        self.assertEqual('error', error['event'])
+        self.assertFalse(self.mock_openai_client.chat.completions.create.called)
+
+    async def test_already_running(self):
+        # When:  a second daemon is started on the same socket
+        # Then:  an exception is raised
+        with self.assertRaises(ValueError):
+            await ReadingDaemon(AsyncApp(self.test_config, self.mock_openai_client)).start(self.socket_path)
+
+
+class TestDaemonClient(BaseTestWithConfig):
+
+    def test_command_json_round_trip(self):
+        # Given: a reading command
+        command = CommandDto(show_prompt=True, stream_response=True, spread_type=SpreadType.CARD_LIST,
+                             spread_parameters={'teller': 'Dr Seuss'},
+                             given_cards=[TarotCard.TheMagician, TarotCard.SixOfWands], card_count=2)
+
+        # When:  it is converted to json and back
+        round_tripped = command_from_json(command_to_json(command))
+
+        # Then:  the command is unchanged
+        self.assertEqual(command, round_tripped)
+
+    def test_run_via_daemon_falls_back(self):
+        # Given: a command configured to use a daemon that is not running
+        with TemporaryDirectory() as socket_dir:
+            app = App(self.test_config, MagicMock())
+            app.command = CommandDto(spread_type=SpreadType.ONE_CARD, daemon_socket=join(socket_dir, 'tarobot.sock'))
+
+            # When:  the app tries to send the reading to the daemon
+            sent = app.run_via_daemon()
+
+        # Then:  the reading is left to run in-process
+        self.assertFalse(sent)
+# pylint: enable=C0103,C0115,C0116
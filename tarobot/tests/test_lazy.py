@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around the lazy singleton holder."""
+
+from unittest import TestCase
+
+from tarobot.lazy import LazySingleton
+
+
+# pylint: disable=C0115,C0116
+class TestLazySingleton(TestCase):
+
+    def test_get(self):
+        # Given: a lazy singleton that counts how often its value is built
+        builds = []
+        singleton = LazySingleton(lambda: builds.append(len(builds)) or len(builds))
+
+        # When:  its value is accessed several times
+        values = [singleton.get() for _ in range(3)]
+
+        # Then:  the value was only built once, on first access
+        self.assertTrue(singleton.is_loaded())
+        self.assertEqual([1, 1, 1], values)
+        self.assertEqual(1, len(builds))
+
+    def test_reset(self):
+        # Given: a lazy singleton that has been loaded
+        builds = []
+        singleton = LazySingleton(lambda: builds.append(len(builds)) or len(builds))
+        singleton.get()
+
+        # When:  it is reset, as it would be in a forked child
+        singleton.reset()
+
+        # Then:  its value is built again on next access
+        self.assertFalse(singleton.is_loaded())
+        self.assertEqual(2, singleton.get())
+
+    def test_set(self):
+        # Given: a lazy singleton that has not been loaded
+        singleton = LazySingleton(lambda: 'built')
+
+        # When:  its value is replaced
+        singleton.set('replaced')
+
+        # Then:  the replacement is held, without the factory ever being called
+        self.assertEqual('replaced', singleton.get())
+# pylint: enable=C0115,C0116
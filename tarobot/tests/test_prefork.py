@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around the prefork supervisor."""
+
+import os
+from os.path import join
+from tempfile import TemporaryDirectory
+import time
+from unittest import TestCase
+
+from tarobot.app.prefork import PreforkSupervisor
+
+
+def _wait_for(condition, supervisor: PreforkSupervisor, timeout_secs: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout_secs
+    while time.monotonic() < deadline:
+        supervisor.check_workers()
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+# pylint: disable=C0103,C0115,C0116
+class TestPreforkSupervisor(TestCase):
+
+    def setUp(self):
+        work_dir = TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(work_dir.cleanup)
+        self.work_dir = work_dir.name
+
+    def test_workers_restarted_and_counted(self):
+        # Given: workers that serve a few readings, then crash the first two times they are run
+        def run_worker(on_served):
+            for _ in range(3):
+                on_served()
+            for crash in range(2):
+                try:
+                    os.close(os.open(join(self.work_dir, f"crash-{crash}"), os.O_CREAT | os.O_EXCL))
+                except FileExistsError:
+                    continue
+                raise RuntimeError("the cards fell on the floor")
+            time.sleep(60)
+        supervisor = PreforkSupervisor(2, run_worker, restart_delay_secs=0)
+        self.addCleanup(supervisor.stop)
+
+        # When:  the workers are started and supervised
+        supervisor.start()
+
+        # Then:  the crashed workers are restarted
+        self.assertTrue(_wait_for(lambda: supervisor.restart_count >= 2, supervisor))
+        # And:   the readings served by every worker are counted in shared memory
+        self.assertTrue(_wait_for(lambda: sum(supervisor.readings_served) >= 12, supervisor))
+        self.assertEqual(2, len(supervisor.workers))
+
+    def test_stop(self):
+        # Given: running workers
+        supervisor = PreforkSupervisor(2, lambda on_served: time.sleep(60))
+        supervisor.start()
+        pids = [worker.pid for worker in supervisor.workers.values()]
+
+        # When:  the supervisor is stopped
+        supervisor.stop()
+
+        # Then:  every worker has exited, and none are restarted
+        self.assertEqual({}, supervisor.workers)
+        for pid in pids:
+            with self.assertRaises(ChildProcessError):
+                os.waitpid(pid, os.WNOHANG)
+
+    def test_invalid_worker_count(self):
+        # When:  a supervisor is created without any workers
+        # Then:  an exception is raised
+        with self.assertRaises(ValueError):
+            PreforkSupervisor(0, lambda on_served: None)
+# pylint: enable=C0103,C0115,C0116
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around the client-side openai rate limit scheduler."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+from threading import Thread
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from openai import AsyncOpenAI, OpenAI, RateLimitError
+
+from tarobot.app.rate_limiter import estimate_token_cost, parse_duration, RateLimiter, TokenBucket
+
+
+_COMPLETION = {
+    'id': 'chatcmpl-429', 'object': 'chat.completion', 'created': 1681571451, 'model': 'scatgpt-4',
+    'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': 'patience'}}],
+    'usage': {'prompt_tokens': 30, 'completion_tokens': 1, 'total_tokens': 31}
+}
+
+
+# pylint: disable=C0115,C0116
+class _FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Answers chat completion requests with 429s until the server's quota of rate limited responses is used up."""
+
+    def do_POST(self):  # pylint: disable=C0103
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.request_count += 1
+        if self.server.rate_limited_responses > 0:
+            self.server.rate_limited_responses -= 1
+            self._respond(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                          {'retry-after-ms': '20', 'x-ratelimit-limit-requests': '60',
+                           'x-ratelimit-remaining-requests': '0', 'x-ratelimit-reset-requests': '20ms'})
+        else:
+            self._respond(200, _COMPLETION,
+                          {'x-ratelimit-limit-requests': '60', 'x-ratelimit-remaining-requests': '59',
+                           'x-ratelimit-reset-requests': '1s', 'x-ratelimit-limit-tokens': '1000',
+                           'x-ratelimit-remaining-tokens': '750', 'x-ratelimit-reset-tokens': '15s'})
+
+    def _respond(self, status: int, body: dict, headers: dict):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for (name, value) in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):  # pylint: disable=W0622
+        pass
+
+
+class _FakeOpenAIServer:
+    """A local stand-in for the openai api, run on a background thread."""
+
+    def __init__(self, rate_limited_responses: int):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeOpenAIHandler)
+        self.server.rate_limited_responses = rate_limited_responses
+        self.server.request_count = 0
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True).start()
+
+    @property
+    def request_count(self) -> int:
+        return self.server.request_count
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _request():
+    return {'model': 'scatgpt-4', 'max_tokens': 100, 'messages': [{'role': 'user', 'content': 'x' * 400}]}
+
+
+def _rate_limiter(max_retries: int = 6) -> RateLimiter:
+    return RateLimiter(6000, 100000, max_retries=max_retries, base_backoff_secs=0.01, max_backoff_secs=0.05,
+                       rng=random.Random(7))
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_estimate_token_cost(self):
+        # Given: a request with a 400 character prompt, asking for 2 choices of up to 100 tokens
+        request = dict(_request(), n=2)
+
+        # When:  its token cost is estimated
+        cost = estimate_token_cost(request)
+
+        # Then:  the cost covers the prompt plus the max tokens of every choice
+        self.assertEqual(100 + 200, cost)
+
+    def test_parse_duration(self):
+        self.assertEqual(0.02, parse_duration('20ms'))
+        self.assertEqual(360.0, parse_duration('6m0s'))
+        self.assertEqual(1.5, parse_duration('1.5s'))
+        self.assertIsNone(parse_duration(None))
+
+    def test_token_bucket(self):
+        # Given: a bucket of 10 units refilling at 1 unit per second
+        bucket = TokenBucket(10, 1, now=0.0)
+
+        # When:  more than the whole budget is reserved
+        first_wait = bucket.reserve(8, now=0.0)
+        second_wait = bucket.reserve(4, now=0.0)
+
+        # Then:  the reservation that overdraws the bucket waits for the deficit to refill
+        self.assertEqual(0.0, first_wait)
+        self.assertEqual(2.0, second_wait)
+        # And:   the budget refills over time
+        self.assertEqual(0.0, bucket.reserve(3, now=5.0))
+
+    def test_update_from_headers(self):
+        # Given: a rate limiter with a generous starting budget
+        rate_limiter = _rate_limiter()
+
+        # When:  openai reports a nearly exhausted token budget
+        rate_limiter.update_from_headers({'x-ratelimit-limit-tokens': '1000', 'x-ratelimit-remaining-tokens': '100',
+                                          'x-ratelimit-reset-tokens': '9s'})
+
+        # Then:  the bucket is resynced, with its refill rate learned from the reset time
+        self.assertEqual(1000, rate_limiter.tokens.capacity)
+        self.assertEqual(100, rate_limiter.tokens.available)
+        self.assertEqual(100, rate_limiter.tokens.refill_per_sec)
+        # And:   a request costing more than the remaining budget has to wait
+        self.assertGreater(rate_limiter.reserve(300), 1.0)
+
+    def test_update_from_headers_keeps_waiting_reservations(self):
+        # Given: a rate limiter whose token budget is overdrawn by reservations still waiting to be sent
+        rate_limiter = _rate_limiter()
+        rate_limiter.update_from_headers({'x-ratelimit-limit-tokens': '1000', 'x-ratelimit-remaining-tokens': '100',
+                                          'x-ratelimit-reset-tokens': '9s'})
+        rate_limiter.reserve(600)
+        debt = rate_limiter.tokens.available
+
+        # When:  a response reports the budget as openai saw it, before those reservations were sent
+        rate_limiter.update_from_headers({'x-ratelimit-limit-tokens': '1000', 'x-ratelimit-remaining-tokens': '100',
+                                          'x-ratelimit-reset-tokens': '9s'})
+
+        # Then:  the debt of the waiting reservations is kept, rather than letting another burst through
+        self.assertLess(debt, 0)
+        self.assertLessEqual(rate_limiter.tokens.available, debt + 1)
+        self.assertGreater(rate_limiter.reserve(300), 1.0)
+
+    def test_budget_shared_by_workers(self):
+        # Given: a rate limiter for one of four worker processes sharing the budget
+        rate_limiter = RateLimiter(6000, 100000, workers=4)
+
+        # When:  openai reports the shared token budget
+        rate_limiter.update_from_headers({'x-ratelimit-limit-tokens': '1000', 'x-ratelimit-remaining-tokens': '400',
+                                          'x-ratelimit-reset-tokens': '6s'})
+
+        # Then:  the worker paces itself to its share of the configured and reported budgets
+        self.assertEqual(1500, rate_limiter.requests.capacity)
+        self.assertEqual(250, rate_limiter.tokens.capacity)
+        self.assertEqual(100, rate_limiter.tokens.available)
+        self.assertEqual(25, rate_limiter.tokens.refill_per_sec)
+
+    def test_backoff_honours_retry_after(self):
+        # Given: a rate limiter with a tiny base backoff
+        rate_limiter = _rate_limiter()
+
+        # When:  a request is rate limited with a retry-after hint
+        delay = rate_limiter.backoff(0, retry_after_secs=2.0)
+
+        # Then:  every submission is paused for at least the hinted time
+        self.assertEqual(2.0, delay)
+        self.assertGreater(rate_limiter.reserve(1), 1.9)
+        self.assertEqual(1, rate_limiter.rate_limited_count)
+
+    def test_create_chat_completion_retries_429s(self):
+        # Given: a fake openai server that rate limits the first two requests
+        server = _FakeOpenAIServer(rate_limited_responses=2)
+        self.addCleanup(server.close)
+        openai_client = OpenAI(api_key='test', base_url=server.base_url, max_retries=0)
+        rate_limiter = _rate_limiter()
+
+        # When:  a chat completion is requested through the rate limiter
+        completion = rate_limiter.create_chat_completion(openai_client, _request())
+
+        # Then:  the request is retried until it succeeds
+        self.assertEqual('patience', completion.choices[0].message.content)
+        self.assertEqual(3, server.request_count)
+        self.assertEqual(2, rate_limiter.rate_limited_count)
+        # And:   the budgets are resynced from the successful response's headers
+        self.assertEqual(1000, rate_limiter.tokens.capacity)
+
+    def test_create_chat_completion_gives_up(self):
+        # Given: a fake openai server that keeps rate limiting
+        server = _FakeOpenAIServer(rate_limited_responses=10)
+        self.addCleanup(server.close)
+        openai_client = OpenAI(api_key='test', base_url=server.base_url, max_retries=0)
+        rate_limiter = _rate_limiter(max_retries=2)
+
+        # When:  a chat completion is requested through the rate limiter
+        # Then:  the rate limit error is raised once the retries are used up
+        with self.assertRaises(RateLimitError):
+            rate_limiter.create_chat_completion(openai_client, _request())
+        self.assertEqual(3, server.request_count)
+
+
+class TestRateLimiterAsync(IsolatedAsyncioTestCase):
+
+    async def test_create_chat_completion_async_retries_429s(self):
+        # Given: a fake openai server that rate limits the first request
+        server = _FakeOpenAIServer(rate_limited_responses=1)
+        self.addCleanup(server.close)
+        openai_client = AsyncOpenAI(api_key='test', base_url=server.base_url, max_retries=0)
+        rate_limiter = _rate_limiter()
+
+        # When:  a chat completion is requested through the rate limiter
+        completion = await rate_limiter.create_chat_completion_async(openai_client, _request())
+
+        # Then:  the request is retried until it succeeds
+        self.assertEqual('patience', completion.choices[0].message.content)
+        self.assertEqual(2, server.request_count)
+        self.assertEqual(1, rate_limiter.rate_limited_count)
+# pylint: enable=C0115,C0116
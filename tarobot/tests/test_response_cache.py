@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around the chat completion response cache."""
+
+from io import StringIO
+import unittest
+from unittest.mock import MagicMock, patch
+
+# pylint: disable=E0401
+from base_test_with_config import BaseTestWithConfig
+from mock_completion import mock_completion
+# pylint: enable=E0401
+from tarobot.app import App, CommandDto
+from tarobot.app.response_cache import cache_key, ResponseCache
+from tarobot.tarot import SpreadType, TarotCard
+
+
+def _request(prompt: str, temperature: float = 0.2):
+    return {'model': 'scatgpt-4', 'max_tokens': 200, 'temperature': temperature,
+            'messages': [{'role': 'user', 'content': prompt}]}
+
+
+# pylint: disable=C0115,C0116
+class TestResponseCache(unittest.TestCase):
+
+    def test_cache_key(self):
+        # Given: identical requests, apart from fields that do not affect the response
+        request = _request('The Fool')
+        request_with_stop = dict(_request('The Fool'), stop='END-OF-TRANSMISSION')
+
+        # Then:  the requests share a cache key, but a different temperature gets a different key
+        self.assertEqual(cache_key(request), cache_key(request_with_stop))
+        self.assertNotEqual(cache_key(request), cache_key(_request('The Fool', temperature=0.9)))
+
+    def test_get_and_put(self):
+        # Given: an empty response cache
+        cache = ResponseCache(':memory:', max_entries=10, ttl_secs=60)
+
+        # When:  a response is looked up, cached, and looked up again
+        first = cache.get(_request('The Fool'))
+        cache.put(_request('The Fool'), mock_completion('new beginnings'), 'new beginnings')
+        (completion, response) = cache.get(_request('The Fool'))
+
+        # Then:  the first lookup misses, and the second returns the cached completion
+        self.assertIsNone(first)
+        self.assertEqual('new beginnings', response)
+        self.assertEqual('cmpl-444555', completion.id)
+        self.assertEqual(230, completion.usage.total_tokens)
+        self.assertEqual('new beginnings', completion.choices[0].message.content)
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_ttl(self):
+        # Given: a cached response
+        cache = ResponseCache(':memory:', max_entries=10, ttl_secs=60)
+        with patch('tarobot.app.response_cache.time.time', return_value=1000.0):
+            cache.put(_request('The Fool'), mock_completion('new beginnings'), 'new beginnings')
+
+        # When:  the response is looked up after its time to live
+        with patch('tarobot.app.response_cache.time.time', return_value=1061.0):
+            cached = cache.get(_request('The Fool'))
+
+        # Then:  the expired entry is a miss
+        self.assertIsNone(cached)
+
+    def test_lru_eviction(self):
+        # Given: a full response cache, where the oldest entry was recently read
+        cache = ResponseCache(':memory:', max_entries=2, ttl_secs=10 ** 10)
+        with patch('tarobot.app.response_cache.time.time', side_effect=[1.0, 2.0, 3.0, 4.0, 4.0]):
+            cache.put(_request('one'), mock_completion('one'), 'one')
+            cache.put(_request('two'), mock_completion('two'), 'two')
+            cache.get(_request('one'))
+
+            # When:  another response is cached
+            cache.put(_request('three'), mock_completion('three'), 'three')
+
+        # Then:  the least recently used entry was evicted
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get(_request('two')))
+        self.assertIsNotNone(cache.get(_request('one')))
+        self.assertIsNotNone(cache.get(_request('three')))
+
+
+class TestAppWithResponseCache(BaseTestWithConfig):
+
+    def test_repeat_reading_served_from_cache(self):
+        # Given: an app with the response cache enabled
+        self.test_config.cache.enabled = True
+        self.test_config.cache.path = ':memory:'
+        mock_openai_client = MagicMock()
+        mock_openai_client.chat.completions.create.return_value = mock_completion('new beginnings')
+        app = App(self.test_config, mock_openai_client)
+        app.command = CommandDto(spread_type=SpreadType.ONE_CARD, given_cards=[TarotCard.TheFool])
+
+        # When:  the same given-card reading is requested twice
+        readings = []
+        for _ in range(2):
+            app.create_tarot_spread()
+            readings.append(app.interpret_tarot_spread())
+
+        # Then:  openai was only asked once, and both readings match
+        self.assertEqual(1, mock_openai_client.chat.completions.create.call_count)
+        self.assertEqual(readings[0].response, readings[1].response)
+        self.assertEqual(readings[0].metadata.openai_id, readings[1].metadata.openai_id)
+        self.assertEqual((1, 1), (app.response_cache.hits, app.response_cache.misses))
+
+    def test_streamed_reading_served_from_cache(self):
+        # Given: an app with the response cache enabled
+        self.test_config.cache.enabled = True
+        self.test_config.cache.path = ':memory:'
+        mock_openai_client = MagicMock()
+        app = App(self.test_config, mock_openai_client)
+        # And:   a cached completion with two choices
+        completion = mock_completion('new beginnings')
+        second_choice = MagicMock()
+        second_choice.message.content = 'a fresh start'
+        completion.choices.append(second_choice)
+        mock_openai_client.chat.completions.create.return_value = completion
+        app.command = CommandDto(spread_type=SpreadType.ONE_CARD, given_cards=[TarotCard.TheFool])
+        app.create_tarot_spread()
+        app.interpret_tarot_spread()
+
+        # When:  the same reading is requested again, streamed
+        app.command.stream_response = True
+        app.create_tarot_spread()
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            app.interpret_tarot_spread()
+
+        # Then:  only the first choice of the cached completion was streamed
+        self.assertEqual(1, app.response_cache.hits)
+        self.assertEqual("new beginnings\n", mock_stdout.getvalue())
+# pylint: enable=C0115,C0116
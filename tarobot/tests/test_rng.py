@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around the rng provider's independent random streams."""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import unittest
+
+from tarobot.tarot import RngProvider, TarotCard, draw_spread
+from tarobot.tarot.rng import MAX_SEED
+
+
+# pylint: disable=C0115,C0116
+class TestRngProvider(unittest.TestCase):
+
+    def test_seeded_provider_is_reproducible(self):
+        # Given: two providers with the same seed, and one with another
+        (first, second, other) = (RngProvider(42), RngProvider(42), RngProvider(43))
+
+        # When:  each hands out a few seeds
+        first_seeds = [first.next_seed() for _ in range(5)]
+        second_seeds = [second.next_seed() for _ in range(5)]
+        other_seeds = [other.next_seed() for _ in range(5)]
+
+        # Then:  the same seed gives the same sequence of distinct seeds, and another seed a different one
+        self.assertEqual(first_seeds, second_seeds)
+        self.assertEqual(5, len(set(first_seeds)))
+        self.assertTrue(set(first_seeds).isdisjoint(other_seeds))
+        self.assertTrue(all(0 <= seed <= MAX_SEED for seed in first_seeds))
+
+    def test_stream_reproduces_spread(self):
+        # Given: a spread drawn from a stream of an unseeded provider
+        provider = RngProvider()
+        (seed, rng) = provider.stream()
+        spread = draw_spread(5, rng)
+
+        # When:  the spread is drawn again from a stream with the same seed
+        (same_seed, same_rng) = provider.stream(seed)
+
+        # Then:  the same cards are drawn
+        self.assertEqual(seed, same_seed)
+        self.assertEqual(spread, draw_spread(5, same_rng))
+        # And:   seeds that cannot be recorded are rejected
+        for bad_seed in (-1, MAX_SEED + 1, 1.5, True):
+            with self.assertRaises(ValueError):
+                provider.stream(bad_seed)
+
+    def test_threads_draw_independent_spreads(self):
+        # Given: a seeded provider shared by many threads
+        provider = RngProvider(7)
+
+        # When:  every thread draws its spreads from streams of its own
+        def draw_spreads(_):
+            return [draw_spread(len(TarotCard), provider.stream()[1]) for _ in range(50)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            spreads = [tuple(spread) for spreads in executor.map(draw_spreads, range(8)) for spread in spreads]
+
+        # Then:  no two streams were handed the same seed, so no two full-deck shuffles repeat
+        self.assertEqual(400, len(set(spreads)))
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "requires fork")
+    def test_forked_child_gets_its_own_seeds(self):
+        # Given: a seeded provider
+        provider = RngProvider(7)
+        (read_fd, write_fd) = os.pipe()
+
+        # When:  a forked child takes the next seed, as does its parent
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            os.write(write_fd, str(provider.next_seed()).encode())
+            os._exit(0)  # pylint: disable=W0212
+        os.close(write_fd)
+        with os.fdopen(read_fd) as child_output:
+            child_seed = int(child_output.read())
+        os.waitpid(pid, 0)
+
+        # Then:  the child's seed differs from the one its parent takes
+        self.assertNotEqual(provider.next_seed(), child_seed)
+# pylint: enable=C0115,C0116
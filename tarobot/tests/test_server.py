@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around the http reading service."""
+
+import asyncio
+import json
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# pylint: disable=E0401
+from base_test_with_config import BaseTestWithConfig
+from mock_completion import mock_completion
+# pylint: enable=E0401
+from tarobot.app import CommandParser
+from tarobot.app.async_app import AsyncApp
+from tarobot.app.server import ReadingServer
+
+
+async def _send(reader, writer, method: str, path: str, body: bytes = b'',  # pylint: disable=R0913
+                connection: str = 'keep-alive'):
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: {connection}\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) != b'\r\n':
+        (name, _, value) = line.decode().partition(':')
+        headers[name.lower()] = value.strip()
+    return status, json.loads(await reader.readexactly(int(headers['content-length'])))
+
+
+# pylint: disable=C0103,C0115,C0116
+class TestReadingServer(BaseTestWithConfig, IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.mock_openai_client = MagicMock()
+        self.mock_openai_client.chat.completions.create = AsyncMock(return_value=mock_completion('a leap of faith'))
+        app = AsyncApp(self.test_config, self.mock_openai_client)
+        self.reading_server = ReadingServer(app, CommandParser(self.test_config))
+        server = await self.reading_server.start(port=0)
+        self.addAsyncCleanup(self.reading_server.stop)
+        (host, port) = server.sockets[0].getsockname()[:2]
+        (self.reader, self.writer) = await asyncio.open_connection(host, port)
+        self.addCleanup(self.writer.close)
+
+    async def test_post_readings(self):
+        # Given: a reading request
+        body = json.dumps({'spread_type': 'one-card', 'cards': ['The Fool']}).encode()
+
+        # When:  the request is posted to the service
+        (status, payload) = await _send(self.reader, self.writer, 'POST', '/readings', body)
+
+        # Then:  the card reading is returned
+        self.assertEqual(200, status)
+        (reading,) = payload['readings']
+        self.assertEqual('a leap of faith', reading['response'])
+        self.assertEqual(1, self.reading_server.requests_served)
+
+    async def test_keep_alive(self):
+        # Given: a reading request
+        body = json.dumps({'spread_type': 'one-card'}).encode()
+
+        # When:  several requests are sent over the same connection
+        statuses = [(await _send(self.reader, self.writer, 'POST', '/readings', body))[0] for _ in range(3)]
+        (health_status, health) = await _send(self.reader, self.writer, 'GET', '/health', connection='close')
+
+        # Then:  every request was served
+        self.assertEqual([200, 200, 200], statuses)
+        self.assertEqual((200, {'status': 'ok'}), (health_status, health))
+        self.assertEqual(3, self.mock_openai_client.chat.completions.create.call_count)
+
+    async def test_invalid_requests(self):
+        # When:  invalid requests are sent
+        (bad_spread, bad_spread_payload) = await _send(self.reader, self.writer, 'POST', '/readings',
+                                                       b'{"spread_type": "no-such-spread"}')
+        (bad_json, _) = await _send(self.reader, self.writer, 'POST', '/readings', b'not json')
+        (bad_cards, bad_cards_payload) = await _send(self.reader, self.writer, 'POST', '/readings',
+                                                     b'{"spread_type": "one-card", "cards": 5}')
+        (bad_card, _) = await _send(self.reader, self.writer, 'POST', '/readings',
+                                    b'{"spread_type": "one-card", "cards": [5]}')
+        (bad_method, _) = await _send(self.reader, self.writer, 'GET', '/readings')
+        (not_found, _) = await _send(self.reader, self.writer, 'GET', '/tea-leaves')
+
+        # Then:  each is rejected with the appropriate status, and openai is never asked for a reading
+        self.assertEqual(400, bad_spread)
+        self.assertEqual("Unknown spread type: no-such-spread", bad_spread_payload['error'])
+        self.assertEqual(400, bad_json)
+        self.assertEqual(400, bad_cards)
+        self.assertEqual("Cards must be given as a list of card names", bad_cards_payload['error'])
+        self.assertEqual(400, bad_card)
+        self.assertEqual(405, bad_method)
+        self.assertEqual(404, not_found)
+        self.assertFalse(self.mock_openai_client.chat.completions.create.called)
+
+    async def test_upstream_failure(self):
+        # Given: an openai client that fails
+        self.mock_openai_client.chat.completions.create.side_effect = ConnectionError("no route to openai")
+
+        # When:  a reading is requested
+        (status, payload) = await _send(self.reader, self.writer, 'POST', '/readings', b'{"spread_type": "one-card"}')
+
+        # Then:  the failure is reported as a bad gateway
+        self.assertEqual(502, status)
+        self.assertIn("no route to openai", payload['error'])
+
+    async def test_internal_error(self):
+        # Given: a parser with a bug
+        self.reading_server.parser = MagicMock()
+        self.reading_server.parser.parse_reading_request.side_effect = TypeError("unsupported operand")
+
+        # When:  a reading is requested
+        (status, payload) = await _send(self.reader, self.writer, 'POST', '/readings', b'{"spread_type": "one-card"}')
+
+        # Then:  the failure is reported as the service's own error, not the client's
+        self.assertEqual(500, status)
+        self.assertEqual("Internal server error", payload['error'])
+
+    async def test_headers_too_large(self):
+        # Given: requests with too many headers, too large headers, and a header line past the stream's buffer limit
+        invalid_headers = [
+            ("too many", "".join(f"X-Tea-Leaf-{index}: {index}\r\n" for index in range(101))),
+            ("too large", "".join(f"X-Tea-Leaf-{index}: {'x' * 1000}\r\n" for index in range(17))),
+            ("too long", f"X-Tea-Leaves: {'x' * 100_000}\r\n")
+        ]
+        for (description, headers) in invalid_headers:
+            with self.subTest(description):
+                (reader, writer) = await asyncio.open_connection(*self.writer.get_extra_info('peername')[:2])
+                self.addCleanup(writer.close)
+
+                # When:  the request is sent
+                writer.write(f"GET /health HTTP/1.1\r\n{headers}\r\n".encode())
+                await writer.drain()
+
+                # Then:  it is rejected, and the connection closed
+                self.assertIn(b" 431 ", await reader.readline())
+                self.assertIn(b"Connection: close", await reader.read())
+
+    async def test_request_line_too_long(self):
+        # When:  a request line past the stream's buffer limit is sent
+        self.writer.write(f"GET /{'x' * 100_000} HTTP/1.1\r\n\r\n".encode())
+        await self.writer.drain()
+
+        # Then:  it is rejected, and the connection closed
+        self.assertIn(b" 400 ", await self.reader.readline())
+        self.assertIn(b"Connection: close", await self.reader.read())
+
+    @patch('tarobot.app.async_app.persist_card_readings')
+    async def test_persistence_is_the_services_choice(self, mock_persist_card_readings):
+        # Given: a reading request that asks for its reading to be persisted
+        body = json.dumps({'spread_type': 'one-card', 'persist_reading': True}).encode()
+
+        # When:  the request is posted to a service that does not persist readings
+        (status, _) = await _send(self.reader, self.writer, 'POST', '/readings', body)
+
+        # Then:  the reading is returned, but not persisted
+        self.assertEqual(200, status)
+        self.assertFalse(mock_persist_card_readings.called)
+
+        # When:  a request that does not ask for persistence is posted to a service that persists readings
+        self.reading_server.persist_reading = True
+        (status, _) = await _send(self.reader, self.writer, 'POST', '/readings', b'{"spread_type": "one-card"}')
+
+        # Then:  the reading is persisted
+        self.assertEqual(200, status)
+        mock_persist_card_readings.assert_called_once()
+# pylint: enable=C0103,C0115,C0116
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""Module containing unit tests around the Monte Carlo spread statistics."""
+
+from io import StringIO
+import math
+import unittest
+
+import numpy
+
+from tarobot.tarot import Archana, Suit
+from tarobot.tarot.spread_stats import chi_square_survival, simulate, SpreadStats
+
+
+# pylint: disable=C0115,C0116
+class TestSpreadStats(unittest.TestCase):
+
+    def test_chi_square_survival(self):
+        # When:  the chi-square survival function is evaluated at known points
+        # Then:  it matches the tabulated values
+        self.assertAlmostEqual(0.05, chi_square_survival(3.841459, 1), places=6)
+        self.assertAlmostEqual(math.exp(-5), chi_square_survival(10, 2), places=12)
+        self.assertAlmostEqual(0.91889, chi_square_survival(0.5, 3), places=5)
+        self.assertAlmostEqual(0.47857, chi_square_survival(77, 77), places=5)
+        self.assertEqual(1.0, chi_square_survival(0, 77))
+
+    def test_simulate_invalid_arguments(self):
+        # When:  simulations are run without any draws, workers, or cards, or with more cards than a deck holds
+        # Then:  each is rejected up front
+        for (draws, card_count, workers) in [(0, 3, 1), (10, 3, 0), (10, 0, 1), (10, 79, 1)]:
+            with self.assertRaises(ValueError):
+                simulate(draws, card_count, workers=workers)
+
+    def test_simulate(self):
+        # When:  a seeded simulation is split across worker processes
+        spread_stats = simulate(200_000, 3, seed=42, workers=2)
+
+        # Then:  every drawn card is counted
+        self.assertEqual(600_000, spread_stats.card_counts().sum())
+        self.assertEqual(200_000, spread_stats.position_counts[0].sum())
+        self.assertEqual(600_000, sum(spread_stats.archana_counts().values()))
+        self.assertEqual(set(Suit), set(spread_stats.suit_counts()))
+        # And:   the draw is found to be uniform
+        output = StringIO()
+        self.assertTrue(spread_stats.write_report(output, alpha=0.001))
+        self.assertIn("Six of Swords", output.getvalue())
+        # And:   the same seed reproduces the same simulation
+        self.assertTrue((spread_stats.position_counts == simulate(200_000, 3, seed=42, workers=2).position_counts)
+                        .all())
+
+    def test_biased_draw_detected(self):
+        # Given: the counts of a draw that favours the major archana in its first position
+        position_counts = numpy.full((2, 78), 1000, dtype=numpy.int64)
+        position_counts[0, :22] += 100
+        position_counts[0, 22:] -= 100 * 22 // 56
+        spread_stats = SpreadStats(int(position_counts[0].sum()), 2, position_counts)
+
+        # When:  the uniformity tests are run
+        tests = {test.name: test for test in spread_stats.uniformity_tests()}
+
+        # Then:  the biased position and archana are caught, while the fair position passes
+        self.assertFalse(tests['position 1'].passed(0.001))
+        self.assertFalse(tests['archana'].passed(0.001))
+        self.assertTrue(tests['position 2'].passed(0.001))
+        self.assertGreater(spread_stats.archana_counts()[Archana.MAJOR], 22 * 2000)
+        self.assertFalse(spread_stats.write_report(StringIO(), alpha=0.001))
+# pylint: enable=C0115,C0116
@@ -2,9 +2,11 @@
 
 """Module containing all the unit tests around tarot card and tarot deck logic."""
 
+import random
 import unittest
 
-from tarobot.tarot import Archana, CardValue, Suit, TarotCard, TarotDeck
+from tarobot.tarot import Archana, CardValue, Suit, TarotCard, TarotDeck, draw_spread, draw_spreads
+from tarobot.tarot.deck import to_tarot_cards
 
 
 CARDS_IN_DECK = 78
@@ -50,6 +52,34 @@ class TestTarot(unittest.TestCase):
         self.assertEqual(len(deck.cards), CARDS_IN_DECK - 1)
         self.assertNotIn(drawn_card, deck.cards)
 
+    def test_draw_spread(self):
+        # When:  spreads are drawn from generators with the same seed
+        spread = draw_spread(10, random.Random(1234))
+        same_spread = draw_spread(10, random.Random(1234))
+
+        # Then:  the same distinct cards are drawn
+        self.assertEqual(10, len(set(spread)))
+        self.assertEqual(spread, same_spread)
+        # And:   a spread can not be larger than the deck
+        with self.assertRaises(ValueError):
+            draw_spread(CARDS_IN_DECK + 1)
+
+    def test_draw_spreads(self):
+        # When:  many spreads are drawn at once with a seed
+        spreads = draw_spreads(100_000, 5, 1234)
+
+        # Then:  every spread holds distinct cards, encoded by their values
+        self.assertEqual((100_000, 5), spreads.shape)
+        self.assertTrue(all(len(set(spread)) == 5 for spread in spreads[:1000].tolist()))
+        self.assertEqual(CARDS_IN_DECK - 1, spreads.max())
+        self.assertEqual(5, len(set(to_tarot_cards(spreads[0]))))
+        # And:   every card turns up in every position about equally often
+        for position in range(5):
+            counts = [(spreads[:, position] == value).sum() for value in range(CARDS_IN_DECK)]
+            self.assertLess(max(counts) - min(counts), 400)
+        # And:   the same seed draws the same spreads
+        self.assertTrue((spreads == draw_spreads(100_000, 5, 1234)).all())
+
     def test_major_archana_card_by_ordinal(self):
         # When:  an arbitrary major archana card is specified by its ordinal value
         major_card = TarotCard(1)
@@ -89,4 +119,17 @@ class TestTarot(unittest.TestCase):
         self.assertEqual(card.card_value(), None)
         # And:    the string representation is human-readable
         self.assertEqual(str(card), "The Magician")
+
+    def test_minor_archana_metadata(self):
+        # When:  every card of the minor archana is looked up by its suit and value
+        for suit in Suit:
+            for card_value in CardValue:
+                card = TarotCard[f"{card_value}Of{suit}"]
+
+                # Then:  the card's precomputed metadata matches
+                self.assertEqual(Archana.MINOR, card.archana())
+                self.assertEqual(suit, card.suit())
+                self.assertEqual(card_value, card.card_value())
+                self.assertEqual(f"{card_value} of {suit}", str(card))
+                self.assertEqual(f"{card_value}of{suit}", repr(card))
 # pylint: enable=C0115,C0116
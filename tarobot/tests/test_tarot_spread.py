@@ -4,8 +4,10 @@
 
 import unittest
 
+import temp_snapshot_dir  # pylint: disable=E0401,W0611
 from tarobot.tarot.tarot_card import TarotCard
-from tarobot.tarot.tarot_spread import Spread, SpreadType, SpreadBuilder
+from tarobot.tarot.tarot_spread import ChatCompletionParameters, Spread, SpreadBuilder, SpreadTemplate, SpreadType, \
+    TemplateParameter, compile_prompt_template
 
 
 # pylint: disable=C0115,C0116
@@ -124,4 +126,58 @@ class TestTarotSpread(unittest.TestCase):
                           'the situation. The Magician, representing the advice for the seeker about the situation. In '
                           'the last sentence remind the seeker that Tarot is just a tool for guidance, and that they '
                           'choose their own path in life.'), spread.prompt)
+
+    def test_build_many(self):
+        # Given: several three card spreads
+        card_spreads = [[TarotCard.TheFool, TarotCard.TheSun, TarotCard.TheMoon],
+                        [TarotCard.AceOfCups, TarotCard.TheTower, TarotCard.Death]]
+
+        # When:  they are all built at once, with their seeds
+        spreads = self.spread_builder.build_many(SpreadType.TIMELINE, card_spreads, seeds=[11, 22])
+
+        # Then:  each spread is built just as it would be on its own
+        for (spread, tarot_cards, seed) in zip(spreads, card_spreads, [11, 22]):
+            self.assertEqual(self.spread_builder.build(SpreadType.TIMELINE, tarot_cards, seed=seed), spread)
+        self.assertEqual([11, 22], [spread.seed for spread in spreads])
+        # And:   a spread with the wrong number of cards is still rejected
+        with self.assertRaises(ValueError):
+            self.spread_builder.build_many(SpreadType.TIMELINE, [[TarotCard.TheFool]])
+
+    def test_compile_prompt_template(self):
+        # Given: a spread template with parameters and a fixed number of cards
+        spread_template = _spread_template(
+            "Hello  [seeker],\n  you drew [card_1] and [card_2] ([card_list]).", required_card_count=2)
+
+        # When:  its prompt template is compiled
+        prompt_template = compile_prompt_template(spread_template)
+
+        # Then:  the literal text (with its whitespace collapsed) alternates with the placeholders
+        self.assertEqual(('Hello ', 'seeker', ', you drew ', 'card_1', ' and ', 'card_2', ' (', 'card_list', ').'),
+                         prompt_template.segments)
+        self.assertEqual("Hello Bob, you drew The Sun and The Moon (The Sun, The Moon).", prompt_template.render(
+            {'seeker': 'Bob', 'card_1': 'The Sun', 'card_2': 'The Moon', 'card_list': 'The Sun, The Moon'}))
+        # And:   values are never themselves treated as placeholders
+        self.assertEqual("Hello [card_1], you drew a and b (c).", prompt_template.render(
+            {'seeker': '[card_1]', 'card_1': 'a', 'card_2': 'b', 'card_list': 'c'}))
+        # And:   a placeholder left without a value is rejected
+        with self.assertRaises(ValueError) as val_error:
+            prompt_template.render({'seeker': 'Bob'})
+        self.assertEqual('Prompt template still has empty token "card_1"', str(val_error.exception))
+
+    def test_compile_prompt_template_unknown_token(self):
+        # When:  templates with tokens for unknown parameters, or cards beyond the spread, are compiled
+        # Then:  they are rejected up front
+        for (prompt, unknown_token) in (("For [seeker] and [partner].", "partner"),
+                                        ("[card_1] then [card_3]", "card_3")):
+            with self.assertRaises(ValueError) as val_error:
+                compile_prompt_template(_spread_template(prompt, required_card_count=2))
+            self.assertEqual(f'card-list prompt template has unknown token "{unknown_token}"',
+                             str(val_error.exception))
+
+
+def _spread_template(prompt_template: str, required_card_count: int) -> SpreadTemplate:
+    return SpreadTemplate(type=SpreadType.CARD_LIST, description="test spread", roles={}, rules={}, disclaimers={},
+                          body=prompt_template, chat_completion_parameters=ChatCompletionParameters(model='scatgpt-4'),
+                          prompt_template=prompt_template, required_card_count=required_card_count,
+                          required_parameters={'seeker': TemplateParameter("tarot reading recipient")})
 # pylint: enable=C0115,C0116